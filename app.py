@@ -1,15 +1,25 @@
-from flask import Flask, render_template, request, jsonify, session, make_response
+from flask import Flask, render_template, request, jsonify, session, make_response, Response, stream_with_context, g
 import os
+import time
+import multiprocessing
 from dotenv import load_dotenv
 from backend.core.session import LearningSession
-from backend.api.perplexity import PerplexityClient
+from backend.core.session_store import create_session_store
+from backend.api.perplexity import get_client, get_pool_stats, get_resilience_stats
+from backend.api import resilience
 import backend.utils.database as db
+import backend.utils.handbook as handbook
 from backend.utils.quiz_generator import QuizGenerator
 import json
-from pypdf import PdfReader
-import docx
-import io
 from backend.utils.mock_test import MockTestGenerator
+from backend.utils.llm_cache import get_cache
+from backend.utils.single_flight import get_single_flight
+from backend.core.prefetch import Prefetcher
+from backend.core.quiz_bank import QuizBank
+from backend.utils.jobs import queue as job_queue
+from backend.utils import metrics, tracing
+from backend.utils.json_stream import extract_json, iter_json_elements
+from backend.utils.resume_extract import ResumeExtractor, ExtractionError, UploadTooLarge, text_hash, MAX_CHARS as RESUME_MAX_CHARS
 
 load_dotenv()
 
@@ -18,11 +28,91 @@ app = Flask(__name__,
             static_folder='frontend/static')
 app.secret_key = os.getenv('SECRET_KEY', os.urandom(24))
 
-# Store sessions in memory
-sessions = {}
+# Apply pending schema migrations once at startup
+db.init_db()
+
+# Learning sessions shared by all worker processes, with a per-worker LRU in front
+session_store = create_session_store()
 quiz_gen = QuizGenerator()
-perplexity_client = PerplexityClient()
+perplexity_client = get_client()
 mock_test_gen = MockTestGenerator()
+prefetcher = Prefetcher()
+quiz_bank = QuizBank(quiz_gen)
+resume_extractor = ResumeExtractor()
+
+# Default and maximum page sizes for cursor-paginated endpoints
+TOPICS_PAGE_SIZE = 50
+CHAT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 200
+# Stored resume analyses are reused for repeat uploads within this many seconds
+RESUME_CACHE_TTL = int(os.getenv('RESUME_CACHE_TTL', 7 * 24 * 3600))
+# Upstream calls made while serving one request share this many seconds, kept under the gunicorn timeout
+REQUEST_BUDGET = float(os.getenv('REQUEST_BUDGET', 100))
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def _start_request_budget():
+    resilience.set_request_budget(REQUEST_BUDGET)
+
+@app.before_request
+def _start_request_trace():
+    """Open the request's root span, reusing the caller's X-Request-ID when it looks sane"""
+    request_id = request.headers.get('X-Request-ID', '')
+    if not (0 < len(request_id) <= 128 and request_id.isprintable()):
+        request_id = None
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.trace_root = tracing.start_trace(f"{request.method} {route}", request_id=request_id,
+                                       method=request.method, route=route, path=request.path)
+
+@app.after_request
+def _finish_request_trace(response):
+    """Return the request id; the root span closes once the body, streamed or not, is sent"""
+    root = g.pop('trace_root', None)
+    if root is not None:
+        root.set(status=response.status_code)
+        response.headers['X-Request-ID'] = root.trace.request_id
+        response.call_on_close(lambda: tracing.end_trace(root))
+    return response
+
+@app.after_request
+def _record_request_metrics(response):
+    """Per-route latency, status and size; streamed bodies are timed to their first byte"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - started, request.method, route)
+        metrics.HTTP_REQUESTS.inc(request.method, route, str(response.status_code))
+        if response.content_length is not None:
+            metrics.HTTP_RESPONSE_BYTES.inc(request.method, route, amount=response.content_length)
+    return response
+
+def _prefetch_key(topic_id, learning_session, step_index, kind):
+    return (topic_id, step_index, learning_session.persona, learning_session.difficulty, kind)
+
+def _prefetch_next_step(topic_id, learning_session):
+    """Start generating the next step's guide, and top up its quiz bank, while the user reads"""
+    if not topic_id or not learning_session.roadmap:
+        return
+    next_index = learning_session.current_step_index + 1
+    step = learning_session.roadmap.get_step(next_index)
+    if not step:
+        return
+    prefetcher.submit(_prefetch_key(topic_id, learning_session, next_index, 'guide'),
+                      learning_session.get_detailed_guide_for_step, next_index)
+    quiz_bank.top_up(learning_session.roadmap.topic, step, learning_session.difficulty)
+
+def _page_limit(default):
+    """?limit= clamped to 1..MAX_PAGE_SIZE"""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def _take_prefetched(topic_id, learning_session, kind):
+    if not topic_id:
+        return None
+    return prefetcher.take(_prefetch_key(int(topic_id), learning_session, learning_session.current_step_index, kind))
 
 @app.route('/')
 def index():
@@ -33,39 +123,65 @@ def resume_session():
     session_id = request.cookies.get('session_id')
     topic_id = request.cookies.get('topic_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         if topic_id:
             try:
-                # Try to restore from DB if memory is lost
+                # Try to restore from DB if the session has expired
                 topic_data = db.get_topic(int(topic_id))
                 if topic_data:
-                    # Re-instantiate session
-                    from backend.core.session import LearningSession
-                    # We need to extract persona if possible, but default to General
-                    # Roadmap data is stored as JSON in DB
-                    roadmap = json.loads(topic_data['roadmap_data'])
-                    new_session = LearningSession(topic_data['name'], "General") 
-                    new_session.steps = roadmap['steps']
-                    new_session.current_step_index = topic_data['current_step']
-                    sessions[session_id] = new_session
+                    # Roadmap data is stored as JSON in DB, including persona and difficulty
+                    roadmap = topic_data['roadmap_data']
+                    learning_session = LearningSession.from_dict({
+                        'topic': topic_data['name'],
+                        'steps': roadmap['steps'],
+                        'index': topic_data['current_step'],
+                        'persona': roadmap.get('persona', 'General'),
+                        'difficulty': roadmap.get('difficulty', 'Intermediate')
+                    })
+                    session_id = session_id or os.urandom(16).hex()
+                    session_store.save(session_id, learning_session)
                 else:
                     return jsonify({'success': False, 'message': 'No session found'}), 404
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
         else:
             return jsonify({'success': False, 'message': 'No session found'}), 404
-            
-    learning_session = sessions[session_id]
-    step = learning_session.get_current_step()
     
-    return jsonify({
+    response = jsonify({
         'success': True,
-        'topic': learning_session.topic,
-        'steps': learning_session.steps,
+        'topic': learning_session.roadmap.topic,
+        'steps': learning_session.roadmap.steps,
         'currentStepIndex': learning_session.current_step_index,
         'persona': learning_session.persona,
-        'difficulty': "Intermediate" # Default if not stored
+        'difficulty': learning_session.difficulty
     })
+    response.set_cookie('session_id', session_id)
+    return response
+
+def _save_new_topic(session_id, learning_session, topic, persona, difficulty, previous_topic_id=None):
+    """Store the session and the new topic, and start prefetching; returns (topic_id, steps)"""
+    session_store.save(session_id, learning_session)
+    
+    steps = [
+        {
+            'number': step['number'],
+            'title': step['title'],
+            'details': step['details']
+        }
+        for step in learning_session.roadmap.steps
+    ]
+    
+    # Save to database
+    roadmap_data = {'topic': topic, 'steps': steps, 'persona': persona, 'difficulty': difficulty}
+    topic_id = db.save_topic(topic, roadmap_data, len(steps))
+    
+    # The user has left their previous topic, so its prefetched steps are no longer useful
+    if previous_topic_id and previous_topic_id.isdigit():
+        prefetcher.cancel_topic(int(previous_topic_id))
+    _prefetch_next_step(topic_id, learning_session)
+    
+    return topic_id, steps
 
 @app.route('/api/start-topic', methods=['POST'])
 def start_topic():
@@ -73,6 +189,7 @@ def start_topic():
     topic = data.get('topic')
     persona = data.get('persona', 'General')
     difficulty = data.get('difficulty', 'Intermediate')
+    regenerate = bool(data.get('regenerate', False))
     
     if not topic:
         return jsonify({'error': 'Topic is required'}), 400
@@ -81,28 +198,17 @@ def start_topic():
     learning_session = LearningSession(persona=persona, difficulty=difficulty)
     
     try:
-        roadmap = learning_session.start_new_topic(topic)
-        sessions[session_id] = learning_session
-        
-        steps = [
-            {
-                'number': step['number'],
-                'title': step['title'],
-                'details': step['details']
-            }
-            for step in roadmap.steps
-        ]
-        
-        # Save to database
-        roadmap_data = {'topic': topic, 'steps': steps, 'persona': persona, 'difficulty': difficulty}
-        topic_id = db.save_topic(topic, roadmap_data, len(steps))
+        learning_session.start_new_topic(topic, regenerate=regenerate)
+        topic_id, steps = _save_new_topic(session_id, learning_session, topic, persona, difficulty,
+                                          request.cookies.get('topic_id'))
         
         response = jsonify({
             'success': True,
             'topic': topic,
             'topic_id': topic_id,
             'steps': steps,
-            'currentStep': 0
+            'currentStep': 0,
+            'fromLibrary': learning_session.from_library
         })
         response.set_cookie('session_id', session_id)
         response.set_cookie('topic_id', str(topic_id))
@@ -110,17 +216,62 @@ def start_topic():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/start-topic/stream', methods=['POST'])
+def start_topic_stream():
+    """
+    Start a topic, streaming each roadmap step as a Server-Sent Event as soon as it is parsed.
+    The final 'done' event carries the same fields as /api/start-topic; the topic_id cookie
+    cannot be set once streaming has begun, so the client sets it from that event.
+    """
+    data = request.json
+    topic = data.get('topic')
+    persona = data.get('persona', 'General')
+    difficulty = data.get('difficulty', 'Intermediate')
+    regenerate = bool(data.get('regenerate', False))
+    
+    if not topic:
+        return jsonify({'error': 'Topic is required'}), 400
+    
+    session_id = request.cookies.get('session_id', os.urandom(16).hex())
+    previous_topic_id = request.cookies.get('topic_id')
+    learning_session = LearningSession(persona=persona, difficulty=difficulty)
+    
+    def generate():
+        try:
+            for step in learning_session.stream_new_topic(topic, regenerate=regenerate):
+                yield _sse('step', {'number': step['number'], 'title': step['title'], 'details': step['details']})
+            topic_id, steps = _save_new_topic(session_id, learning_session, topic, persona, difficulty,
+                                              previous_topic_id)
+            yield _sse('done', {
+                'success': True,
+                'topic': topic,
+                'topic_id': topic_id,
+                'steps': steps,
+                'currentStep': 0,
+                'fromLibrary': learning_session.from_library
+            })
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+    
+    response = _sse_response(generate())
+    response.set_cookie('session_id', session_id)
+    return response
+
 @app.route('/api/get-guide', methods=['POST'])
 def get_guide():
     session_id = request.cookies.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
-    
-    learning_session = sessions[session_id]
+    topic_id = request.cookies.get('topic_id')
     
     try:
-        guide = learning_session.get_detailed_guide_for_step()
+        guide = _take_prefetched(topic_id, learning_session, 'guide')
+        if guide is None:
+            guide = learning_session.get_detailed_guide_for_step()
+        if topic_id:
+            _prefetch_next_step(int(topic_id), learning_session)
         return jsonify({
             'success': True,
             'guide': guide
@@ -133,15 +284,16 @@ def next_step():
     session_id = request.cookies.get('session_id')
     topic_id = request.cookies.get('topic_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
-    
-    learning_session = sessions[session_id]
     step = learning_session.next_step()
+    session_store.save(session_id, learning_session)
     
     # Update progress in database
     if topic_id:
         db.update_topic_progress(int(topic_id), learning_session.current_step_index)
+        _prefetch_next_step(int(topic_id), learning_session)
     
     if step:
         return jsonify({
@@ -160,34 +312,54 @@ def next_step():
             'message': 'You have completed the roadmap!'
         })
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    """Handle chat messages with persona awareness"""
-    data = request.json
-    message = data.get('message')
-    topic_id = request.cookies.get('topic_id')
+def _sse(event, data):
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _sse_response(generator):
+    response = Response(stream_with_context(generator), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop proxies from buffering the stream
+    return response
+
+@app.route('/api/get-guide/stream', methods=['POST'])
+def get_guide_stream():
+    """Stream the guide for the current step as Server-Sent Events"""
     session_id = request.cookies.get('session_id')
     
-    if not message:
-        return jsonify({'error': 'Message is required'}), 400
-    
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
+    topic_id = request.cookies.get('topic_id')
+    prefetched = _take_prefetched(topic_id, learning_session, 'guide')
+    if topic_id:
+        _prefetch_next_step(int(topic_id), learning_session)
     
-    learning_session = sessions[session_id]
+    def generate():
+        try:
+            if prefetched is not None:
+                yield _sse('delta', {'text': prefetched})
+            else:
+                for chunk in learning_session.stream_detailed_guide_for_step():
+                    yield _sse('delta', {'text': chunk})
+            yield _sse('done', {'success': True})
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+    
+    return _sse_response(generate())
+
+def _build_chat_messages(learning_session, message):
+    persona_styles = {
+        "General": "helpful and clear",
+        "Scientist": "academic, precise, and highly technical",
+        "ELI5": "extremely simple, using analogies that a 5-year-old would understand",
+        "Socratic": "inquisitive, answering with questions that guide the user to discover the answer themselves"
+    }
+    style = persona_styles.get(learning_session.persona, "helpful")
     current_step = learning_session.get_current_step()
     
-    try:
-        persona_styles = {
-            "General": "helpful and clear",
-            "Scientist": "academic, precise, and highly technical",
-            "ELI5": "extremely simple, using analogies that a 5-year-old would understand",
-            "Socratic": "inquisitive, answering with questions that guide the user to discover the answer themselves"
-        }
-        style = persona_styles.get(learning_session.persona, "helpful")
-        
-        # Build context-aware prompt
-        context = f"""You are a {learning_session.persona} learning assistant. Your teaching style is {style}.
+    # Build context-aware prompt
+    context = f"""You are a {learning_session.persona} learning assistant. Your teaching style is {style}.
 The user is currently learning about:
 Topic: {learning_session.roadmap.topic}
 Difficulty: {learning_session.difficulty}
@@ -196,9 +368,27 @@ Current Step: {current_step['title']}
 User question: {message}
 
 Provide a clear, helpful answer in your assigned style ({style}) that relates to their current learning step."""
-        
-        messages = [{"role": "user", "content": context}]
-        response = perplexity_client.chat_completion(messages)
+    
+    return [{"role": "user", "content": context}]
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    """Handle chat messages with persona awareness"""
+    data = request.json
+    message = data.get('message')
+    topic_id = request.cookies.get('topic_id')
+    session_id = request.cookies.get('session_id')
+    
+    if not message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
+        return jsonify({'error': 'No active session'}), 400
+    
+    try:
+        messages = _build_chat_messages(learning_session, message)
+        response = perplexity_client.chat_completion(messages, endpoint='chat')
         ai_response = response['choices'][0]['message']['content']
         
         # Save to database
@@ -213,24 +403,55 @@ Provide a clear, helpful answer in your assigned style ({style}) that relates to
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream a chat answer as Server-Sent Events, saving the exchange once it completes"""
+    data = request.json
+    message = data.get('message')
+    topic_id = request.cookies.get('topic_id')
+    session_id = request.cookies.get('session_id')
+    
+    if not message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
+        return jsonify({'error': 'No active session'}), 400
+    step_index = learning_session.current_step_index
+    messages = _build_chat_messages(learning_session, message)
+    
+    def generate():
+        chunks = []
+        try:
+            for delta in perplexity_client.chat_completion_stream(messages, endpoint='chat'):
+                chunks.append(delta)
+                yield _sse('delta', {'text': delta})
+        except Exception as e:
+            yield _sse('error', {'error': str(e)})
+            return
+        
+        # Save to database only once the full answer has arrived
+        ai_response = ''.join(chunks)
+        if topic_id:
+            db.save_chat_message(int(topic_id), step_index, 'user', message)
+            db.save_chat_message(int(topic_id), step_index, 'assistant', ai_response)
+        yield _sse('done', {'success': True})
+    
+    return _sse_response(generate())
+
 @app.route('/api/generate-quiz', methods=['POST'])
 def generate_quiz():
     """Generate a quiz for the current step"""
     session_id = request.cookies.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
-    
-    learning_session = sessions[session_id]
     current_step = learning_session.get_current_step()
     
     try:
-        step_details = '\n'.join(current_step['details']) if current_step['details'] else current_step['title']
-        questions = quiz_gen.generate_quiz(
-            learning_session.roadmap.topic,
-            current_step['title'],
-            step_details
-        )
+        questions = quiz_bank.take(session_id, learning_session.roadmap.topic, current_step,
+                                   learning_session.difficulty)
         
         return jsonify({
             'success': True,
@@ -248,11 +469,10 @@ def submit_quiz():
     topic_id = request.cookies.get('topic_id')
     session_id = request.cookies.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
     
-    learning_session = sessions[session_id]
-    
     # Calculate score
     correct = 0
     results = []
@@ -294,11 +514,10 @@ def save_note():
     if not content:
         return jsonify({'error': 'Content is required'}), 400
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
     
-    learning_session = sessions[session_id]
-    
     if topic_id:
         db.save_note(int(topic_id), learning_session.current_step_index, content)
     
@@ -310,99 +529,143 @@ def get_note():
     topic_id = request.cookies.get('topic_id')
     session_id = request.cookies.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
     
-    learning_session = sessions[session_id]
-    
     if topic_id:
         note = db.get_note(int(topic_id), learning_session.current_step_index)
         return jsonify({'success': True, 'note': note})
     
     return jsonify({'success': True, 'note': None})
 
+@app.route('/api/pool-stats', methods=['GET'])
+def pool_stats():
+    """Connection pool statistics for the shared Perplexity client"""
+    return jsonify({'success': True, 'clients': get_pool_stats()})
+
+@app.route('/api/resilience-stats', methods=['GET'])
+def resilience_stats():
+    """Circuit breaker state and hedged request outcomes for the shared Perplexity client"""
+    return jsonify({'success': True, 'clients': get_resilience_stats()})
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the LLM response cache and coalesced in-flight calls"""
+    return jsonify({'success': True, 'cache': get_cache().stats(), 'single_flight': get_single_flight().stats()})
+
+@app.route('/api/prefetch-stats', methods=['GET'])
+def prefetch_stats():
+    """Counters for speculative guide prefetching"""
+    return jsonify({'success': True, 'prefetch': prefetcher.stats()})
+
+@app.route('/api/quiz-bank-stats', methods=['GET'])
+def quiz_bank_stats():
+    """Counters for quizzes served from the quiz bank and background refills"""
+    return jsonify({'success': True, 'quiz_bank': quiz_bank.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, upstream call and token metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/trace-stats', methods=['GET'])
+def trace_stats():
+    """Counts of exported traces, spans and slow requests"""
+    return jsonify({'success': True, 'tracing': tracing.export_stats()})
+
+@app.route('/api/db-stats', methods=['GET'])
+def db_stats():
+    """Queue depth and flush timings for batched database writes"""
+    return jsonify({'success': True, 'write_behind': db.write_behind_stats()})
+
 @app.route('/api/topics', methods=['GET'])
 def get_topics():
-    """Get all topics"""
-    topics = db.get_all_topics()
-    return jsonify({'success': True, 'topics': topics})
+    """Get a page of topics, most recently accessed first (?limit=&cursor=)"""
+    limit = _page_limit(TOPICS_PAGE_SIZE)
+    try:
+        topics, next_cursor = db.get_topics_page(limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, 'topics': topics, 'nextCursor': next_cursor})
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get learning statistics"""
-    topics = db.get_all_topics()
-    total_topics = len(topics)
-    completed_topics = len([t for t in topics if t['completed']])
-    
-    # Calculate total steps across all topics
-    total_steps = sum([t['total_steps'] for t in topics])
-    current_steps = sum([t['current_step'] + 1 for t in topics]) # +1 because current_step is 0-indexed
+    stats = db.get_learning_stats()
+    total_steps = stats['total_steps']
     
     return jsonify({
         'success': True,
-        'totalTopics': total_topics,
-        'completedTopics': completed_topics,
-        'progress': round((current_steps / total_steps) * 100) if total_steps > 0 else 0
+        'totalTopics': stats['total_topics'],
+        'completedTopics': stats['completed_topics'],
+        'progress': round((stats['current_steps'] / total_steps) * 100) if total_steps > 0 else 0,
+        'quizAverages': [
+            {
+                'topicId': q['topic_id'],
+                'name': q['name'],
+                'attempts': q['attempts'],
+                'averageScore': q['average_score']
+            }
+            for q in stats['quiz_averages']
+        ]
     })
 
 @app.route('/api/export', methods=['GET'])
 def export_handbook():
-    """Export the current learning session as a Markdown handbook"""
+    """Stream the current learning session as a Markdown handbook"""
     topic_id = request.cookies.get('topic_id')
     session_id = request.cookies.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return "No active session found.", 400
-    
-    learning_session = sessions[session_id]
     topic_data = db.get_topic(int(topic_id))
     
     if not topic_data:
         return "Topic not found.", 404
     
-    md_content = f"# Learning Handbook: {topic_data['name']}\n"
-    md_content += f"**Persona:** {learning_session.persona} | **Difficulty:** {learning_session.difficulty}\n\n"
-    md_content += "## Roadmap\n"
-    for i, step in enumerate(topic_data['roadmap_data']['steps']):
-        md_content += f"### Step {i+1}: {step['title']}\n"
-        for detail in step['details']:
-            md_content += f"- {detail}\n"
-        
-        # Add Note
-        note = db.get_note(int(topic_id), i)
-        if note:
-            md_content += f"\n#### My Notes\n> {note}\n"
-        
-        # Add Chat History
-        chat_history = db.get_chat_history(int(topic_id), i)
-        if chat_history:
-            md_content += f"\n#### Chat History\n"
-            for msg in chat_history:
-                md_content += f"**{msg['role'].capitalize()}:** {msg['message']}\n\n"
-        
-        md_content += "\n---\n"
-    
-    response = make_response(md_content)
-    response.headers["Content-Disposition"] = f"attachment; filename={topic_data['name'].replace(' ', '_')}_Handook.md"
-    response.headers["Content-Type"] = "text/markdown"
+    chunks = handbook.iter_handbook(topic_data, learning_session.persona, learning_session.difficulty)
+    response = Response(stream_with_context(chunks), mimetype='text/markdown')
+    response.headers["Content-Disposition"] = f"attachment; filename={handbook.handbook_filename(topic_data['name'])}"
     return response
 
+@app.route('/api/export-all', methods=['GET'])
+def export_all_handbooks():
+    """Stream every topic as a zip of Markdown handbooks (default) or as NDJSON (?format=ndjson)"""
+    export_format = request.args.get('format', 'zip')
+    
+    if export_format == 'ndjson':
+        response = Response(stream_with_context(handbook.iter_ndjson(db.iter_topics())), mimetype='application/x-ndjson')
+        response.headers["Content-Disposition"] = "attachment; filename=learning_handbooks.ndjson"
+        return response
+    if export_format == 'zip':
+        response = Response(stream_with_context(handbook.iter_zip(db.iter_topics())), mimetype='application/zip')
+        response.headers["Content-Disposition"] = "attachment; filename=learning_handbooks.zip"
+        return response
+    
+    return jsonify({'error': 'format must be zip or ndjson'}), 400
+
 @app.route('/api/chat-history', methods=['GET'])
 def get_chat_history():
     """Get chat history for current step"""
     topic_id = request.cookies.get('topic_id')
     session_id = request.cookies.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
     
-    learning_session = sessions[session_id]
-    
     if topic_id:
-        history = db.get_chat_history(int(topic_id), learning_session.current_step_index)
-        return jsonify({'success': True, 'history': history})
+        limit = _page_limit(CHAT_PAGE_SIZE)
+        try:
+            history, next_cursor = db.get_chat_history_page(
+                int(topic_id), learning_session.current_step_index, limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'success': True, 'history': history, 'nextCursor': next_cursor})
     
-    return jsonify({'success': True, 'history': []})
+    return jsonify({'success': True, 'history': [], 'nextCursor': None})
 
 @app.route('/api/get-resources', methods=['POST'])
 def get_resources():
@@ -420,16 +683,10 @@ def get_resources():
         No other text."""
         
         messages = [{"role": "user", "content": prompt}]
-        response = perplexity_client.chat_completion(messages)
+        response = perplexity_client.chat_completion(messages, endpoint='resources')
         ai_response = response['choices'][0]['message']['content']
         
-        # Extract JSON from response if there's any markdown wrapping
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
-            
-        resources = json.loads(ai_response)
+        resources = extract_json(ai_response, expect='array')
         
         return jsonify({
             'success': True,
@@ -444,11 +701,7 @@ def get_resources():
             ]
         })
 
-@app.route('/api/generate-assessment', methods=['POST'])
-def generate_assessment():
-    """Generate career assessment questions"""
-    try:
-        prompt = """Create a comprehensive career path assessment test. 
+ASSESSMENT_PROMPT = """Create a comprehensive career path assessment test. 
         Generate 10 questions that help identify a person's interests, strengths, and ideal career domain (e.g., Software Engineering, Data Science, Cyber Security, UI/UX Design, Digital Marketing, Artificial Intelligence).
         For each question, provide 4 distinct options that map toward different career paths.
         
@@ -467,76 +720,49 @@ def generate_assessment():
           ...
         ]
         Return ONLY the JSON list."""
-        
+
+# Static questions used when the AI is unreachable so the user isn't stuck
+FALLBACK_ASSESSMENT_QUESTIONS = [
+    {
+        "id": 1,
+        "question": "Which activity do you find most engaging?",
+        "options": {"A": "Designing visual layouts", "B": "Analyzing data trends", "C": "Solving logic puzzles", "D": "Securing systems"}
+    },
+    {
+        "id": 2,
+        "question": "How do you prefer to solve problems?",
+        "options": {"A": "Through creative expression", "B": "Using statistical methods", "C": "Writing code/algorithms", "D": "Investigating vulnerabilities"}
+    },
+    # Add more fallback questions if needed or keep it short for outage mode
+    {
+        "id": 3,
+        "question": "What interests you most about technology?",
+        "options": {"A": "User interfaces", "B": "Machine learning", "C": "Building applications", "D": "Network security"}
+    }
+]
+
+@app.route('/api/generate-assessment', methods=['POST'])
+def generate_assessment():
+    """Generate career assessment questions"""
+    try:
         try:
-            messages = [{"role": "user", "content": prompt}]
-            response = perplexity_client.chat_completion(messages)
+            messages = [{"role": "user", "content": ASSESSMENT_PROMPT}]
+            response = perplexity_client.chat_completion(messages, endpoint='assessment')
             ai_response = response['choices'][0]['message']['content']
         except Exception as e:
             # Fallback if AI fails completely (connection error even after retries)
             print(f"AI Generation failed: {e}")
-            # Return a static set of fallback questions so the user isn't stuck
             return jsonify({
                 'success': True,
-                'questions': [
-                    {
-                        "id": 1,
-                        "question": "Which activity do you find most engaging?",
-                        "options": {"A": "Designing visual layouts", "B": "Analyzing data trends", "C": "Solving logic puzzles", "D": "Securing systems"}
-                    },
-                    {
-                        "id": 2,
-                        "question": "How do you prefer to solve problems?",
-                        "options": {"A": "Through creative expression", "B": "Using statistical methods", "C": "Writing code/algorithms", "D": "Investigating vulnerabilities"}
-                    },
-                    # Add more fallback questions if needed or keep it short for outage mode
-                    {
-                        "id": 3,
-                        "question": "What interests you most about technology?",
-                        "options": {"A": "User interfaces", "B": "Machine learning", "C": "Building applications", "D": "Network security"}
-                    }
-                ],
+                'questions': FALLBACK_ASSESSMENT_QUESTIONS,
                 'is_fallback': True
             })
         
-        # Enhanced JSON extraction with multiple fallback strategies
-        questions = None
-        
-        # Strategy 1: Try to extract from markdown code blocks
-        if "```json" in ai_response:
-            try:
-                json_str = ai_response.split("```json")[1].split("```")[0].strip()
-                questions = json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                pass
-        
-        # Strategy 2: Try generic code blocks
-        if not questions and "```" in ai_response:
-            try:
-                json_str = ai_response.split("```")[1].split("```")[0].strip()
-                questions = json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                pass
-        
-        # Strategy 3: Try to find JSON array directly (look for first [ to last ])
-        if not questions:
-            try:
-                start_idx = ai_response.find('[')
-                end_idx = ai_response.rfind(']')
-                if start_idx != -1 and end_idx != -1:
-                    json_str = ai_response[start_idx:end_idx+1]
-                    questions = json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
-        
-        # Strategy 4: Try the entire response as-is
-        if not questions:
-            try:
-                questions = json.loads(ai_response.strip())
-            except json.JSONDecodeError:
-                pass
+        try:
+            questions = extract_json(ai_response, expect='array')
+        except ValueError:
+            questions = None
         
-        # If all strategies failed, return a helpful error
         if not questions:
             return jsonify({
                 'error': 'Failed to parse assessment questions from AI response',
@@ -553,6 +779,42 @@ def generate_assessment():
             'details': 'The AI service may be experiencing high load. Please try again in a moment.'
         }), 500
 
+@app.route('/api/generate-assessment/stream', methods=['POST'])
+def generate_assessment_stream():
+    """
+    Send assessment questions as Server-Sent Events, one 'question' event each. The prompt
+    never changes, so the completion comes from the cached (and coalesced) non-streaming
+    call and the questions go out as one burst instead of opening an upstream stream per
+    page load.
+    """
+    def generate():
+        sent = 0
+        try:
+            messages = [{"role": "user", "content": ASSESSMENT_PROMPT}]
+            response = perplexity_client.chat_completion(messages, endpoint='assessment')
+            ai_response = response['choices'][0]['message']['content']
+            for kind, value in iter_json_elements([ai_response], expect='array'):
+                if kind == 'element':
+                    path, question = value
+                    if path == () and isinstance(question, dict):
+                        sent += 1
+                        yield _sse('question', question)
+                else:
+                    # Questions the scanner could not report one by one are sent at the end
+                    for question in value[sent:]:
+                        yield _sse('question', question)
+                    yield _sse('done', {'success': True, 'count': len(value)})
+        except Exception as e:
+            print(f"AI Generation failed: {e}")
+            if sent:
+                yield _sse('error', {'error': f'Assessment generation failed: {str(e)}'})
+                return
+            for question in FALLBACK_ASSESSMENT_QUESTIONS:
+                yield _sse('question', question)
+            yield _sse('done', {'success': True, 'count': len(FALLBACK_ASSESSMENT_QUESTIONS), 'is_fallback': True})
+    
+    return _sse_response(generate())
+
 @app.route('/api/analyze-assessment', methods=['POST'])
 def analyze_assessment():
     """Analyze assessment answers and suggest a career domain"""
@@ -590,7 +852,7 @@ def analyze_assessment():
         
         try:
             messages = [{"role": "user", "content": prompt}]
-            response = perplexity_client.chat_completion(messages)
+            response = perplexity_client.chat_completion(messages, endpoint='assessment_analysis')
             ai_response = response['choices'][0]['message']['content']
         except Exception as e:
             print(f"AI Analysis failed: {e}")
@@ -605,13 +867,7 @@ def analyze_assessment():
                 'is_fallback': True
             })
         
-        # Extract JSON
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
-            
-        result = json.loads(ai_response)
+        result = extract_json(ai_response, expect='object')
         
         return jsonify({
             'success': True,
@@ -626,11 +882,10 @@ def clear_chat():
     topic_id = request.cookies.get('topic_id')
     session_id = request.cookies.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    learning_session = session_store.get(session_id) if session_id else None
+    if not learning_session:
         return jsonify({'error': 'No active session'}), 400
     
-    learning_session = sessions[session_id]
-    
     if topic_id:
         db.clear_chat_history(int(topic_id), learning_session.current_step_index)
         return jsonify({'success': True})
@@ -641,37 +896,13 @@ def clear_chat():
 def resume_analyzer():
     return render_template('resume.html')
 
-@app.route('/api/analyze-resume', methods=['POST'])
-def analyze_resume():
-    if 'resume' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['resume']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
-    
-    try:
-        text = ""
-        if file.filename.endswith('.pdf'):
-            reader = PdfReader(file)
-            for page in reader.pages:
-                text += page.extract_text()
-        elif file.filename.endswith('.docx'):
-            doc = docx.Document(file)
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-        else:
-            return jsonify({'error': 'Unsupported file format'}), 400
-        
-        if len(text.strip()) < 50:
-            return jsonify({'error': 'Could not extract enough text from resume'}), 400
-
-        # AI Analysis
-        prompt = f"""You are an expert ATS (Applicant Tracking System) and Career Coach. 
+def _analyze_resume_text(text):
+    """Ask the LLM for an ATS review of extracted resume text"""
+    prompt = f"""You are an expert ATS (Applicant Tracking System) and Career Coach. 
         Analyze the following resume text and provide a detailed review.
         
         Resume Content:
-        {text[:4000]} # Limit text for API tokens
+        {text[:RESUME_MAX_CHARS]} # Limit text for API tokens
         
         Return your response EXACTLY as a JSON object:
         {{
@@ -683,26 +914,78 @@ def analyze_resume():
           "recommendations": ["list of 3 points"]
         }}
         Return ONLY the JSON object."""
+    
+    messages = [{"role": "user", "content": prompt}]
+    response = perplexity_client.chat_completion(messages, endpoint='resume')
+    ai_response = response['choices'][0]['message']['content']
+    
+    return extract_json(ai_response, expect='object')
+
+def _analyze_resume(payload):
+    """Analyze resume text and store the result under its file and text hashes"""
+    analysis = _analyze_resume_text(payload['text'])
+    if payload.get('file_hash'):
+        db.save_resume_analysis(payload['file_hash'], payload['text_hash'], analysis, RESUME_CACHE_TTL)
+    return analysis
+
+@app.route('/api/analyze-resume', methods=['POST'])
+def analyze_resume():
+    # Reject oversized bodies before the multipart form is parsed (64 KB allowance for form overhead)
+    if request.content_length and request.content_length > resume_extractor.max_upload_bytes + 64 * 1024:
+        return jsonify({'error': 'Resume file is too large'}), 413
+    
+    if 'resume' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    file = request.files['resume']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    # ?regenerate=1 (or a regenerate form field) skips the stored analysis
+    regenerate = request.values.get('regenerate', '').lower() in ('1', 'true', 'yes')
+    
+    try:
+        with resume_extractor.receive(file.filename, file.stream) as upload:
+            # The same file uploaded again skips both parsing and the LLM call
+            cached = None if regenerate else db.get_resume_analysis(file_hash=upload.sha256, max_age=RESUME_CACHE_TTL)
+            if cached is not None:
+                return jsonify({'success': True, 'analysis': cached, 'cached': True})
+            text = resume_extractor.extract(upload)
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ExtractionError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        if len(text.strip()) < 50:
+            return jsonify({'error': 'Could not extract enough text from resume'}), 400
         
-        messages = [{"role": "user", "content": prompt}]
-        response = perplexity_client.chat_completion(messages)
-        ai_response = response['choices'][0]['message']['content']
+        # A different file with the same text (e.g. re-exported) still reuses the analysis
+        text_key = text_hash(text)
+        cached = None if regenerate else db.get_resume_analysis(text_hash=text_key, max_age=RESUME_CACHE_TTL)
+        if cached is not None:
+            db.alias_resume_analysis(upload.sha256, text_key)
+            return jsonify({'success': True, 'analysis': cached, 'cached': True})
         
-        # Extract JSON
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
-            
-        analysis = json.loads(ai_response)
+        payload = {'text': text, 'file_hash': upload.sha256, 'text_hash': text_key}
+        if _wants_job():
+            return _job_accepted(job_queue.submit('analyze_resume', payload))
+        
+        analysis = _analyze_resume(payload)
         
         return jsonify({
             'success': True,
-            'analysis': analysis
+            'analysis': analysis,
+            'cached': False
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/resume-stats', methods=['GET'])
+def resume_stats():
+    """Extraction timings and failure counters for resume uploads"""
+    return jsonify({'success': True, 'extraction': resume_extractor.stats()})
+
 @app.route('/job-market')
 def job_market():
     return render_template('market.html')
@@ -715,19 +998,24 @@ def mock_test():
 def progress():
     return render_template('progress.html')
 
-@app.route('/api/generate-mock-test', methods=['POST'])
-def generate_mock_test():
+def _mock_test_domain():
+    """Topic of the current learning session or topic cookie, for mock test generation"""
     session_id = request.cookies.get('session_id')
     topic_id = request.cookies.get('topic_id')
     
     domain = "Software Engineering"  # Default
-    if session_id in sessions:
-        domain = sessions[session_id].roadmap.topic
+    learning_session = session_store.get(session_id) if session_id else None
+    if learning_session and learning_session.roadmap:
+        domain = learning_session.roadmap.topic
     elif topic_id:
         topic_data = db.get_topic(int(topic_id))
         if topic_data:
             domain = topic_data['name']
-            
+    return domain
+
+@app.route('/api/generate-mock-test', methods=['POST'])
+def generate_mock_test():
+    domain = _mock_test_domain()
     try:
         test_data = mock_test_gen.generate_mock_test(domain)
         return jsonify({
@@ -738,26 +1026,59 @@ def generate_mock_test():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/generate-mock-test/stream', methods=['POST'])
+def generate_mock_test_stream():
+    """
+    Stream a mock test as Server-Sent Events: 'domain' first, then an 'mcq' or
+    'subjective' event as each question is complete, and 'done' with the whole test
+    """
+    domain = _mock_test_domain()
+    
+    def generate():
+        yield _sse('domain', {'domain': domain})
+        try:
+            for kind, value in mock_test_gen.stream_mock_test(domain):
+                if kind == 'done':
+                    yield _sse('done', {'success': True, 'data': value, 'domain': domain})
+                else:
+                    yield _sse(kind, value)
+        except Exception as e:
+            print(f"Mock test generation failed: {e}")
+            yield _sse('error', {'error': str(e)})
+    
+    return _sse_response(generate())
+
+def _evaluate_mock_test(payload):
+    """Grade a mock test and save the result when it belongs to a topic"""
+    results = mock_test_gen.evaluate_test(payload['topic'], payload['mcq_answers'], payload['subjective_answers'],
+                                          payload['questions'], grading_mode=payload.get('grading_mode'))
+    
+    # Save results to database
+    if payload.get('topic_id'):
+        db.save_mock_test_result(int(payload['topic_id']), results)
+    return results
+
 @app.route('/api/evaluate-mock-test', methods=['POST'])
 def evaluate_mock_test():
     data = request.json
-    topic = data.get('topic')
-    mcq_answers = data.get('mcq_answers', {})
-    subjective_answers = data.get('subjective_answers', {})
-    questions = data.get('questions')
-    
-    # Get topic_id from cookies for database saving
-    topic_id = request.cookies.get('topic_id')
+    payload = {
+        'topic': data.get('topic'),
+        'mcq_answers': data.get('mcq_answers', {}),
+        'subjective_answers': data.get('subjective_answers', {}),
+        'questions': data.get('questions'),
+        'grading_mode': data.get('grading_mode'),
+        # Get topic_id from cookies for database saving
+        'topic_id': request.cookies.get('topic_id')
+    }
     
-    if not questions:
+    if not payload['questions']:
         return jsonify({'error': 'Questions are required for evaluation'}), 400
         
     try:
-        results = mock_test_gen.evaluate_test(topic, mcq_answers, subjective_answers, questions)
+        if _wants_job():
+            return _job_accepted(job_queue.submit('evaluate_mock_test', payload))
         
-        # Save results to database
-        if topic_id:
-            db.save_mock_test_result(int(topic_id), results)
+        results = _evaluate_mock_test(payload)
             
         return jsonify({
             'success': True,
@@ -766,70 +1087,142 @@ def evaluate_mock_test():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _build_progress_report(payload):
+    """Generate an AI career readiness report from a topic's progress"""
+    topic_id = payload['topic_id']
+    topic_data = db.get_topic(int(topic_id))
+    quiz_results = db.get_quiz_results(int(topic_id))
+    mock_results = db.get_mock_test_results(int(topic_id))
+    
+    # Prepare context for AI
+    report_context = {
+        "domain": topic_data['name'],
+        "total_steps": topic_data['total_steps'],
+        "current_step": topic_data['current_step'],
+        "quizzes": quiz_results,
+        "mock_tests": mock_results
+    }
+    
+    prompt = f"""Analyze the following learning progress for the domain "{topic_data['name']}" and provide a career readiness report.
+    
+    Data:
+    {json.dumps(report_context, indent=2)}
+    
+    Based on this data, provide:
+    1. A "readinessScore" (0-100).
+    2. A "status" (e.g., "Learning", "Ready", "Expert").
+    3. A list of "softSkills" the user should focus on for this specific domain.
+    4. A "summary" of their journey and what's next.
+    
+    Return your response EXACTLY as a JSON object:
+    {{
+      "readinessScore": 75,
+      "status": "Ready to Apply",
+      "softSkills": ["Communication", "Problem Solving", "Time Management"],
+      "summary": "You have completed most of the roadmap with high scores...",
+      "nextSteps": "Complete the final project and start applying for junior roles."
+    }}
+    Return ONLY the JSON object."""
+    
+    messages = [{"role": "user", "content": prompt}]
+    response = perplexity_client.chat_completion(messages, endpoint='report')
+    ai_response = response['choices'][0]['message']['content']
+    
+    report = extract_json(ai_response, expect='object')
+    return {'report': report, 'raw_data': report_context}
+
 @app.route('/api/progress-report', methods=['GET'])
 def get_progress_report():
     """Generate a comprehensive progress report using AI"""
     topic_id = request.cookies.get('topic_id')
-    session_id = request.cookies.get('session_id')
     
     if not topic_id:
         return jsonify({'error': 'No topic selected'}), 400
         
     try:
-        topic_data = db.get_topic(int(topic_id))
-        quiz_results = db.get_quiz_results(int(topic_id))
-        mock_results = db.get_mock_test_results(int(topic_id))
-        
-        # Prepare context for AI
-        report_context = {
-            "domain": topic_data['name'],
-            "total_steps": topic_data['total_steps'],
-            "current_step": topic_data['current_step'],
-            "quizzes": quiz_results,
-            "mock_tests": mock_results
-        }
+        if _wants_job():
+            return _job_accepted(job_queue.submit('progress_report', {'topic_id': topic_id}))
         
-        prompt = f"""Analyze the following learning progress for the domain "{topic_data['name']}" and provide a career readiness report.
-        
-        Data:
-        {json.dumps(report_context, indent=2)}
-        
-        Based on this data, provide:
-        1. A "readinessScore" (0-100).
-        2. A "status" (e.g., "Learning", "Ready", "Expert").
-        3. A list of "softSkills" the user should focus on for this specific domain.
-        4. A "summary" of their journey and what's next.
-        
-        Return your response EXACTLY as a JSON object:
-        {{
-          "readinessScore": 75,
-          "status": "Ready to Apply",
-          "softSkills": ["Communication", "Problem Solving", "Time Management"],
-          "summary": "You have completed most of the roadmap with high scores...",
-          "nextSteps": "Complete the final project and start applying for junior roles."
-        }}
-        Return ONLY the JSON object."""
-        
-        messages = [{"role": "user", "content": prompt}]
-        response = perplexity_client.chat_completion(messages)
-        ai_response = response['choices'][0]['message']['content']
-        
-        # Extract JSON
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
-            
-        report = json.loads(ai_response)
+        result = _build_progress_report({'topic_id': topic_id})
         
         return jsonify({
             'success': True,
-            'report': report,
-            'raw_data': report_context
+            'report': result['report'],
+            'raw_data': result['raw_data']
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+class AIResponseError(Exception):
+    """The AI answered but its response could not be parsed"""
+    def __init__(self, message, raw_response):
+        super().__init__(message)
+        self.raw_response = raw_response[:500]  # First 500 chars for debugging
+
+def _fetch_job_market_data(payload):
+    """Ask the LLM for job market data for a domain"""
+    domain = payload['domain']
+    prompt = f"""Provide a real-time comprehensive job market analysis for the domain: {domain} and general tech trends for 2026.
+    
+    TASK: Find 3 ACTUAL internships and 3 ACTUAL job openings for {domain}.
+    
+    LINK RELIABILITY RULES:
+    1. INTERNSHIPS: Try to provide direct URLs.
+    2. JOBS: To prevent "No Match Found", use these exact search templates if a direct URL is unavailable:
+       - LinkedIn: https://www.linkedin.com/jobs/search/?keywords={{Job+Title}}+at+{{Company}}
+       - Indeed: https://www.indeed.com/jobs?q={{Job+Title}}+{{Company}}
+    3. Replace {{Job+Title}} and {{Company}} with the actual values (use + for spaces).
+    4. ONLY return legitimate, currently active companies.
+    
+    Return your response EXACTLY as a JSON object with this structure:
+    {{
+      "trends": {{
+        "labels": ["Domain 1", "Domain 2", "Domain 3", "Domain 4", "Domain 5"],
+        "values": [number1-100, number2-100, number3-100, number4-100, number5-100]
+      }},
+      "domainTraffic": {{
+        "labels": ["Month 1", "Month 2", "Month 3", "Month 4", "Month 5", "Month 6"],
+        "values": [number1, number2, number3, number4, number5, number6]
+      }},
+      "salaries": {{
+        "fresher": "$60k - $80k",
+        "experienced": "$120k - $180k"
+      }},
+      "summaryNews": "A 3-4 sentence paragraph summarizing current market sentiment, hiring trends, and news for {domain}.",
+      "internships": [
+        {{
+          "title": "Verified Internship Title",
+          "company": "Company Name",
+          "location": "Location",
+          "platform": "LinkedIn or Indeed",
+          "url": "application_or_search_url"
+        }}
+      ],
+      "jobs": [
+        {{
+          "title": "Verified Job Title",
+          "company": "Company Name",
+          "location": "Location",
+          "platform": "LinkedIn or Indeed",
+          "url": "application_or_search_url"
+        }}
+      ]
+    }}
+    Ensure the 'values' are realistic demand scores based on 2026 data.
+    Return ONLY the JSON object."""
+    
+    messages = [{"role": "user", "content": prompt}]
+    response = perplexity_client.chat_completion(messages, endpoint='job_market')
+    ai_response = response['choices'][0]['message']['content']
+    
+    try:
+        json_data = extract_json(ai_response, expect='object')
+    except ValueError:
+        raise AIResponseError('Failed to parse AI response as JSON', ai_response)
+    
+    json_data['domain'] = domain
+    return json_data
+
 @app.route('/api/job-market-data', methods=['GET'])
 def get_job_market_data():
     topic_id = request.cookies.get('topic_id')
@@ -837,123 +1230,66 @@ def get_job_market_data():
     
     # Get the current domain/topic context
     domain = "Software Engineering" # Default
-    if session_id in sessions:
-        domain = sessions[session_id].roadmap.topic
+    learning_session = session_store.get(session_id) if session_id else None
+    if learning_session and learning_session.roadmap:
+        domain = learning_session.roadmap.topic
     elif topic_id:
         topic_data = db.get_topic(int(topic_id))
         if topic_data:
             domain = topic_data['name']
 
     try:
-        prompt = f"""Provide a real-time comprehensive job market analysis for the domain: {domain} and general tech trends for 2026.
-        
-        TASK: Find 3 ACTUAL internships and 3 ACTUAL job openings for {domain}.
-        
-        LINK RELIABILITY RULES:
-        1. INTERNSHIPS: Try to provide direct URLs.
-        2. JOBS: To prevent "No Match Found", use these exact search templates if a direct URL is unavailable:
-           - LinkedIn: https://www.linkedin.com/jobs/search/?keywords={{Job+Title}}+at+{{Company}}
-           - Indeed: https://www.indeed.com/jobs?q={{Job+Title}}+{{Company}}
-        3. Replace {{Job+Title}} and {{Company}} with the actual values (use + for spaces).
-        4. ONLY return legitimate, currently active companies.
-        
-        Return your response EXACTLY as a JSON object with this structure:
-        {{
-          "trends": {{
-            "labels": ["Domain 1", "Domain 2", "Domain 3", "Domain 4", "Domain 5"],
-            "values": [number1-100, number2-100, number3-100, number4-100, number5-100]
-          }},
-          "domainTraffic": {{
-            "labels": ["Month 1", "Month 2", "Month 3", "Month 4", "Month 5", "Month 6"],
-            "values": [number1, number2, number3, number4, number5, number6]
-          }},
-          "salaries": {{
-            "fresher": "$60k - $80k",
-            "experienced": "$120k - $180k"
-          }},
-          "summaryNews": "A 3-4 sentence paragraph summarizing current market sentiment, hiring trends, and news for {domain}.",
-          "internships": [
-            {{
-              "title": "Verified Internship Title",
-              "company": "Company Name",
-              "location": "Location",
-              "platform": "LinkedIn or Indeed",
-              "url": "application_or_search_url"
-            }}
-          ],
-          "jobs": [
-            {{
-              "title": "Verified Job Title",
-              "company": "Company Name",
-              "location": "Location",
-              "platform": "LinkedIn or Indeed",
-              "url": "application_or_search_url"
-            }}
-          ]
-        }}
-        Ensure the 'values' are realistic demand scores based on 2026 data.
-        Return ONLY the JSON object."""
-        
-        messages = [{"role": "user", "content": prompt}]
-        response = perplexity_client.chat_completion(messages)
-        ai_response = response['choices'][0]['message']['content']
-        
-        # Enhanced JSON extraction with multiple fallback strategies
-        json_data = None
-        
-        # Strategy 1: Try to extract from markdown code blocks
-        if "```json" in ai_response:
-            try:
-                json_str = ai_response.split("```json")[1].split("```")[0].strip()
-                json_data = json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                pass
-        
-        # Strategy 2: Try generic code blocks
-        if not json_data and "```" in ai_response:
-            try:
-                json_str = ai_response.split("```")[1].split("```")[0].strip()
-                json_data = json.loads(json_str)
-            except (IndexError, json.JSONDecodeError):
-                pass
-        
-        # Strategy 3: Try to find JSON object directly (look for first { to last })
-        if not json_data:
-            try:
-                start_idx = ai_response.find('{')
-                end_idx = ai_response.rfind('}')
-                if start_idx != -1 and end_idx != -1:
-                    json_str = ai_response[start_idx:end_idx+1]
-                    json_data = json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
-        
-        # Strategy 4: Try the entire response as-is
-        if not json_data:
-            try:
-                json_data = json.loads(ai_response.strip())
-            except json.JSONDecodeError:
-                pass
-        
-        # If all strategies failed, return a helpful error
-        if not json_data:
-            return jsonify({
-                'error': 'Failed to parse AI response as JSON',
-                'raw_response': ai_response[:500]  # First 500 chars for debugging
-            }), 500
+        if _wants_job():
+            return _job_accepted(job_queue.submit('job_market', {'domain': domain}))
         
-        json_data['domain'] = domain
+        json_data = _fetch_job_market_data({'domain': domain})
         
         return jsonify({
             'success': True,
             'data': json_data
         })
+    except AIResponseError as e:
+        return jsonify({
+            'error': str(e),
+            'raw_response': e.raw_response
+        }), 500
     except Exception as e:
         return jsonify({
             'error': f'Job market data fetch failed: {str(e)}',
             'details': 'Please try again or contact support if the issue persists'
         }), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, timing and result of a background job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+def _wants_job():
+    """True when the client asked for the work to run as a background job (?async=1)"""
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def _job_accepted(job_id):
+    # timeout tells the page how long to poll before giving up, as it would on a synchronous request
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'timeout': REQUEST_BUDGET
+    }), 202
+
+job_queue.register('analyze_resume', _analyze_resume)
+job_queue.register('evaluate_mock_test', _evaluate_mock_test)
+job_queue.register('progress_report', _build_progress_report)
+job_queue.register('job_market', _fetch_job_market_data)
+# Resume parsing processes are spawned and re-import this module when it is run as a script;
+# they must not start job workers of their own
+if multiprocessing.parent_process() is None:
+    job_queue.start(int(os.getenv('WEB_JOB_WORKERS', 2)))
+    metrics.start_sync()
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     host = os.getenv('HOST', '0.0.0.0')
@@ -1,68 +1,449 @@
 import os
+import socket
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
 import requests
 import json
+from requests.adapters import HTTPAdapter
+import backend.utils.llm_cache as llm_cache
+from backend.api import resilience
+from backend.api.resilience import CircuitBreaker, LatencyTracker, DeadlineExceeded
+from backend.utils import metrics, tracing
+from backend.utils.single_flight import SINGLE_FLIGHT_ENABLED, get_single_flight
+
+# Point at a compatible server instead of the real API, e.g. loadtest/mock_perplexity.py
+BASE_URL = os.getenv('PERPLEXITY_BASE_URL', 'https://api.perplexity.ai')
+
+# Connection pool settings shared by every client built through get_client()
+POOL_CONNECTIONS = int(os.getenv('PERPLEXITY_POOL_CONNECTIONS', 4))  # number of distinct hosts to keep pools for
+POOL_MAXSIZE = int(os.getenv('PERPLEXITY_POOL_MAXSIZE', 20))  # max idle connections kept per host
+POOL_BLOCK = os.getenv('PERPLEXITY_POOL_BLOCK', 'false').lower() == 'true'  # wait for a free connection instead of opening extras
+KEEPALIVE_IDLE = int(os.getenv('PERPLEXITY_KEEPALIVE_IDLE', 60))  # seconds before TCP keep-alive probes start
+
+# Retry policy: 3 retries with 1s, 2s, 4s backoff, each only if it still fits the call's budget
+RETRIES = 3
+BACKOFF_FACTOR = 1
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+ATTEMPT_TIMEOUT = 30
+# No attempt is started with less than this many seconds of budget left
+MIN_ATTEMPT_SECONDS = float(os.getenv('PERPLEXITY_MIN_ATTEMPT_SECONDS', 2))
+# Send a second identical request when the first is slower than the endpoint's p95
+HEDGE_ENABLED = os.getenv('PERPLEXITY_HEDGE_ENABLED', 'false').lower() == 'true'
+HEDGE_WORKERS = int(os.getenv('PERPLEXITY_HEDGE_WORKERS', 32))
+
+# Runs both attempts of a hedged call so the caller can take whichever answers first
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='llm-hedge')
+
+def _close_response(future):
+    """Done-callback releasing the connection of an attempt that lost a hedge"""
+    if future.exception() is None:
+        future.result().close()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive on every pooled socket"""
+
+    def __init__(self, keepalive_idle=KEEPALIVE_IDLE, **kwargs):
+        self.keepalive_idle = keepalive_idle
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        from urllib3.connection import HTTPConnection
+
+        socket_options = list(HTTPConnection.default_socket_options)
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle))
+        kwargs['socket_options'] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
 
 class PerplexityClient:
-    def __init__(self, api_key=None, base_url="https://api.perplexity.ai"):
+    def __init__(self, api_key=None, base_url=BASE_URL,
+                 pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, pool_block=POOL_BLOCK):
         self.api_key = api_key or os.getenv("PERPLEXITY_API_KEY")
         if not self.api_key:
             print("WARNING: Perplexity API key not found. AI features will fail, but the server will remain active.")
         self.base_url = base_url
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
         }
-        
-        # Initialize session with retries
+        self.pool_maxsize = pool_maxsize
+
+        # Retries happen in _send, where they can be fitted to the call's time budget
         self.session = requests.Session()
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-        
-        retry_strategy = Retry(
-            total=3,  # Total number of retries
-            backoff_factor=1,  # Wait 1s, 2s, 4s between retries
-            status_forcelist=[429, 500, 502, 503, 504],  # Retry on these status codes
-            allowed_methods=["POST"]  # Retry on POST requests
+        self.adapter = PooledHTTPAdapter(
+            max_retries=0,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        self.breaker = CircuitBreaker(base_url)
+        self.latency = LatencyTracker()
+        self._hedge_lock = threading.Lock()
+        self._hedge_stats = {'sent': 0, 'primary_wins': 0, 'hedge_wins': 0, 'no_winner': 0}
 
-    def chat_completion(self, messages, model="sonar", temperature=0.2):
+    @tracing.traced('llm.chat_completion')
+    def chat_completion(self, messages, model="sonar", temperature=0.2, endpoint=None, cache=True, variants=1,
+                        budget=None, hedge=None):
         """
         Send a chat completion request to the Perplexity API.
+
+        endpoint names the caller in the metrics and selects its cache TTL (see llm_cache.DEFAULT_TTLS)
+        and time budget (see resilience.DEFAULT_BUDGETS). Pass cache=False to always go upstream,
+        or variants=N to keep a pool of N different responses for prompts that should not always
+        return the same text. budget overrides the endpoint's budget in seconds and hedge
+        overrides PERPLEXITY_HEDGE_ENABLED for this call.
+
+        Identical calls made while one is already in flight, in this process or another
+        worker, wait for it and share its result instead of going upstream again. Calls
+        with cache=False or variants > 1 want a fresh response and are never shared.
         """
-        url = f"{self.base_url}/chat/completions"
+        # The budget starts now, so time spent on the cache lookup or waiting on a
+        # shared call counts against it too
+        deadline = resilience.deadline_for(budget if budget is not None else resilience.get_budget(endpoint))
+        tracing.annotate(endpoint=endpoint or 'other')
+        ttl = llm_cache.get_ttl(endpoint) if cache and llm_cache.CACHE_ENABLED else 0
+        key = llm_cache.make_key(messages, model, temperature)
+        if ttl > 0:
+            cached = llm_cache.get_cache().get(key, endpoint=endpoint, variants=variants)
+            if cached is not None:
+                metrics.LLM_CACHE_HITS.inc(endpoint)
+                tracing.annotate(cached=True)
+                return cached
+
+        def fetch():
+            result = self._post_completion(messages, model, temperature, endpoint, deadline, hedge)
+            if ttl > 0:
+                llm_cache.get_cache().set(key, result, ttl, endpoint=endpoint, variants=variants)
+            return result
+
+        if cache and variants <= 1 and SINGLE_FLIGHT_ENABLED:
+            # The base URL is part of the key so clients for different servers never share
+            return get_single_flight().do(f"{self.base_url}|{key}", fetch, endpoint, deadline)
+        return fetch()
+
+    def _post_completion(self, messages, model, temperature, endpoint, deadline, hedge=None):
+        """One upstream chat completion, with retries and metrics, finished by deadline"""
         payload = {
             "model": model,
             "messages": messages,
             "temperature": temperature
         }
-        
+
         try:
-            # Use self.session instead of requests
-            response = self.session.post(url, headers=self.headers, json=payload, timeout=30)
-            response.raise_for_status()
-            return response.json()
+            with metrics.LLMCall(endpoint, messages) as call:
+                try:
+                    response = self._send(payload, endpoint, deadline, hedge=HEDGE_ENABLED if hedge is None else hedge)
+                except (resilience.CircuitOpenError, DeadlineExceeded) as e:
+                    call.status = e.status
+                    raise
+                call.status = response.status_code
+                tracing.annotate(status=response.status_code)
+                response.raise_for_status()
+                result = response.json()
+                call.add_result(result)
         except requests.exceptions.RequestException as e:
             print(f"Error calling Perplexity API: {e}")
             raise
+        return result
 
-    def generate_roadmap(self, topic, difficulty="Intermediate"):
+    def _send(self, payload, endpoint, deadline, stream=False, span=None, hedge=False):
         """
-        Helper method specifically to generate a roadmap for a topic.
-        Results are returned as text.
+        POST a completion request and return the last response. 429/5xx answers and
+        connection errors are retried after 1s, 2s, 4s, but only while the retry still
+        fits before deadline (a time.monotonic() value); each attempt's timeout is cut
+        to the time left. Raises CircuitOpenError without sending while the breaker is open.
+        """
+        url = f"{self.base_url}/chat/completions"
+        if deadline - time.monotonic() < MIN_ATTEMPT_SECONDS:
+            metrics.LLM_DEADLINE_EXCEEDED.inc(endpoint or 'other')
+            raise DeadlineExceeded(f"No time left in the budget for a {endpoint or 'chat'} completion")
+
+        for attempt in range(RETRIES + 1):
+            probe = self.breaker.before_call(endpoint)
+            timeout = min(ATTEMPT_TIMEOUT, deadline - time.monotonic())
+            response = error = None
+            try:
+                # The half-open probe is a single attempt: a hedge would be a second one
+                if hedge and not stream and not probe:
+                    response = self._hedged_attempt(url, payload, timeout, endpoint, deadline)
+                else:
+                    response = self._attempt(url, payload, timeout, endpoint, stream, span, probe)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+
+            delay = self._retry_delay(attempt, response)
+            if attempt == RETRIES or time.monotonic() + delay + MIN_ATTEMPT_SECONDS > deadline:
+                if attempt < RETRIES:
+                    metrics.LLM_DEADLINE_EXCEEDED.inc(endpoint or 'other')
+                    tracing.annotate(deadline_exceeded=True)
+                if error is not None:
+                    raise error
+                return response
+            reason = str(response.status_code) if response is not None else type(error).__name__
+            metrics.LLM_RETRIES.inc(endpoint or 'other', reason)
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    @staticmethod
+    def _retry_delay(attempt, response):
+        """Backoff before the next attempt, or the server's Retry-After when it gives seconds"""
+        retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+        if retry_after.isdigit():
+            return float(retry_after)
+        return BACKOFF_FACTOR * (2 ** attempt)
+
+    def _attempt(self, url, payload, timeout, endpoint, stream=False, span=None, probe=False):
+        """
+        One POST, whatever its status; feeds the circuit breaker and the latency tracker.
+        probe marks the breaker's half-open probe, whose outcome is recorded however the
+        attempt ends (a gevent Timeout or GreenletExit included) so the breaker never
+        waits on it forever.
         """
+        started = time.monotonic()
+        try:
+            response = self.session.post(url, headers=self._headers(span), json=payload,
+                                         timeout=timeout, stream=stream)
+        except requests.exceptions.RequestException:
+            self.breaker.record(False, probe)
+            raise
+        except BaseException:
+            if probe:
+                self.breaker.record(False, probe)
+            raise
+        ok = response.status_code not in RETRY_STATUSES
+        self.breaker.record(ok, probe)
+        if ok and not stream:
+            self.latency.record(endpoint or 'other', time.monotonic() - started)
+        return response
+
+    def _hedged_attempt(self, url, payload, timeout, endpoint, deadline):
+        """
+        Send the attempt and, if it is still unanswered after the endpoint's recent p95
+        latency, an identical second one; return whichever gives a usable answer first.
+        """
+        delay = self.latency.hedge_delay(endpoint or 'other')
+        if delay is None or time.monotonic() + delay + MIN_ATTEMPT_SECONDS > deadline:
+            return self._attempt(url, payload, timeout, endpoint)
+
+        # Each attempt runs in a copy of this context so it carries the current trace span
+        primary = _hedge_pool.submit(contextvars.copy_context().run,
+                                     self._attempt, url, payload, timeout, endpoint)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeout:
+            pass
+
+        hedge = _hedge_pool.submit(contextvars.copy_context().run, self._attempt, url, payload,
+                                   min(timeout, deadline - time.monotonic()), endpoint)
+        self._count_hedge('sent')
+        tracing.annotate(hedged=True)
+        names = {primary: 'primary', hedge: 'hedge'}
+        pending = set(names)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result().status_code not in RETRY_STATUSES:
+                    self._count_hedge(f"{names[future]}_wins")
+                    metrics.LLM_HEDGES.inc(endpoint or 'other', names[future])
+                    for other in names:
+                        if other is not future:
+                            other.add_done_callback(_close_response)
+                    return future.result()
+
+        # Neither answer was usable: hand the primary's outcome to the retry loop
+        self._count_hedge('no_winner')
+        metrics.LLM_HEDGES.inc(endpoint or 'other', 'none')
+        hedge.add_done_callback(_close_response)
+        return primary.result()
+
+    def _count_hedge(self, name):
+        with self._hedge_lock:
+            self._hedge_stats[name] += 1
+
+    def chat_completion_stream(self, messages, model="sonar", temperature=0.2, endpoint=None, budget=None,
+                               cache=False, variants=1):
+        """
+        Stream a chat completion from the Perplexity API.
+        Yields content deltas (strings) as soon as the server sends them.
+        endpoint labels the call in the metrics and selects its time budget, which bounds
+        retries before the first byte; streams are never hedged. With cache=True a cached
+        response (shared with chat_completion for the same prompt) is yielded as a single
+        delta, and a stream read to the end is stored for the next caller.
+        """
+        deadline = resilience.deadline_for(budget if budget is not None else resilience.get_budget(endpoint))
+        ttl = llm_cache.get_ttl(endpoint) if cache and llm_cache.CACHE_ENABLED else 0
+        key = llm_cache.make_key(messages, model, temperature)
+        if ttl > 0:
+            cached = llm_cache.get_cache().get(key, endpoint=endpoint, variants=variants)
+            if cached is not None:
+                metrics.LLM_CACHE_HITS.inc(endpoint)
+                tracing.annotate(cached=True)
+                yield cached['choices'][0]['message']['content']
+                return
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True
+        }
+
+        call = metrics.LLMCall(endpoint, messages).start()
+        span = tracing.open_span('llm.chat_completion_stream', endpoint=endpoint or 'other')
+        try:
+            response = self._send(payload, endpoint, deadline, stream=True, span=span)
+            call.status = response.status_code
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Error calling Perplexity API: {e}")
+            if isinstance(e, (resilience.CircuitOpenError, DeadlineExceeded)):
+                call.status = e.status
+            call.finish()
+            if span:
+                span.finish(e)
+            raise
+
+        content = []
+        try:
+            for raw_line in response.iter_lines():
+                # Server-Sent Events: only "data:" lines carry payloads
+                line = raw_line.decode('utf-8', errors='replace')
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if chunk.get('usage'):
+                    call.usage = chunk['usage']
+                choices = chunk.get('choices') or [{}]
+                delta = choices[0].get('delta', {}).get('content')
+                if delta:
+                    call.add_delta(delta)
+                    content.append(delta)
+                    yield delta
+        except requests.exceptions.RequestException as e:
+            print(f"Error streaming from Perplexity API: {e}")
+            call.status = 'stream_error'
+            raise
+        finally:
+            response.close()
+            call.finish()
+            if span:
+                span.set(status=call.status, completion_chars=call.completion_chars)
+                span.finish()
+
+        # Only a stream read to the end gets here; the same shape chat_completion caches
+        if ttl > 0 and content:
+            result = {'choices': [{'message': {'role': 'assistant', 'content': ''.join(content)}}]}
+            llm_cache.get_cache().set(key, result, ttl, endpoint=endpoint, variants=variants)
+
+    def _headers(self, span=None):
+        """Request headers plus the request id and trace context of the current (or given) span"""
+        return dict(self.headers, **tracing.propagation_headers(span))
+
+    @staticmethod
+    def _roadmap_messages(topic, difficulty):
         system_prompt = (
             "You are an expert curriculum designer. "
             f"Create a structured learning roadmap for the given topic at an {difficulty} level. "
             "Return the response as a clear, numbered list of main topics, "
             "with sub-points for each. Do not include conversational filler."
         )
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Create a learning roadmap for: {topic}"}
         ]
-        
-        result = self.chat_completion(messages)
+
+    def generate_roadmap(self, topic, difficulty="Intermediate", cache=True):
+        """
+        Helper method specifically to generate a roadmap for a topic.
+        Results are returned as text.
+        """
+        messages = self._roadmap_messages(topic, difficulty)
+        result = self.chat_completion(messages, endpoint='roadmap', cache=cache)
         return result['choices'][0]['message']['content']
+
+    def generate_roadmap_stream(self, topic, difficulty="Intermediate"):
+        """Same prompt as generate_roadmap, yielding the text as it is generated"""
+        return self.chat_completion_stream(self._roadmap_messages(topic, difficulty), endpoint='roadmap')
+
+    def pool_stats(self):
+        """
+        Report connection pool usage for every host this client has talked to.
+        created counts sockets opened, reused counts requests served on an existing socket.
+        """
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            queued = list(pool.pool.queue) if pool.pool is not None else []
+            idle = len([conn for conn in queued if conn is not None])
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'in_use': max(self.pool_maxsize - len(queued), 0),
+                'idle': idle,
+                'created': pool.num_connections,
+                'reused': max(pool.num_requests - pool.num_connections, 0),
+                'requests': pool.num_requests
+            }
+        return {
+            'pool_maxsize': self.pool_maxsize,
+            'hosts': hosts
+        }
+
+    def resilience_stats(self):
+        with self._hedge_lock:
+            hedging = dict(self._hedge_stats)
+        hedging['enabled'] = HEDGE_ENABLED
+        hedging['win_rate'] = hedging['hedge_wins'] / hedging['sent'] if hedging['sent'] else 0.0
+        hedging['delays'] = self.latency.delays()
+        return {
+            'breaker': self.breaker.stats(),
+            'hedging': hedging
+        }
+
+
+# Process-wide registry so sessions, generators and routes share one connection pool
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key=None, base_url=BASE_URL):
+    """Return the shared PerplexityClient for this api key / base url, creating it on first use"""
+    key = (api_key or os.getenv("PERPLEXITY_API_KEY"), base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = PerplexityClient(api_key=api_key, base_url=base_url)
+                _clients[key] = client
+    return client
+
+def get_resilience_stats():
+    """Circuit breaker state, hedging outcomes and current hedge delays for every registered client"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [dict(base_url=client.base_url, **client.resilience_stats()) for client in clients]
+
+def get_pool_stats():
+    """Pool statistics for every registered client"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [dict(base_url=client.base_url, **client.pool_stats()) for client in clients]
@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import random
+
+import httpx
+
+import backend.utils.llm_cache as llm_cache
+from backend.utils import metrics
+from backend.api.perplexity import BASE_URL, POOL_MAXSIZE
+
+# Upper bound on requests this process has in flight upstream at once
+MAX_CONCURRENCY = int(os.getenv('PERPLEXITY_ASYNC_CONCURRENCY', 100))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AsyncPerplexityClient:
+    """asyncio counterpart of PerplexityClient with the same calling surface"""
+
+    def __init__(self, api_key=None, base_url=BASE_URL,
+                 max_concurrency=MAX_CONCURRENCY, max_keepalive=POOL_MAXSIZE, retries=3, backoff_factor=1):
+        self.api_key = api_key or os.getenv("PERPLEXITY_API_KEY")
+        if not self.api_key:
+            print("WARNING: Perplexity API key not found. AI features will fail, but the server will remain active.")
+        self.base_url = base_url
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            headers=self.headers,
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_keepalive)
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _post(self, payload, call):
+        """POST with the same retry policy as the sync client: 3 retries, 1s/2s/4s backoff"""
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.post("/chat/completions", json=payload)
+                call.status = response.status_code
+                if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                    metrics.LLM_RETRIES.inc(call.endpoint, str(response.status_code))
+                    await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except httpx.TransportError as e:
+                if attempt >= self.retries:
+                    raise
+                metrics.LLM_RETRIES.inc(call.endpoint, type(e).__name__)
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt) + random.random() * 0.1)
+
+    async def chat_completion(self, messages, model="sonar", temperature=0.2, endpoint=None, cache=True, variants=1):
+        """
+        Send a chat completion request to the Perplexity API.
+        Accepts the same endpoint / cache / variants options as PerplexityClient.chat_completion.
+        """
+        ttl = llm_cache.get_ttl(endpoint) if cache and llm_cache.CACHE_ENABLED else 0
+        if ttl > 0:
+            key = llm_cache.make_key(messages, model, temperature)
+            cached = await asyncio.to_thread(llm_cache.get_cache().get, key, endpoint, variants)
+            if cached is not None:
+                metrics.LLM_CACHE_HITS.inc(endpoint)
+                return cached
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature
+        }
+
+        try:
+            async with self.semaphore:
+                with metrics.LLMCall(endpoint, messages) as call:
+                    result = await self._post(payload, call)
+                    call.add_result(result)
+        except httpx.HTTPError as e:
+            print(f"Error calling Perplexity API: {e}")
+            raise
+
+        if ttl > 0:
+            await asyncio.to_thread(llm_cache.get_cache().set, key, result, ttl, endpoint, variants)
+        return result
+
+    async def chat_completion_stream(self, messages, model="sonar", temperature=0.2):
+        """Stream a chat completion, yielding content deltas as they arrive"""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True
+        }
+
+        async with self.semaphore:
+            try:
+                async with self.client.stream("POST", "/chat/completions", json=payload) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except json.JSONDecodeError:
+                            continue
+                        choices = chunk.get('choices') or [{}]
+                        delta = choices[0].get('delta', {}).get('content')
+                        if delta:
+                            yield delta
+            except httpx.HTTPError as e:
+                print(f"Error streaming from Perplexity API: {e}")
+                raise
+
+    async def generate_roadmap(self, topic, difficulty="Intermediate", cache=True):
+        """
+        Helper method specifically to generate a roadmap for a topic.
+        Results are returned as text.
+        """
+        system_prompt = (
+            "You are an expert curriculum designer. "
+            f"Create a structured learning roadmap for the given topic at an {difficulty} level. "
+            "Return the response as a clear, numbered list of main topics, "
+            "with sub-points for each. Do not include conversational filler."
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Create a learning roadmap for: {topic}"}
+        ]
+
+        result = await self.chat_completion(messages, endpoint='roadmap', cache=cache)
+        return result['choices'][0]['message']['content']
+
+
+# One client per event loop: httpx connection pools cannot be shared between loops
+_async_clients = {}
+
+def get_async_client(api_key=None, base_url=BASE_URL):
+    """Return the shared AsyncPerplexityClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    for stale in [k for k, (l, _) in _async_clients.items() if l.is_closed()]:
+        del _async_clients[stale]
+    key = (id(loop), api_key or os.getenv("PERPLEXITY_API_KEY"), base_url)
+    entry = _async_clients.get(key)
+    if entry is None or entry[0] is not loop:
+        entry = (loop, AsyncPerplexityClient(api_key=api_key, base_url=base_url))
+        _async_clients[key] = entry
+    return entry[1]
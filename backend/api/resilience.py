@@ -0,0 +1,200 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+from backend.utils import metrics
+
+# Total seconds a call may take, retries included, per call site; override with PERPLEXITY_BUDGET_<ENDPOINT>
+DEFAULT_BUDGET = float(os.getenv('PERPLEXITY_BUDGET', 60))
+DEFAULT_BUDGETS = {
+    'chat': 30,
+    'guide': 45,
+    'assessment': 20,
+    'assessment_analysis': 20,
+    'quiz': 30,
+    'mock_test_grading': 30,
+}
+
+# Failures within this many seconds decide whether the breaker opens
+BREAKER_WINDOW = float(os.getenv('PERPLEXITY_BREAKER_WINDOW', 30))
+# The breaker needs at least this many attempts in the window before it can open
+BREAKER_MIN_CALLS = int(os.getenv('PERPLEXITY_BREAKER_MIN_CALLS', 10))
+BREAKER_ERROR_RATE = float(os.getenv('PERPLEXITY_BREAKER_ERROR_RATE', 0.5))
+# How long an open breaker rejects calls before letting one probe through
+BREAKER_COOLDOWN = float(os.getenv('PERPLEXITY_BREAKER_COOLDOWN', 30))
+
+# Recent successful attempt times kept per endpoint for the hedging delay
+LATENCY_SAMPLES = 200
+HEDGE_MIN_SAMPLES = int(os.getenv('PERPLEXITY_HEDGE_MIN_SAMPLES', 20))
+HEDGE_PERCENTILE = float(os.getenv('PERPLEXITY_HEDGE_PERCENTILE', 95))
+HEDGE_MIN_DELAY = float(os.getenv('PERPLEXITY_HEDGE_MIN_DELAY', 1))
+
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """The breaker is open: the call was not sent so the caller can fall back at once"""
+    status = 'circuit_open'
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The call's time budget ran out before an attempt could be made"""
+    status = 'deadline_exceeded'
+
+
+def get_budget(endpoint):
+    """Time budget in seconds for one call from an endpoint"""
+    if endpoint:
+        override = os.getenv(f'PERPLEXITY_BUDGET_{endpoint.upper()}')
+        if override is not None:
+            return float(override)
+    return DEFAULT_BUDGETS.get(endpoint, DEFAULT_BUDGET)
+
+
+# Monotonic time by which the current route's upstream calls must finish
+_deadline = contextvars.ContextVar('llm_deadline', default=None)
+
+@contextmanager
+def call_budget(seconds):
+    """Limit every chat completion made inside the block to seconds in total, retries included"""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def set_request_budget(seconds):
+    """Start a budget for the rest of the current context (used per Flask request)"""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+def deadline_for(budget):
+    """Absolute deadline for a call with its own budget, capped by the surrounding call_budget"""
+    deadline = time.monotonic() + budget
+    outer = _deadline.get()
+    return deadline if outer is None else min(outer, deadline)
+
+
+class CircuitBreaker:
+    """
+    Opens when at least BREAKER_ERROR_RATE of the attempts in the last BREAKER_WINDOW
+    seconds failed (timeouts, connection errors, 429 and 5xx). While open, calls fail
+    with CircuitOpenError; after BREAKER_COOLDOWN one probe is let through (half open)
+    and its outcome alone closes or reopens the breaker.
+    """
+
+    def __init__(self, name, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 error_rate=BREAKER_ERROR_RATE, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self._outcomes = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'rejected': 0}
+        metrics.LLM_BREAKER_STATE.set(0, name)
+
+    def before_call(self, endpoint=None):
+        """
+        Raise CircuitOpenError unless an attempt may be sent now. Returns True when the
+        attempt is the half-open probe; its outcome must be passed to record(..., probe=True).
+        """
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.cooldown:
+                self._transition('half_open')
+            if self.state == 'closed':
+                return False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self._stats['rejected'] += 1
+        metrics.LLM_BREAKER_REJECTED.inc(endpoint or 'other')
+        raise CircuitOpenError(f"Perplexity API circuit breaker is open ({self.name})")
+
+    def record(self, success, probe=False):
+        """
+        Count an attempt's outcome. While the breaker is not closed only the probe's
+        outcome counts; attempts sent before it opened are ignored.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                self._probing = False
+                if self.state == 'half_open':
+                    self._outcomes.clear()
+                    self._transition('closed' if success else 'open')
+                return
+            if self.state != 'closed':
+                return
+            self._outcomes.append((now, success))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            if self.state == 'closed' and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for _, ok in self._outcomes if not ok)
+                if failures / len(self._outcomes) >= self.error_rate:
+                    self._outcomes.clear()
+                    self._transition('open')
+
+    def _transition(self, state):
+        """Change state; the caller holds the lock"""
+        self.state = state
+        if state == 'open':
+            self._opened_at = time.monotonic()
+            self._stats['opened'] += 1
+        metrics.LLM_BREAKER_STATE.set(BREAKER_STATES[state], self.name)
+        metrics.LLM_BREAKER_TRANSITIONS.inc(self.name, state)
+        print(f"Perplexity circuit breaker ({self.name}) is now {state}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self.state
+            stats['window_calls'] = len(self._outcomes)
+            stats['window_failures'] = sum(1 for _, ok in self._outcomes if not ok)
+        return stats
+
+
+class LatencyTracker:
+    """Recent successful attempt times per endpoint, for picking the hedging delay"""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.samples = samples
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(maxlen=self.samples)
+            latencies.append(seconds)
+
+    def hedge_delay(self, endpoint):
+        """The HEDGE_PERCENTILE latency, or None until there are enough samples"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(latencies) - 1, int(len(latencies) * HEDGE_PERCENTILE / 100))
+        return max(latencies[index], HEDGE_MIN_DELAY)
+
+    def delays(self):
+        """Current hedging delay per endpoint that has enough samples"""
+        with self._lock:
+            endpoints = list(self._latencies)
+        delays = {}
+        for endpoint in endpoints:
+            delay = self.hedge_delay(endpoint)
+            if delay is not None:
+                delays[endpoint] = round(delay, 3)
+        return delays
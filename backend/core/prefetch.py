@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 4))
+# Results kept at once; the oldest entry is dropped (and cancelled if still queued) beyond this
+PREFETCH_MAX_ENTRIES = int(os.getenv('PREFETCH_MAX_ENTRIES', 200))
+# How long a route waits for a prefetch that is already running before giving up on it
+PREFETCH_JOIN_TIMEOUT = float(os.getenv('PREFETCH_JOIN_TIMEOUT', 60))
+
+
+class Prefetcher:
+    """
+    Runs speculative work (the next step's guide) on a small thread pool.
+    Entries are keyed by (topic_id, step_index, persona, difficulty, kind).
+    """
+
+    def __init__(self, max_workers=PREFETCH_WORKERS, max_entries=PREFETCH_MAX_ENTRIES, enabled=PREFETCH_ENABLED):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'scheduled': 0, 'served': 0, 'joined': 0, 'missed': 0, 'failed': 0, 'cancelled': 0}
+
+    def _run(self, key, fn, args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"Prefetch {key} failed: {e}")
+            raise
+
+    def submit(self, key, fn, *args):
+        """Schedule fn(*args) under key unless it is already scheduled"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._futures:
+                return
+            while len(self._futures) >= self.max_entries:
+                _, oldest = self._futures.popitem(last=False)
+                if oldest.cancel():
+                    self._stats['cancelled'] += 1
+            self._futures[key] = self._executor.submit(self._run, key, fn, args)
+            self._stats['scheduled'] += 1
+
+    def take(self, key):
+        """
+        Return the prefetched result for key, or None when the caller should make the live call.
+        A finished result is returned immediately and a running one is waited for; work that
+        has not started yet is cancelled so it does not duplicate the live call.
+        """
+        with self._lock:
+            future = self._futures.pop(key, None)
+        if future is None:
+            self._count('missed')
+            return None
+
+        if not future.done() and future.cancel():
+            self._count('cancelled')
+            self._count('missed')
+            return None
+
+        was_done = future.done()
+        try:
+            result = future.result(timeout=PREFETCH_JOIN_TIMEOUT)
+        except Exception:
+            self._count('failed')
+            return None
+        self._count('served' if was_done else 'joined')
+        return result
+
+    def cancel_topic(self, topic_id):
+        """Drop every entry for a topic the user has left"""
+        with self._lock:
+            keys = [key for key in self._futures if key[0] == topic_id]
+            for key in keys:
+                if self._futures.pop(key).cancel():
+                    self._stats['cancelled'] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len([f for f in self._futures.values() if not f.done()])
+            stats['ready'] = len(self._futures) - stats['pending']
+        return stats
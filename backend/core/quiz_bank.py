@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import backend.utils.database as db
+from backend.core.roadmap_library import normalize_topic
+from backend.utils.quiz_generator import is_complete_quiz
+from backend.utils.single_flight import SINGLE_FLIGHT_ENABLED, get_single_flight
+
+QUIZ_BANK_ENABLED = os.getenv('QUIZ_BANK_ENABLED', 'true').lower() == 'true'
+QUIZ_BANK_WORKERS = int(os.getenv('QUIZ_BANK_WORKERS', 2))
+# A refill starts when a step has fewer sets than this that nobody has been served yet
+QUIZ_BANK_MIN_UNUSED = int(os.getenv('QUIZ_BANK_MIN_UNUSED', 2))
+# Sets generated by one refill
+QUIZ_BANK_REFILL_SIZE = int(os.getenv('QUIZ_BANK_REFILL_SIZE', 3))
+# Seconds after a refill of a step before this process starts another one for it
+QUIZ_BANK_REFILL_INTERVAL = float(os.getenv('QUIZ_BANK_REFILL_INTERVAL', 300))
+# No more sets are generated for a step once it has this many
+QUIZ_BANK_MAX_SETS = int(os.getenv('QUIZ_BANK_MAX_SETS', 50))
+
+
+class QuizBank:
+    """
+    Serves pre-generated question sets per (normalized topic, step title, difficulty)
+    so /api/generate-quiz does not wait on the LLM. Each user gets sets they have not
+    seen before; the bank is topped up on a small thread pool when the sets nobody has
+    been served yet run low, at most once per refill_interval per step.
+    """
+
+    def __init__(self, quiz_gen, max_workers=QUIZ_BANK_WORKERS, min_unused=QUIZ_BANK_MIN_UNUSED,
+                 refill_size=QUIZ_BANK_REFILL_SIZE, max_sets=QUIZ_BANK_MAX_SETS,
+                 refill_interval=QUIZ_BANK_REFILL_INTERVAL, enabled=QUIZ_BANK_ENABLED):
+        self.quiz_gen = quiz_gen
+        self.enabled = enabled
+        self.min_unused = min_unused
+        self.refill_size = refill_size
+        self.max_sets = max_sets
+        self.refill_interval = refill_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quiz-bank')
+        self._refilling = set()
+        self._last_refill = {}
+        self._lock = threading.Lock()
+        self._stats = {'served': 0, 'missed': 0, 'generated': 0, 'duplicates': 0,
+                       'invalid': 0, 'refills': 0, 'failed': 0}
+
+    @staticmethod
+    def _key(topic, step, difficulty):
+        return normalize_topic(topic), step['title'], difficulty
+
+    def _generate(self, topic, step, difficulty, bank=True):
+        """
+        Generate a fresh set and, with bank, store it; returns (id, questions), id None
+        when it was not stored. Only complete sets are banked; an incomplete one is still
+        returned for the caller to serve. Raises ValueError if no question could be parsed
+        from two attempts.
+        """
+        step_details = '\n'.join(step['details']) if step['details'] else step['title']
+        questions = self.quiz_gen.generate_quiz(topic, step['title'], step_details, cache=False)
+        if not questions:
+            questions = self.quiz_gen.generate_quiz(topic, step['title'], step_details, cache=False)
+            if not questions:
+                raise ValueError("The AI did not return a quiz, please try again")
+        if not bank:
+            return None, questions
+        if not is_complete_quiz(questions):
+            self._count('invalid')
+            return None, questions
+        quiz_id = db.add_quiz_set(*self._key(topic, step, difficulty), questions)
+        self._count('generated' if quiz_id else 'duplicates')
+        return quiz_id, questions
+
+    def _generate_once(self, key, topic, step, difficulty):
+        """_generate, shared with every user who misses the bank for the same step at the same time"""
+        def generate():
+            quiz_id, questions = self._generate(topic, step, difficulty)
+            return {'id': quiz_id, 'questions': questions}
+
+        if not SINGLE_FLIGHT_ENABLED:
+            generated = generate()
+        else:
+            generated = get_single_flight().do('quiz_bank|' + '|'.join(key), generate, 'quiz')
+        return generated['id'], generated['questions']
+
+    def take(self, user_id, topic, step, difficulty):
+        """
+        A question set for the step that user_id has not seen yet. Served from the bank
+        when possible, otherwise generated now and stored. Either way a refill is
+        scheduled if the user is running out of unseen sets.
+        """
+        if not self.enabled or not user_id:
+            return self._generate(topic, step, difficulty, bank=False)[1]
+
+        key = self._key(topic, step, difficulty)
+        taken = db.take_quiz_set(user_id, *key)
+        if taken:
+            self._count('served')
+            questions = taken[1]
+        else:
+            self._count('missed')
+            quiz_id, questions = self._generate_once(key, topic, step, difficulty)
+            if quiz_id:
+                db.mark_quiz_set_seen(user_id, quiz_id)
+        self.top_up(topic, step, difficulty)
+        return questions
+
+    def top_up(self, topic, step, difficulty):
+        """Schedule a refill if the step has fewer than min_unused sets nobody has been served"""
+        if not self.enabled:
+            return
+        key = self._key(topic, step, difficulty)
+        total, unused = db.count_quiz_sets(*key)
+        if unused >= self.min_unused or total >= self.max_sets:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if key in self._refilling or now - self._last_refill.get(key, -self.refill_interval) < self.refill_interval:
+                return
+            self._refilling.add(key)
+            self._last_refill[key] = now
+            self._stats['refills'] += 1
+        count = min(self.refill_size, self.max_sets - total)
+        self._executor.submit(self._refill, key, topic, step, difficulty, count)
+
+    def _refill(self, key, topic, step, difficulty, count):
+        try:
+            for _ in range(count):
+                self._generate(topic, step, difficulty)
+        except Exception as e:
+            self._count('failed')
+            print(f"Quiz bank refill for {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['refilling'] = len(self._refilling)
+        return stats
@@ -1,47 +1,104 @@
 import re
 
+from backend.utils.tracing import traced
+
+# Lines starting with "1. ", "2. ", etc. open a new step
+STEP_PATTERN = re.compile(r'^(\d+)\.\s+(.*)')
+
+def _clean(text):
+    """Strip markdown residue"""
+    return text.replace('*', '').replace('#', '').replace('`', '').strip()
+
+
+class RoadmapParser:
+    """
+    Incremental roadmap parser. Text can be fed in arbitrary chunks as it streams in;
+    each step is returned as soon as the next numbered line closes it, and close()
+    returns the last one. All parsed steps are collected in steps.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self._current = None
+        self._partial = ''
+
+    def feed(self, text):
+        """Add streamed text and return the steps completed by it"""
+        *lines, self._partial = (self._partial + text).split('\n')
+        completed = []
+        for line in lines:
+            step = self.feed_line(line)
+            if step:
+                completed.append(step)
+        # A numbered line that has started arriving already ends the current step
+        if self._current and STEP_PATTERN.match(self._partial.strip()):
+            completed.append(self._current)
+            self.steps.append(self._current)
+            self._current = None
+        return completed
+
+    def feed_line(self, line):
+        """Parse one complete line; returns the previous step if this line starts a new one"""
+        line = line.strip()
+        match = STEP_PATTERN.match(line)
+        if match:
+            finished = self._current
+            if finished:
+                self.steps.append(finished)
+            self._current = {
+                "number": int(match.group(1)),
+                "title": _clean(match.group(2)),
+                "details": []
+            }
+            return finished
+        if self._current and line:
+            detail = _clean(line)
+            if detail:
+                self._current["details"].append(detail)
+        return None
+
+    def close(self):
+        """Finish parsing and return the steps that were still open"""
+        completed = []
+        if self._partial:
+            step = self.feed_line(self._partial)
+            self._partial = ''
+            if step:
+                completed.append(step)
+        if self._current:
+            self.steps.append(self._current)
+            completed.append(self._current)
+            self._current = None
+        return completed
+
+
 class Roadmap:
     def __init__(self, topic, raw_content):
         self.topic = topic
         self.steps = self._parse_content(raw_content)
         self.total_steps = len(self.steps)
 
+    @classmethod
+    def from_steps(cls, topic, steps):
+        """Build a roadmap from already parsed steps without going through the text parser"""
+        roadmap = cls(topic, "")
+        roadmap.steps = [
+            {'number': step['number'], 'title': step['title'], 'details': list(step['details'])}
+            for step in steps
+        ]
+        roadmap.total_steps = len(roadmap.steps)
+        return roadmap
+
+    @traced('roadmap.parse')
     def _parse_content(self, raw_content):
         """
         Parses the raw text content into a list of steps.
         Assumes a numbered list format (1. Step One...).
         """
-        steps = []
-        lines = raw_content.split('\n')
-        
-        current_step = None
-        
-        for line in lines:
-            line = line.strip()
-            # Match lines starting with "1. ", "2. ", etc.
-            match = re.match(r'^(\d+)\.\s+(.*)', line)
-            if match:
-                if current_step:
-                    steps.append(current_step)
-                
-                # Clean title of any markdown residue
-                title = match.group(2).replace('*', '').replace('#', '').replace('`', '').strip()
-                
-                current_step = {
-                    "number": int(match.group(1)),
-                    "title": title,
-                    "details": []
-                }
-            elif current_step and line:
-                # Clean detail of any markdown residue
-                detail = line.replace('*', '').replace('#', '').replace('`', '').strip()
-                if detail:
-                    current_step["details"].append(detail)
-        
-        if current_step:
-            steps.append(current_step)
-            
-        return steps
+        parser = RoadmapParser()
+        parser.feed(raw_content)
+        parser.close()
+        return parser.steps
 
     def get_step(self, index):
         if 0 <= index < self.total_steps:
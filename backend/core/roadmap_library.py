@@ -0,0 +1,98 @@
+import argparse
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import backend.utils.database as db
+from backend.core.roadmap import Roadmap
+from backend.api.perplexity import get_client
+
+# Stored roadmaps older than this are regenerated on the next request
+MAX_AGE_DAYS = int(os.getenv('ROADMAP_LIBRARY_MAX_AGE_DAYS', 30))
+
+
+def normalize_topic(topic):
+    """Normalize a topic name so "Python", " python " and "Python!" share one roadmap"""
+    topic = re.sub(r'[^\w\s+#.-]', ' ', topic.lower())
+    return ' '.join(topic.split())
+
+def get_roadmap(topic, difficulty, max_age_days=MAX_AGE_DAYS):
+    """Return a fresh canonical Roadmap for the topic, or None"""
+    stored = db.get_library_roadmap(normalize_topic(topic), difficulty, max_age_days)
+    if not stored or not stored['steps']:
+        return None
+    return Roadmap.from_steps(topic, stored['steps'])
+
+def save_roadmap(topic, difficulty, roadmap):
+    """Store a generated roadmap as the canonical one for its topic and difficulty"""
+    if roadmap.total_steps:
+        db.save_library_roadmap(normalize_topic(topic), difficulty, topic, roadmap.steps)
+
+def build_roadmap(topic, difficulty, client=None):
+    """Generate a roadmap with the LLM and store it in the library"""
+    client = client or get_client()
+    raw_roadmap = client.generate_roadmap(topic, difficulty, cache=False)
+    roadmap = Roadmap(topic, raw_roadmap)
+    save_roadmap(topic, difficulty, roadmap)
+    return roadmap
+
+def seed_from_topics():
+    """Copy the most recent roadmap of every existing topic into the library"""
+    seeded = 0
+    for name, roadmap_data in db.get_all_roadmap_data():
+        steps = roadmap_data.get('steps')
+        if steps:
+            difficulty = roadmap_data.get('difficulty', 'Intermediate')
+            db.save_library_roadmap(normalize_topic(name), difficulty, name, steps)
+            seeded += 1
+    return seeded
+
+def warm_up(topics, difficulties, workers=4, regenerate=False):
+    """Pre-build library roadmaps for every topic/difficulty pair using a worker pool"""
+    jobs = [
+        (topic, difficulty) for topic in topics for difficulty in difficulties
+        if regenerate or get_roadmap(topic, difficulty) is None
+    ]
+    results = {'built': 0, 'failed': 0, 'skipped': len(topics) * len(difficulties) - len(jobs)}
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(build_roadmap, topic, difficulty): (topic, difficulty) for topic, difficulty in jobs}
+        for future in as_completed(futures):
+            topic, difficulty = futures[future]
+            try:
+                roadmap = future.result()
+                results['built'] += 1
+                print(f"Built {difficulty} roadmap for '{topic}' ({roadmap.total_steps} steps)")
+            except Exception as e:
+                results['failed'] += 1
+                print(f"Failed to build {difficulty} roadmap for '{topic}': {e}")
+    
+    return results
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Pre-build canonical roadmaps for popular topics")
+    parser.add_argument('topics', nargs='*', help="Topics to build")
+    parser.add_argument('--file', help="File with one topic per line")
+    parser.add_argument('--difficulty', action='append', dest='difficulties',
+                        help="Difficulty level, may be repeated (default: Beginner, Intermediate, Advanced)")
+    parser.add_argument('--workers', type=int, default=4, help="Number of concurrent LLM calls")
+    parser.add_argument('--regenerate', action='store_true', help="Rebuild roadmaps that are still fresh")
+    parser.add_argument('--from-topics', action='store_true', help="Seed the library from existing topics first")
+    args = parser.parse_args()
+    db.init_db()
+
+    if args.from_topics:
+        print(f"Seeded {seed_from_topics()} roadmaps from existing topics")
+
+    topics = list(args.topics)
+    if args.file:
+        with open(args.file) as f:
+            topics.extend(line.strip() for line in f if line.strip())
+
+    if topics:
+        difficulties = args.difficulties or ['Beginner', 'Intermediate', 'Advanced']
+        print(warm_up(topics, difficulties, workers=args.workers, regenerate=args.regenerate))
@@ -1,21 +1,73 @@
-from backend.core.roadmap import Roadmap
-from backend.api.perplexity import PerplexityClient
+from backend.core.roadmap import Roadmap, RoadmapParser
+from backend.api.perplexity import get_client
+import backend.core.roadmap_library as roadmap_library
 
 class LearningSession:
     def __init__(self, persona="General", difficulty="Intermediate"):
-        self.client = PerplexityClient()
+        self.client = get_client()
         self.roadmap = None
         self.current_step_index = -1
         self.persona = persona
         self.difficulty = difficulty
+        self.from_library = False
 
-    def start_new_topic(self, topic):
-        print(f"Generating {self.difficulty} roadmap for '{topic}'...")
-        raw_roadmap = self.client.generate_roadmap(topic, self.difficulty)
-        self.roadmap = Roadmap(topic, raw_roadmap)
+    def to_dict(self):
+        """Compact serializable form used by the session store"""
+        return {
+            'topic': self.roadmap.topic if self.roadmap else None,
+            'steps': self.roadmap.steps if self.roadmap else [],
+            'index': self.current_step_index,
+            'persona': self.persona,
+            'difficulty': self.difficulty
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        session = cls(persona=data.get('persona', 'General'), difficulty=data.get('difficulty', 'Intermediate'))
+        if data.get('topic'):
+            session.roadmap = Roadmap.from_steps(data['topic'], data.get('steps', []))
+        session.current_step_index = data.get('index', -1)
+        return session
+
+    def start_new_topic(self, topic, regenerate=False):
+        """
+        Start a topic from the canonical roadmap library when a fresh one exists,
+        otherwise generate it (always when regenerate is set) and store it there.
+        """
+        self.from_library = False
+        roadmap = None if regenerate else roadmap_library.get_roadmap(topic, self.difficulty)
+        if roadmap:
+            self.from_library = True
+        else:
+            print(f"Generating {self.difficulty} roadmap for '{topic}'...")
+            raw_roadmap = self.client.generate_roadmap(topic, self.difficulty, cache=not regenerate)
+            roadmap = Roadmap(topic, raw_roadmap)
+            roadmap_library.save_roadmap(topic, self.difficulty, roadmap)
+        self.roadmap = roadmap
         self.current_step_index = 0
         return self.roadmap
 
+    def stream_new_topic(self, topic, regenerate=False):
+        """
+        Streaming form of start_new_topic: yields each step as soon as it is parsed from
+        the streamed roadmap (or all at once from the library), then sets the roadmap.
+        """
+        self.from_library = False
+        roadmap = None if regenerate else roadmap_library.get_roadmap(topic, self.difficulty)
+        if roadmap:
+            self.from_library = True
+            yield from roadmap.steps
+        else:
+            print(f"Streaming {self.difficulty} roadmap for '{topic}'...")
+            parser = RoadmapParser()
+            for chunk in self.client.generate_roadmap_stream(topic, self.difficulty):
+                yield from parser.feed(chunk)
+            yield from parser.close()
+            roadmap = Roadmap.from_steps(topic, parser.steps)
+            roadmap_library.save_roadmap(topic, self.difficulty, roadmap)
+        self.roadmap = roadmap
+        self.current_step_index = 0
+
     def get_current_step(self):
         if not self.roadmap:
             return None
@@ -29,14 +81,7 @@ class LearningSession:
             return self.get_current_step()
         return None
 
-    def get_detailed_guide_for_step(self):
-        """
-        Asks Perplexity for a detailed guide on the current step.
-        """
-        step = self.get_current_step()
-        if not step:
-            return "No active step."
-        
+    def _guide_messages(self, step):
         persona_prompts = {
             "General": "beginner-friendly",
             "Scientist": "highly technical, focused on academic rigor and precise details",
@@ -55,10 +100,57 @@ class LearningSession:
             "Use clear, plain text with simple numbering or bullet points using dashes (-) if needed."
         )
         
-        messages = [{"role": "user", "content": prompt}]
-        response = self.client.chat_completion(messages)
+        return [{"role": "user", "content": prompt}]
+
+    @staticmethod
+    def _strip_markdown(text):
+        return text.replace('#', '').replace('*', '').replace('`', '')
+
+    def get_detailed_guide_for_step(self, step_index=None):
+        """
+        Asks Perplexity for a detailed guide on the current step,
+        or on step_index when given (used to prefetch the next step).
+        """
+        if step_index is None:
+            step = self.get_current_step()
+        else:
+            step = self.roadmap.get_step(step_index) if self.roadmap else None
+        if not step:
+            return "No active step."
+        
+        messages = self._guide_messages(step)
+        response = self.client.chat_completion(messages, endpoint='guide')
         content = response['choices'][0]['message']['content']
         
         # Clean up any remaining markdown characters
-        content = content.replace('#', '').replace('*', '').replace('`', '')
+        content = self._strip_markdown(content)
         return content.strip()
+
+    def stream_detailed_guide_for_step(self):
+        """
+        Streaming version of get_detailed_guide_for_step.
+        Yields cleaned text chunks; joined together they equal the non-streaming guide.
+        """
+        step = self.get_current_step()
+        if not step:
+            yield "No active step."
+            return
+        
+        messages = self._guide_messages(step)
+        started = False
+        pending_whitespace = ""
+        for delta in self.client.chat_completion_stream(messages, endpoint='guide'):
+            chunk = self._strip_markdown(delta)
+            if not started:
+                # Drop leading whitespace, like str.strip() on the full guide
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                started = True
+            # Hold back trailing whitespace until more text arrives so the end is stripped too
+            body = chunk.rstrip()
+            if body:
+                yield pending_whitespace + body
+                pending_whitespace = chunk[len(body):]
+            else:
+                pending_whitespace += chunk
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import backend.utils.database as db
+from backend.core.session import LearningSession
+
+# Sessions not used for this long are dropped
+SESSION_IDLE_TTL = int(os.getenv('SESSION_IDLE_TTL', 7 * 24 * 3600))
+# Number of sessions each worker keeps deserialized in memory
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 512))
+# "sqlite" shares sessions between worker processes, "memory" keeps them in this process only
+SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite')
+# Avoid a write on every request: last_access is refreshed at most this often
+TOUCH_INTERVAL = 60
+PURGE_INTERVAL = 600
+
+
+class SessionStore:
+    """Interface for learning session storage"""
+
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def save(self, session_id, learning_session):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU of sessions with an idle TTL"""
+
+    def __init__(self, max_entries=SESSION_CACHE_SIZE, idle_ttl=SESSION_IDLE_TTL):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()  # session_id -> (learning_session, version, last_access)
+        self._lock = threading.Lock()
+
+    def get_entry(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            if time.time() - entry[2] > self.idle_ttl:
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            self._entries[session_id] = (entry[0], entry[1], time.time())
+            return entry
+
+    def put_entry(self, session_id, learning_session, version):
+        with self._lock:
+            self._entries[session_id] = (learning_session, version, time.time())
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, session_id):
+        entry = self.get_entry(session_id)
+        return entry[0] if entry else None
+
+    def save(self, session_id, learning_session):
+        entry = self.get_entry(session_id)
+        self.put_entry(session_id, learning_session, entry[1] + 1 if entry else 1)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions serialized into the learning_sessions table, shared by every worker"""
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._last_purge = 0
+
+    def get_with_version(self, session_id):
+        row = db.get_learning_session(session_id, self.idle_ttl)
+        if not row:
+            return None, None
+        return LearningSession.from_dict(row['data']), row['version']
+
+    def get_version(self, session_id):
+        """Current version of a session, refreshing its idle timer when it is getting old"""
+        row = db.get_learning_session_version(session_id, self.idle_ttl)
+        if not row:
+            return None
+        version, last_access = row
+        if time.time() - last_access > TOUCH_INTERVAL:
+            db.touch_learning_session(session_id)
+        return version
+
+    def get(self, session_id):
+        return self.get_with_version(session_id)[0]
+
+    def save(self, session_id, learning_session):
+        version = db.save_learning_session(session_id, learning_session.to_dict())
+        if time.time() - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = time.time()
+            db.delete_idle_learning_sessions(self.idle_ttl)
+        return version
+
+    def delete(self, session_id):
+        db.delete_learning_session(session_id)
+
+
+class TieredSessionStore(SessionStore):
+    """
+    SQLite store with an in-process LRU in front of it. A cached session is only used
+    while its version matches the shared row, so a change made by another worker is seen.
+    """
+
+    def __init__(self, back=None, front=None):
+        self.back = back or SQLiteSessionStore()
+        self.front = front or MemorySessionStore()
+
+    def get(self, session_id):
+        version = self.back.get_version(session_id)
+        if version is None:
+            self.front.delete(session_id)
+            return None
+
+        entry = self.front.get_entry(session_id)
+        if entry and entry[1] == version:
+            return entry[0]
+
+        learning_session, version = self.back.get_with_version(session_id)
+        if learning_session:
+            self.front.put_entry(session_id, learning_session, version)
+        return learning_session
+
+    def save(self, session_id, learning_session):
+        version = self.back.save(session_id, learning_session)
+        self.front.put_entry(session_id, learning_session, version)
+
+    def delete(self, session_id):
+        self.back.delete(session_id)
+        self.front.delete(session_id)
+
+
+def create_session_store():
+    """Build the store selected by SESSION_STORE"""
+    if SESSION_STORE == 'memory':
+        return MemorySessionStore()
+    return TieredSessionStore()
@@ -1,84 +1,455 @@
 import sqlite3
 import json
 from datetime import datetime
+import atexit
+import base64
+import hashlib
 import os
+import threading
+import time
+
+from backend.utils.tracing import traced
+from backend.utils.write_behind import WriteBehindWriter
 
 DB_PATH = os.getenv('DATABASE_PATH', 'learning_assistant.db')
 
-def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # Topics table
-    c.execute('''CREATE TABLE IF NOT EXISTS topics
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  total_steps INTEGER,
-                  current_step INTEGER DEFAULT 0,
-                  completed BOOLEAN DEFAULT 0,
-                  roadmap_data TEXT)''')
-    
-    # Progress table
-    c.execute('''CREATE TABLE IF NOT EXISTS progress
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  topic_id INTEGER,
-                  step_number INTEGER,
-                  completed BOOLEAN DEFAULT 0,
-                  time_spent INTEGER DEFAULT 0,
-                  completed_at TIMESTAMP,
-                  FOREIGN KEY (topic_id) REFERENCES topics(id))''')
-    
-    # Notes table
-    c.execute('''CREATE TABLE IF NOT EXISTS notes
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  topic_id INTEGER,
-                  step_number INTEGER,
-                  content TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (topic_id) REFERENCES topics(id))''')
-    
-    # Chat history table
-    c.execute('''CREATE TABLE IF NOT EXISTS chat_history
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  topic_id INTEGER,
-                  step_number INTEGER,
-                  role TEXT,
-                  message TEXT,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (topic_id) REFERENCES topics(id))''')
-    
-    # Quiz results table
-    c.execute('''CREATE TABLE IF NOT EXISTS quiz_results
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  topic_id INTEGER,
-                  step_number INTEGER,
-                  score INTEGER,
-                  total_questions INTEGER,
-                  completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (topic_id) REFERENCES topics(id))''')
-    
-    # Mock test results table
-    c.execute('''CREATE TABLE IF NOT EXISTS mock_test_results
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  topic_id INTEGER,
-                  mcq_score INTEGER,
-                  total_mcqs INTEGER,
-                  subjective_score INTEGER,
-                  total_subjective INTEGER,
-                  overall_feedback TEXT,
-                  completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (topic_id) REFERENCES topics(id))''')
+# Connection tuning
+BUSY_TIMEOUT_MS = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', 5000))
+CACHE_SIZE_KB = int(os.getenv('DATABASE_CACHE_SIZE_KB', 20000))  # page cache per connection
+STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+
+# Connections not leased to any thread; a thread (a greenlet under gevent) leases one per
+# path on first use and gives it back when it ends, so no two ever share a connection
+POOL_IDLE_MAX = int(os.getenv('DATABASE_POOL_IDLE', 16))  # idle connections kept per path
+_idle = {}
+_idle_lock = threading.Lock()
+# threading.local is per greenlet once gevent has patched threading
+_local = threading.local()
+# Bumped in a forked child so it never touches connections opened by its parent
+_generation = 0
+
+def _retry_busy(call, *args):
+    """
+    Run call, retrying while the database is locked for up to BUSY_TIMEOUT_MS. The
+    waits use time.sleep, which gevent patches, so other greenlets (including the one
+    holding the lock) keep running instead of the whole worker blocking inside SQLite.
+    """
+    deadline = time.monotonic() + BUSY_TIMEOUT_MS / 1000
+    delay = 0.001
+    while True:
+        try:
+            return call(*args)
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) or time.monotonic() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+class _CooperativeCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        return _retry_busy(super().execute, *args)
+
+    def executemany(self, *args):
+        return _retry_busy(super().executemany, *args)
+
+
+class _CooperativeConnection(sqlite3.Connection):
+    """Connection whose busy waits yield to other greenlets (used under gevent)"""
+
+    def cursor(self, factory=_CooperativeCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        return _retry_busy(super().commit)
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched('time')
+    except ImportError:
+        return False
+
+def _open(path):
+    # SQLite's own busy handler sleeps in C, which would stall every greenlet of a gevent worker
+    cooperative = _gevent_patched()
+    busy_timeout_ms = 0 if cooperative else BUSY_TIMEOUT_MS
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False,
+                           factory=_CooperativeConnection if cooperative else sqlite3.Connection)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+def _release(path, conn, generation):
+    """Return a connection whose owner has ended to the idle pool, or close it"""
+    if generation != _generation:
+        return
+    try:
+        if conn.in_transaction:
+            # The owner ended before committing; nobody else has used this connection
+            conn.rollback()
+        with _idle_lock:
+            idle = _idle.setdefault(path, [])
+            if len(idle) < POOL_IDLE_MAX:
+                idle.append(conn)
+                return
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+class _Lease:
+    """The connections leased to one thread or greenlet, given back when it ends"""
+
+    def __init__(self):
+        self.generation = _generation
+        self.conns = {}
+
+    def __del__(self):
+        try:
+            for path, conn in self.conns.items():
+                _release(path, conn, self.generation)
+        except Exception:
+            # Interpreter shutdown
+            pass
+
+
+def get_connection(path=None):
+    """
+    Return the connection to path (default DB_PATH) leased to the current thread or greenlet,
+    taking an idle one or opening one with WAL journaling, synchronous=NORMAL, a busy timeout
+    and a larger page cache on first use.
+    """
+    path = path or DB_PATH
+    lease = getattr(_local, 'lease', None)
+    if lease is None or lease.generation != _generation:
+        lease = _local.lease = _Lease()
+    conn = lease.conns.get(path)
+    if conn is None:
+        with _idle_lock:
+            idle = _idle.get(path)
+            conn = idle.pop() if idle else None
+        lease.conns[path] = conn = conn or _open(path)
+    elif conn.in_transaction:
+        # A previous call on this thread failed before committing
+        conn.rollback()
+    return conn
+
+def _after_fork():
+    global _generation
+    _generation += 1
+    _idle.clear()
+
+# A forked child must not share its parent's SQLite handles
+os.register_at_fork(after_in_child=_after_fork)
+
+@traced('db.close_connections')
+def close_connections():
+    """Close this thread's connections and every idle one (e.g. at shutdown)"""
+    lease = getattr(_local, 'lease', None)
+    if lease is not None:
+        conns = list(lease.conns.values())
+        lease.conns.clear()
+    else:
+        conns = []
+    with _idle_lock:
+        for idle in _idle.values():
+            conns.extend(idle)
+        _idle.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+# Write-behind batching for append-only tables (chat, quiz and mock test results).
+# Reads from the same process flush pending rows first; other workers may lag by one interval.
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv('WRITE_BEHIND_INTERVAL_MS', 5))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 200))
+# Times a failed batch is retried (with backoff) before it is written row by row
+WRITE_BEHIND_RETRIES = int(os.getenv('WRITE_BEHIND_RETRIES', 3))
+
+_writer = WriteBehindWriter(get_connection, WRITE_BEHIND_INTERVAL_MS, WRITE_BEHIND_BATCH_SIZE,
+                            retries=WRITE_BEHIND_RETRIES)
+
+def _append(table, topic_id, sql, params):
+    """Insert a row through the write-behind queue, or directly when it is disabled"""
+    if WRITE_BEHIND_ENABLED:
+        _writer.submit(sql, params, key=(table, topic_id))
+        return
+    conn = get_connection()
+    conn.execute(sql, params)
+    conn.commit()
+
+def _wait_for_writes(table, topic_id=None):
+    """Make rows queued for this topic (or, without one, for any topic) visible before reading them"""
+    if not WRITE_BEHIND_ENABLED:
+        return
+    if topic_id is None:
+        _writer.wait_for_any(lambda key: key[0] == table)
+    else:
+        _writer.wait_for((table, topic_id))
+
+@traced('db.flush_writes')
+def flush_writes(timeout=5):
+    """Commit every queued write-behind row (called at shutdown)"""
+    return _writer.flush(timeout)
+
+@traced('db.write_behind_stats')
+def write_behind_stats():
+    """Queue depth and batch timings of the write-behind writer"""
+    stats = _writer.stats()
+    stats['enabled'] = WRITE_BEHIND_ENABLED
+    stats['interval_ms'] = WRITE_BEHIND_INTERVAL_MS
+    stats['batch_size'] = WRITE_BEHIND_BATCH_SIZE
+    return stats
+
+atexit.register(flush_writes)
+
+# /api/stats reads the learning_stats summary row instead of aggregating topics
+STATS_SUMMARY_ENABLED = os.getenv('STATS_SUMMARY_ENABLED', 'true').lower() == 'true'
+
+_STATS_REBUILD_SQL = '''INSERT OR REPLACE INTO learning_stats
+    (id, total_topics, completed_topics, total_steps, current_steps)
+    SELECT 1, COUNT(*), COALESCE(SUM(completed), 0), COALESCE(SUM(total_steps), 0),
+           COALESCE(SUM(current_step + 1), 0)
+    FROM topics'''
+
+# Schema migrations, applied in order and recorded in schema_migrations.
+# Each entry is (version, description, statements); never edit an applied entry, add a new one.
+MIGRATIONS = [
+    (1, "Create core tables", [
+        '''CREATE TABLE IF NOT EXISTS topics
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_steps INTEGER,
+            current_step INTEGER DEFAULT 0,
+            completed BOOLEAN DEFAULT 0,
+            roadmap_data TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS progress
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_id INTEGER,
+            step_number INTEGER,
+            completed BOOLEAN DEFAULT 0,
+            time_spent INTEGER DEFAULT 0,
+            completed_at TIMESTAMP,
+            FOREIGN KEY (topic_id) REFERENCES topics(id))''',
+        '''CREATE TABLE IF NOT EXISTS notes
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_id INTEGER,
+            step_number INTEGER,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (topic_id) REFERENCES topics(id))''',
+        '''CREATE TABLE IF NOT EXISTS chat_history
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_id INTEGER,
+            step_number INTEGER,
+            role TEXT,
+            message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (topic_id) REFERENCES topics(id))''',
+        '''CREATE TABLE IF NOT EXISTS quiz_results
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_id INTEGER,
+            step_number INTEGER,
+            score INTEGER,
+            total_questions INTEGER,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (topic_id) REFERENCES topics(id))''',
+        '''CREATE TABLE IF NOT EXISTS mock_test_results
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_id INTEGER,
+            mcq_score INTEGER,
+            total_mcqs INTEGER,
+            subjective_score INTEGER,
+            total_subjective INTEGER,
+            overall_feedback TEXT,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (topic_id) REFERENCES topics(id))''',
+    ]),
+    (2, "Canonical roadmap library", [
+        '''CREATE TABLE IF NOT EXISTS roadmap_library
+           (topic_key TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            steps TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (topic_key, difficulty))''',
+    ]),
+    (3, "Background jobs", [
+        # Timestamps are epoch seconds
+        '''CREATE TABLE IF NOT EXISTS jobs
+           (id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            payload TEXT,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL)''',
+    ]),
+    (4, "Shared learning sessions", [
+        '''CREATE TABLE IF NOT EXISTS learning_sessions
+           (id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            last_access REAL NOT NULL)''',
+        '''CREATE INDEX IF NOT EXISTS idx_learning_sessions_last_access
+           ON learning_sessions (last_access)''',
+    ]),
+    (5, "Secondary indexes and unique notes per step", [
+        'CREATE INDEX IF NOT EXISTS idx_chat_history_topic_step ON chat_history (topic_id, step_number, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_progress_topic_step ON progress (topic_id, step_number)',
+        'CREATE INDEX IF NOT EXISTS idx_quiz_results_topic ON quiz_results (topic_id, step_number)',
+        'CREATE INDEX IF NOT EXISTS idx_mock_test_results_topic ON mock_test_results (topic_id, completed_at)',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)',
+        # Keep only the newest note per step before enforcing uniqueness
+        '''DELETE FROM notes WHERE id NOT IN
+           (SELECT MAX(id) FROM notes GROUP BY topic_id, step_number)''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_topic_step ON notes (topic_id, step_number)',
+    ]),
+    (6, "Learning stats summary row", [
+        # Single row kept up to date by save_topic and update_topic_progress;
+        # current_steps is the sum of current_step + 1 over all topics
+        '''CREATE TABLE IF NOT EXISTS learning_stats
+           (id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_topics INTEGER NOT NULL DEFAULT 0,
+            completed_topics INTEGER NOT NULL DEFAULT 0,
+            total_steps INTEGER NOT NULL DEFAULT 0,
+            current_steps INTEGER NOT NULL DEFAULT 0)''',
+        _STATS_REBUILD_SQL,
+    ]),
+    (7, "Keyset pagination indexes", [
+        'CREATE INDEX IF NOT EXISTS idx_topics_last_accessed ON topics (last_accessed, id)',
+        # Chat is now ordered by id; this replaces the (topic_id, step_number, created_at) index
+        'CREATE INDEX IF NOT EXISTS idx_chat_history_topic_step_id ON chat_history (topic_id, step_number, id)',
+        'DROP INDEX IF EXISTS idx_chat_history_topic_step',
+    ]),
+    (8, "Resume analysis cache", [
+        # file_hash is the SHA-256 of the uploaded bytes, text_hash of the normalized
+        # extracted text; created_at is epoch seconds
+        '''CREATE TABLE IF NOT EXISTS resume_analyses
+           (file_hash TEXT PRIMARY KEY,
+            text_hash TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            created_at REAL NOT NULL)''',
+        'CREATE INDEX IF NOT EXISTS idx_resume_analyses_text ON resume_analyses (text_hash, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_resume_analyses_created ON resume_analyses (created_at)',
+    ]),
+    (9, "Quiz bank", [
+        # Parsed question sets per normalized topic, step title and difficulty;
+        # questions_hash drops a set that was generated twice
+        '''CREATE TABLE IF NOT EXISTS quiz_bank
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic_key TEXT NOT NULL,
+            step_title TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            questions TEXT NOT NULL,
+            questions_hash TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            UNIQUE (topic_key, step_title, difficulty, questions_hash))''',
+        # Sets already served to each user (the session_id cookie)
+        '''CREATE TABLE IF NOT EXISTS quiz_bank_seen
+           (user_id TEXT NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            seen_at REAL NOT NULL,
+            PRIMARY KEY (user_id, quiz_id),
+            FOREIGN KEY (quiz_id) REFERENCES quiz_bank(id))''',
+    ]),
+    (10, "Quiz bank sets served to anyone", [
+        'CREATE INDEX IF NOT EXISTS idx_quiz_bank_seen_quiz ON quiz_bank_seen (quiz_id)',
+    ]),
+]
+
+_migrated_paths = set()
+
+def encode_cursor(values):
+    """Opaque pagination cursor for the sort key of the last row returned"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, types):
+    """
+    Sort key from encode_cursor, checked against types: one type (or tuple of types)
+    per column of the page's sort key. Raises ValueError for a malformed cursor.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    for value, expected in zip(values, types):
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("Invalid cursor")
+    return values
+
+@traced('db.run_migrations')
+def run_migrations(path=None):
+    """Apply pending migrations and return the versions applied"""
+    conn = get_connection(path)
+    c = conn.cursor()
     
+    c.execute('''CREATE TABLE IF NOT EXISTS schema_migrations
+                 (version INTEGER PRIMARY KEY,
+                  description TEXT,
+                  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
     conn.commit()
-    conn.close()
+    
+    # BEGIN IMMEDIATE serializes workers starting at the same time
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        c.execute('SELECT version FROM schema_migrations')
+        done = {row[0] for row in c.fetchall()}
+        applied = []
+        for version, description, statements in MIGRATIONS:
+            if version in done:
+                continue
+            for statement in statements:
+                c.execute(statement)
+            c.execute('''INSERT INTO schema_migrations (version, description) VALUES (?, ?)''',
+                      (version, description))
+            applied.append(version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    for version in applied:
+        print(f"Applied database migration {version}")
+    return applied
+
+@traced('db.init_db')
+def init_db():
+    """Bring the database schema up to date; runs the migrations once per process"""
+    if DB_PATH in _migrated_paths:
+        return
+    run_migrations()
+    _migrated_paths.add(DB_PATH)
 
+@traced('db.save_topic')
 def save_topic(name, roadmap_data, total_steps):
     """Save a new topic to the database"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''INSERT INTO topics (name, total_steps, roadmap_data)
@@ -87,39 +458,69 @@ def save_topic(name, roadmap_data, total_steps):
     topic_id = c.lastrowid
     
     # Initialize progress for all steps
-    for i in range(total_steps):
-        c.execute('''INSERT INTO progress (topic_id, step_number)
-                     VALUES (?, ?)''', (topic_id, i))
+    c.executemany('''INSERT INTO progress (topic_id, step_number)
+                     VALUES (?, ?)''', [(topic_id, i) for i in range(total_steps)])
+    
+    # A new topic starts at step 0, which counts as one step in progress
+    c.execute('''UPDATE learning_stats SET total_topics = total_topics + 1,
+                 total_steps = total_steps + ?, current_steps = current_steps + 1
+                 WHERE id = 1''', (total_steps,))
     
     conn.commit()
-    conn.close()
     return topic_id
 
+def _topic_summary(row):
+    return {
+        'id': row[0],
+        'name': row[1],
+        'total_steps': row[2],
+        'current_step': row[3],
+        'completed': bool(row[4]),
+        'last_accessed': row[5]
+    }
+
+@traced('db.get_all_topics')
 def get_all_topics():
-    """Get all topics"""
-    conn = sqlite3.connect(DB_PATH)
+    """Get all topics, most recently accessed first"""
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''SELECT id, name, total_steps, current_step, completed, last_accessed
-                 FROM topics ORDER BY last_accessed DESC''')
+                 FROM topics ORDER BY last_accessed DESC, id DESC''')
     
-    topics = []
-    for row in c.fetchall():
-        topics.append({
-            'id': row[0],
-            'name': row[1],
-            'total_steps': row[2],
-            'current_step': row[3],
-            'completed': bool(row[4]),
-            'last_accessed': row[5]
-        })
+    return [_topic_summary(row) for row in c.fetchall()]
+
+@traced('db.get_topics_page')
+def get_topics_page(limit=50, cursor=None):
+    """
+    One page of topics, most recently accessed first, ordered by (last_accessed, id).
+    Returns (topics, next_cursor); next_cursor is None on the last page.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    
+    if cursor:
+        last_accessed, topic_id = decode_cursor(cursor, ((str, int, float), int))
+        c.execute('''SELECT id, name, total_steps, current_step, completed, last_accessed
+                     FROM topics WHERE (last_accessed, id) < (?, ?)
+                     ORDER BY last_accessed DESC, id DESC LIMIT ?''',
+                  (last_accessed, topic_id, limit + 1))
+    else:
+        c.execute('''SELECT id, name, total_steps, current_step, completed, last_accessed
+                     FROM topics ORDER BY last_accessed DESC, id DESC LIMIT ?''', (limit + 1,))
+    
+    rows = c.fetchall()
+    topics = [_topic_summary(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([topics[-1]['last_accessed'], topics[-1]['id']])
     
-    conn.close()
-    return topics
+    return topics, next_cursor
 
+@traced('db.get_topic')
 def get_topic(topic_id):
     """Get a specific topic"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''SELECT id, name, total_steps, current_step, roadmap_data
@@ -137,43 +538,119 @@ def get_topic(topic_id):
     else:
         topic = None
     
-    conn.close()
     return topic
 
+@traced('db.iter_topics')
+def iter_topics(chunk_size=50):
+    """Yield every topic with its roadmap, oldest first, reading chunk_size topics at a time"""
+    last_id = 0
+    while True:
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute('''SELECT id, name, total_steps, current_step, completed, created_at, roadmap_data
+                     FROM topics WHERE id > ? ORDER BY id LIMIT ?''', (last_id, chunk_size))
+        rows = c.fetchall()
+        for row in rows:
+            yield {
+                'id': row[0],
+                'name': row[1],
+                'total_steps': row[2],
+                'current_step': row[3],
+                'completed': bool(row[4]),
+                'created_at': row[5],
+                'roadmap_data': json.loads(row[6]) if row[6] else {'steps': []}
+            }
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+@traced('db.get_learning_stats')
+def get_learning_stats(use_summary=None):
+    """
+    Topic and step totals plus the average quiz score per topic.
+    Totals come from the learning_stats row, or are aggregated over topics
+    in SQL when use_summary is False (default: STATS_SUMMARY_ENABLED).
+    """
+    if use_summary is None:
+        use_summary = STATS_SUMMARY_ENABLED
+    _wait_for_writes('quiz_results')
+    conn = get_connection()
+    c = conn.cursor()
+    
+    if use_summary:
+        c.execute('''SELECT total_topics, completed_topics, total_steps, current_steps
+                     FROM learning_stats WHERE id = 1''')
+    else:
+        c.execute('''SELECT COUNT(*), COALESCE(SUM(completed), 0), COALESCE(SUM(total_steps), 0),
+                            COALESCE(SUM(current_step + 1), 0)
+                     FROM topics''')
+    row = c.fetchone() or (0, 0, 0, 0)
+    
+    c.execute('''SELECT q.topic_id, t.name, COUNT(*),
+                        AVG(CAST(q.score AS REAL) / q.total_questions) * 100
+                 FROM quiz_results q JOIN topics t ON t.id = q.topic_id
+                 WHERE q.total_questions > 0
+                 GROUP BY q.topic_id
+                 ORDER BY q.topic_id''')
+    
+    quiz_averages = []
+    for quiz_row in c.fetchall():
+        quiz_averages.append({
+            'topic_id': quiz_row[0],
+            'name': quiz_row[1],
+            'attempts': quiz_row[2],
+            'average_score': round(quiz_row[3], 1)
+        })
+    
+    return {
+        'total_topics': row[0],
+        'completed_topics': row[1],
+        'total_steps': row[2],
+        'current_steps': row[3],
+        'quiz_averages': quiz_averages
+    }
+
+@traced('db.rebuild_learning_stats')
+def rebuild_learning_stats():
+    """Recompute the learning_stats row from the topics table"""
+    conn = get_connection()
+    conn.execute(_STATS_REBUILD_SQL)
+    conn.commit()
+
+@traced('db.update_topic_progress')
 def update_topic_progress(topic_id, step_number):
     """Update the current step for a topic"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
     
+    # Apply the step delta to the summary row in the same transaction
+    c.execute('''UPDATE learning_stats SET current_steps = current_steps +
+                 COALESCE((SELECT ? - current_step FROM topics WHERE id = ?), 0)
+                 WHERE id = 1''', (step_number, topic_id))
     c.execute('''UPDATE topics SET current_step = ?, last_accessed = CURRENT_TIMESTAMP
                  WHERE id = ?''', (step_number, topic_id))
     
     conn.commit()
-    conn.close()
 
+@traced('db.save_note')
 def save_note(topic_id, step_number, content):
     """Save or update a note"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
     
-    # Check if note exists
-    c.execute('''SELECT id FROM notes WHERE topic_id = ? AND step_number = ?''',
-              (topic_id, step_number))
-    
-    if c.fetchone():
-        c.execute('''UPDATE notes SET content = ?, updated_at = CURRENT_TIMESTAMP
-                     WHERE topic_id = ? AND step_number = ?''',
-                  (content, topic_id, step_number))
-    else:
-        c.execute('''INSERT INTO notes (topic_id, step_number, content)
-                     VALUES (?, ?, ?)''', (topic_id, step_number, content))
+    c.execute('''INSERT INTO notes (topic_id, step_number, content)
+                 VALUES (?, ?, ?)
+                 ON CONFLICT(topic_id, step_number) DO UPDATE SET
+                     content = excluded.content,
+                     updated_at = CURRENT_TIMESTAMP''',
+              (topic_id, step_number, content))
     
     conn.commit()
-    conn.close()
 
+@traced('db.get_note')
 def get_note(topic_id, step_number):
     """Get a note for a specific step"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''SELECT content FROM notes WHERE topic_id = ? AND step_number = ?''',
@@ -182,44 +659,98 @@ def get_note(topic_id, step_number):
     row = c.fetchone()
     note = row[0] if row else None
     
-    conn.close()
     return note
 
-def save_chat_message(topic_id, step_number, role, message):
-    """Save a chat message"""
-    conn = sqlite3.connect(DB_PATH)
+@traced('db.get_notes_for_topic')
+def get_notes_for_topic(topic_id):
+    """Get every note of a topic in one query, keyed by step number"""
+    conn = get_connection()
     c = conn.cursor()
     
-    c.execute('''INSERT INTO chat_history (topic_id, step_number, role, message)
-                 VALUES (?, ?, ?, ?)''', (topic_id, step_number, role, message))
+    c.execute('''SELECT step_number, content FROM notes WHERE topic_id = ?''', (topic_id,))
     
-    conn.commit()
-    conn.close()
+    return {row[0]: row[1] for row in c.fetchall()}
+
+@traced('db.save_chat_message')
+def save_chat_message(topic_id, step_number, role, message):
+    """Save a chat message (batched by the write-behind writer)"""
+    _append('chat_history', topic_id,
+            '''INSERT INTO chat_history (topic_id, step_number, role, message)
+               VALUES (?, ?, ?, ?)''', (topic_id, step_number, role, message))
 
+@traced('db.get_chat_history')
 def get_chat_history(topic_id, step_number, limit=10):
-    """Get chat history for a step"""
-    conn = sqlite3.connect(DB_PATH)
+    """Get the latest chat messages for a step, oldest first"""
+    return get_chat_history_page(topic_id, step_number, limit)[0]
+
+@traced('db.get_chat_history_page')
+def get_chat_history_page(topic_id, step_number, limit=10, cursor=None):
+    """
+    One page of a step's chat, oldest first. The first page holds the newest messages and
+    next_cursor pages back towards older ones; it is None once the start is reached.
+    """
+    _wait_for_writes('chat_history', topic_id)
+    conn = get_connection()
     c = conn.cursor()
     
-    c.execute('''SELECT role, message, created_at FROM chat_history
-                 WHERE topic_id = ? AND step_number = ?
-                 ORDER BY created_at DESC LIMIT ?''',
-              (topic_id, step_number, limit))
+    if cursor:
+        (before_id,) = decode_cursor(cursor, (int,))
+        c.execute('''SELECT id, role, message, created_at FROM chat_history
+                     WHERE topic_id = ? AND step_number = ? AND id < ?
+                     ORDER BY id DESC LIMIT ?''',
+                  (topic_id, step_number, before_id, limit + 1))
+    else:
+        c.execute('''SELECT id, role, message, created_at FROM chat_history
+                     WHERE topic_id = ? AND step_number = ?
+                     ORDER BY id DESC LIMIT ?''',
+                  (topic_id, step_number, limit + 1))
     
+    rows = c.fetchall()
     messages = []
-    for row in c.fetchall():
+    for row in rows[:limit]:
         messages.append({
-            'role': row[0],
-            'message': row[1],
-            'created_at': row[2]
+            'id': row[0],
+            'role': row[1],
+            'message': row[2],
+            'created_at': row[3]
         })
+    messages.reverse()
     
-    conn.close()
-    return list(reversed(messages))
+    next_cursor = encode_cursor([messages[0]['id']]) if len(rows) > limit else None
+    return messages, next_cursor
 
+@traced('db.iter_topic_chat_history')
+def iter_topic_chat_history(topic_id, chunk_size=500):
+    """
+    Yield every chat message of a topic ordered by step and id. Rows are read in
+    keyset chunks, so no cursor stays open while the caller is consuming them.
+    """
+    _wait_for_writes('chat_history', topic_id)
+    last = (-1, 0)
+    while True:
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute('''SELECT id, step_number, role, message, created_at FROM chat_history
+                     WHERE topic_id = ? AND (step_number, id) > (?, ?)
+                     ORDER BY step_number, id LIMIT ?''',
+                  (topic_id, last[0], last[1], chunk_size))
+        rows = c.fetchall()
+        for row in rows:
+            yield {
+                'step_number': row[1],
+                'role': row[2],
+                'message': row[3],
+                'created_at': row[4]
+            }
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1][1], rows[-1][0])
+
+@traced('db.clear_chat_history')
 def clear_chat_history(topic_id, step_number):
     """Clear chat history for a specific step"""
-    conn = sqlite3.connect(DB_PATH)
+    _wait_for_writes('chat_history', topic_id)
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''DELETE FROM chat_history 
@@ -227,22 +758,19 @@ def clear_chat_history(topic_id, step_number):
               (topic_id, step_number))
     
     conn.commit()
-    conn.close()
 
+@traced('db.save_quiz_result')
 def save_quiz_result(topic_id, step_number, score, total_questions):
-    """Save quiz results"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    c.execute('''INSERT INTO quiz_results (topic_id, step_number, score, total_questions)
-                 VALUES (?, ?, ?, ?)''', (topic_id, step_number, score, total_questions))
-    
-    conn.commit()
-    conn.close()
+    """Save quiz results (batched by the write-behind writer)"""
+    _append('quiz_results', topic_id,
+            '''INSERT INTO quiz_results (topic_id, step_number, score, total_questions)
+               VALUES (?, ?, ?, ?)''', (topic_id, step_number, score, total_questions))
 
+@traced('db.get_quiz_results')
 def get_quiz_results(topic_id):
     """Get all quiz results for a topic"""
-    conn = sqlite3.connect(DB_PATH)
+    _wait_for_writes('quiz_results', topic_id)
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''SELECT step_number, score, total_questions, completed_at
@@ -258,29 +786,27 @@ def get_quiz_results(topic_id):
             'completed_at': row[3]
         })
     
-    conn.close()
     return results
 
+@traced('db.save_mock_test_result')
 def save_mock_test_result(topic_id, result):
-    """Save mock test results"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
+    """Save mock test results (batched by the write-behind writer); ungraded answers are left out"""
     # Calculate subjective score sum
-    subjective_score = sum([s['score'] for s in result.get('subjective_details', [])])
-    total_subjective = len(result.get('subjective_details', [])) * 10
-    
-    c.execute('''INSERT INTO mock_test_results 
-                 (topic_id, mcq_score, total_mcqs, subjective_score, total_subjective, overall_feedback)
-                 VALUES (?, ?, ?, ?, ?, ?)''', 
-              (topic_id, result['mcq_score'], result['total_mcqs'], subjective_score, total_subjective, result['overall_feedback']))
+    graded = [s for s in result.get('subjective_details', []) if s.get('score') is not None]
+    subjective_score = sum([s['score'] for s in graded])
+    total_subjective = len(graded) * 10
     
-    conn.commit()
-    conn.close()
+    _append('mock_test_results', topic_id,
+            '''INSERT INTO mock_test_results 
+               (topic_id, mcq_score, total_mcqs, subjective_score, total_subjective, overall_feedback)
+               VALUES (?, ?, ?, ?, ?, ?)''', 
+            (topic_id, result['mcq_score'], result['total_mcqs'], subjective_score, total_subjective, result['overall_feedback']))
 
+@traced('db.get_mock_test_results')
 def get_mock_test_results(topic_id):
     """Get all mock test results for a topic"""
-    conn = sqlite3.connect(DB_PATH)
+    _wait_for_writes('mock_test_results', topic_id)
+    conn = get_connection()
     c = conn.cursor()
     
     c.execute('''SELECT mcq_score, total_mcqs, subjective_score, total_subjective, overall_feedback, completed_at
@@ -298,8 +824,364 @@ def get_mock_test_results(topic_id):
             'completed_at': row[5]
         })
     
-    conn.close()
     return results
 
-# Initialize database on import
-init_db()
+@traced('db.get_library_roadmap')
+def get_library_roadmap(topic_key, difficulty, max_age_days=None):
+    """Get a canonical roadmap, ignoring it if it is older than max_age_days"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    query = '''SELECT topic, steps, updated_at FROM roadmap_library
+                 WHERE topic_key = ? AND difficulty = ?'''
+    params = [topic_key, difficulty]
+    if max_age_days is not None:
+        query += " AND updated_at >= datetime('now', ?)"
+        params.append(f'-{max_age_days} days')
+    c.execute(query, params)
+    
+    row = c.fetchone()
+    if row:
+        roadmap = {
+            'topic': row[0],
+            'steps': json.loads(row[1]),
+            'updated_at': row[2]
+        }
+    else:
+        roadmap = None
+    
+    return roadmap
+
+@traced('db.save_library_roadmap')
+def save_library_roadmap(topic_key, difficulty, topic, steps):
+    """Save or replace a canonical roadmap"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''INSERT INTO roadmap_library (topic_key, difficulty, topic, steps)
+                 VALUES (?, ?, ?, ?)
+                 ON CONFLICT(topic_key, difficulty) DO UPDATE SET
+                     topic = excluded.topic,
+                     steps = excluded.steps,
+                     updated_at = CURRENT_TIMESTAMP''',
+              (topic_key, difficulty, topic, json.dumps(steps)))
+    
+    conn.commit()
+
+@traced('db.get_all_roadmap_data')
+def get_all_roadmap_data():
+    """Get name and stored roadmap for every topic, oldest first"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''SELECT name, roadmap_data FROM topics ORDER BY id''')
+    
+    rows = [(row[0], json.loads(row[1])) for row in c.fetchall()]
+    
+    return rows
+
+@traced('db.get_resume_analysis')
+def get_resume_analysis(file_hash=None, text_hash=None, max_age=None):
+    """Stored analysis for an uploaded file or, failing that, for the same extracted text"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    min_created = time.time() - max_age if max_age is not None else 0
+    row = None
+    if file_hash:
+        c.execute('''SELECT analysis FROM resume_analyses
+                     WHERE file_hash = ? AND created_at >= ?''', (file_hash, min_created))
+        row = c.fetchone()
+    if row is None and text_hash:
+        c.execute('''SELECT analysis FROM resume_analyses
+                     WHERE text_hash = ? AND created_at >= ?
+                     ORDER BY created_at DESC LIMIT 1''', (text_hash, min_created))
+        row = c.fetchone()
+    
+    return json.loads(row[0]) if row else None
+
+@traced('db.save_resume_analysis')
+def save_resume_analysis(file_hash, text_hash, analysis, max_age=None):
+    """Store an analysis under both keys, dropping entries older than max_age"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    now = time.time()
+    c.execute('''INSERT OR REPLACE INTO resume_analyses (file_hash, text_hash, analysis, created_at)
+                 VALUES (?, ?, ?, ?)''', (file_hash, text_hash, json.dumps(analysis), now))
+    if max_age is not None:
+        c.execute('''DELETE FROM resume_analyses WHERE created_at < ?''', (now - max_age,))
+    
+    conn.commit()
+
+@traced('db.alias_resume_analysis')
+def alias_resume_analysis(file_hash, text_hash):
+    """
+    Store the newest analysis of text_hash under another file_hash as well, keeping its
+    original created_at so the alias expires with it
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''INSERT OR REPLACE INTO resume_analyses (file_hash, text_hash, analysis, created_at)
+                 SELECT ?, text_hash, analysis, created_at FROM resume_analyses
+                 WHERE text_hash = ? ORDER BY created_at DESC LIMIT 1''', (file_hash, text_hash))
+    
+    conn.commit()
+
+@traced('db.add_quiz_set')
+def add_quiz_set(topic_key, step_title, difficulty, questions):
+    """Store a question set in the quiz bank; returns its id, or None if it is already there"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    encoded = json.dumps(questions, sort_keys=True)
+    questions_hash = hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    c.execute('''INSERT OR IGNORE INTO quiz_bank
+                 (topic_key, step_title, difficulty, questions, questions_hash, created_at)
+                 VALUES (?, ?, ?, ?, ?, ?)''',
+              (topic_key, step_title, difficulty, encoded, questions_hash, time.time()))
+    quiz_id = c.lastrowid if c.rowcount else None
+    
+    conn.commit()
+    return quiz_id
+
+@traced('db.take_quiz_set')
+def take_quiz_set(user_id, topic_key, step_title, difficulty):
+    """
+    Pick a set the user has not seen and mark it seen; returns (id, questions) or None.
+    Sets already served to someone else come first, at random, so sets nobody has
+    seen are kept in reserve and the bank is refilled only when they run low.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''SELECT id, questions FROM quiz_bank
+                 WHERE topic_key = ? AND step_title = ? AND difficulty = ?
+                   AND id NOT IN (SELECT quiz_id FROM quiz_bank_seen WHERE user_id = ?)
+                 ORDER BY EXISTS (SELECT 1 FROM quiz_bank_seen s WHERE s.quiz_id = quiz_bank.id) DESC,
+                          RANDOM()
+                 LIMIT 1''',
+              (topic_key, step_title, difficulty, user_id))
+    row = c.fetchone()
+    if row is None:
+        return None
+    # Two requests racing for the same set: the loser takes another one
+    c.execute('''INSERT OR IGNORE INTO quiz_bank_seen (user_id, quiz_id, seen_at) VALUES (?, ?, ?)''',
+              (user_id, row[0], time.time()))
+    taken = c.rowcount
+    conn.commit()
+    if not taken:
+        return take_quiz_set(user_id, topic_key, step_title, difficulty)
+    
+    return row[0], json.loads(row[1])
+
+@traced('db.mark_quiz_set_seen')
+def mark_quiz_set_seen(user_id, quiz_id):
+    """Record that a set was served to a user"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''INSERT OR IGNORE INTO quiz_bank_seen (user_id, quiz_id, seen_at) VALUES (?, ?, ?)''',
+              (user_id, quiz_id, time.time()))
+    
+    conn.commit()
+
+@traced('db.count_quiz_sets')
+def count_quiz_sets(topic_key, step_title, difficulty):
+    """(total, unused) sets for a key; unused counts sets that have not been served to anyone"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''SELECT COUNT(*),
+                        SUM(CASE WHEN NOT EXISTS (SELECT 1 FROM quiz_bank_seen s WHERE s.quiz_id = q.id)
+                                 THEN 1 ELSE 0 END)
+                 FROM quiz_bank q
+                 WHERE q.topic_key = ? AND q.step_title = ? AND q.difficulty = ?''',
+              (topic_key, step_title, difficulty))
+    total, unused = c.fetchone()
+    
+    return total, unused or 0
+
+@traced('db.create_job')
+def create_job(job_id, kind, payload):
+    """Queue a background job"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''INSERT INTO jobs (id, kind, status, payload, created_at)
+                 VALUES (?, ?, 'queued', ?, ?)''', (job_id, kind, json.dumps(payload), time.time()))
+    
+    conn.commit()
+
+@traced('db.claim_next_job')
+def claim_next_job(kinds):
+    """Atomically mark the oldest queued job of one of the given kinds as running and return it"""
+    if not kinds:
+        return None
+    conn = get_connection()
+    c = conn.cursor()
+    
+    # BEGIN IMMEDIATE takes the write lock so two workers cannot claim the same job
+    c.execute('BEGIN IMMEDIATE')
+    placeholders = ','.join('?' * len(kinds))
+    c.execute(f'''SELECT id, kind, payload FROM jobs
+                  WHERE status = 'queued' AND kind IN ({placeholders})
+                  ORDER BY created_at LIMIT 1''', list(kinds))
+    row = c.fetchone()
+    if row:
+        c.execute('''UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1
+                     WHERE id = ?''', (time.time(), row[0]))
+        job = {'id': row[0], 'kind': row[1], 'payload': json.loads(row[2])}
+    else:
+        job = None
+    
+    conn.commit()
+    return job
+
+@traced('db.finish_job')
+def finish_job(job_id, result=None, error=None):
+    """Store the result (or error) of a job"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?
+                 WHERE id = ?''',
+              ('failed' if error else 'done', json.dumps(result) if error is None else None, error, time.time(), job_id))
+    
+    conn.commit()
+
+@traced('db.get_job')
+def get_job(job_id):
+    """Get a job with its timing"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''SELECT id, kind, status, result, error, attempts, created_at, started_at, finished_at
+                 FROM jobs WHERE id = ?''', (job_id,))
+    
+    row = c.fetchone()
+    if row:
+        job = {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'result': json.loads(row[3]) if row[3] else None,
+            'error': row[4],
+            'attempts': row[5],
+            'created_at': row[6],
+            'started_at': row[7],
+            'finished_at': row[8],
+            'wait_ms': round((row[7] - row[6]) * 1000) if row[7] else None,
+            'duration_ms': round((row[8] - row[7]) * 1000) if row[7] and row[8] else None
+        }
+    else:
+        job = None
+    
+    return job
+
+@traced('db.requeue_stale_jobs')
+def requeue_stale_jobs(timeout, max_attempts):
+    """Requeue jobs left running by a worker that died; give up on them after max_attempts"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    cutoff = time.time() - timeout
+    c.execute('''UPDATE jobs SET status = 'failed', error = 'Job timed out', finished_at = ?
+                 WHERE status = 'running' AND started_at < ? AND attempts >= ?''',
+              (time.time(), cutoff, max_attempts))
+    c.execute('''UPDATE jobs SET status = 'queued', started_at = NULL
+                 WHERE status = 'running' AND started_at < ?''', (cutoff,))
+    requeued = c.rowcount
+    
+    conn.commit()
+    return requeued
+
+@traced('db.delete_finished_jobs')
+def delete_finished_jobs(older_than):
+    """Remove finished jobs older than the given number of seconds"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?''',
+              (time.time() - older_than,))
+    
+    conn.commit()
+
+@traced('db.save_learning_session')
+def save_learning_session(session_id, data):
+    """Insert or replace a serialized learning session and return its new version"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''INSERT INTO learning_sessions (id, data, version, last_access)
+                 VALUES (?, ?, 1, ?)
+                 ON CONFLICT(id) DO UPDATE SET
+                     data = excluded.data,
+                     version = learning_sessions.version + 1,
+                     last_access = excluded.last_access''',
+              (session_id, json.dumps(data), time.time()))
+    c.execute('''SELECT version FROM learning_sessions WHERE id = ?''', (session_id,))
+    version = c.fetchone()[0]
+    
+    conn.commit()
+    return version
+
+@traced('db.get_learning_session')
+def get_learning_session(session_id, idle_ttl):
+    """Get a serialized learning session unless it has been idle longer than idle_ttl seconds"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''SELECT data, version, last_access FROM learning_sessions
+                 WHERE id = ? AND last_access > ?''', (session_id, time.time() - idle_ttl))
+    
+    row = c.fetchone()
+    session = {'data': json.loads(row[0]), 'version': row[1], 'last_access': row[2]} if row else None
+    
+    return session
+
+@traced('db.get_learning_session_version')
+def get_learning_session_version(session_id, idle_ttl):
+    """Get only the version and last access time of a learning session"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''SELECT version, last_access FROM learning_sessions
+                 WHERE id = ? AND last_access > ?''', (session_id, time.time() - idle_ttl))
+    
+    row = c.fetchone()
+    
+    return (row[0], row[1]) if row else None
+
+@traced('db.touch_learning_session')
+def touch_learning_session(session_id):
+    """Refresh the idle timer of a learning session"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''UPDATE learning_sessions SET last_access = ? WHERE id = ?''', (time.time(), session_id))
+    
+    conn.commit()
+
+@traced('db.delete_learning_session')
+def delete_learning_session(session_id):
+    """Delete a learning session"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''DELETE FROM learning_sessions WHERE id = ?''', (session_id,))
+    
+    conn.commit()
+
+@traced('db.delete_idle_learning_sessions')
+def delete_idle_learning_sessions(idle_ttl):
+    """Delete learning sessions idle for longer than idle_ttl seconds"""
+    conn = get_connection()
+    c = conn.cursor()
+    
+    c.execute('''DELETE FROM learning_sessions WHERE last_access <= ?''', (time.time() - idle_ttl,))
+    deleted = c.rowcount
+    
+    conn.commit()
+    return deleted
@@ -0,0 +1,116 @@
+import json
+import re
+import zipfile
+from itertools import groupby
+
+import backend.utils.database as db
+
+
+def handbook_filename(name, suffix='_Handbook.md'):
+    """File-system safe name for an exported topic"""
+    return (re.sub(r'[^\w.-]+', '_', name, flags=re.ASCII).strip('_') or 'topic') + suffix
+
+def _chat_by_step(topic_id):
+    """(step_number, messages) pairs in step order, read from one set-based query"""
+    return groupby(db.iter_topic_chat_history(topic_id), key=lambda msg: msg['step_number'])
+
+def iter_steps(topic):
+    """
+    Yield (index, step, note, chat_messages) for every roadmap step of a topic.
+    Notes come from a single query and chat history from one ordered scan,
+    instead of two queries per step.
+    """
+    notes = db.get_notes_for_topic(topic['id'])
+    chat = _chat_by_step(topic['id'])
+    pending = next(chat, None)
+
+    for i, step in enumerate(topic['roadmap_data'].get('steps', [])):
+        # Skip chat rows for steps that are no longer in the roadmap
+        while pending and pending[0] < i:
+            pending = next(chat, None)
+        messages = []
+        if pending and pending[0] == i:
+            messages = list(pending[1])
+            pending = next(chat, None)
+        yield i, step, notes.get(i), messages
+
+def iter_handbook(topic, persona=None, difficulty=None):
+    """Yield a topic's Markdown handbook one step at a time"""
+    yield f"# Learning Handbook: {topic['name']}\n"
+    if persona or difficulty:
+        yield f"**Persona:** {persona} | **Difficulty:** {difficulty}\n\n"
+    else:
+        yield "\n"
+    yield "## Roadmap\n"
+
+    for i, step, note, messages in iter_steps(topic):
+        parts = [f"### Step {i+1}: {step['title']}\n"]
+        for detail in step.get('details', []):
+            parts.append(f"- {detail}\n")
+
+        if note:
+            parts.append(f"\n#### My Notes\n> {note}\n")
+
+        if messages:
+            parts.append("\n#### Chat History\n")
+            for msg in messages:
+                parts.append(f"**{msg['role'].capitalize()}:** {msg['message']}\n\n")
+
+        parts.append("\n---\n")
+        yield ''.join(parts)
+
+def iter_ndjson(topics):
+    """Yield one JSON line per topic with its steps, notes and chat history"""
+    for topic in topics:
+        record = {
+            'id': topic['id'],
+            'name': topic['name'],
+            'total_steps': topic['total_steps'],
+            'current_step': topic['current_step'],
+            'completed': topic['completed'],
+            'created_at': topic['created_at'],
+            'steps': [
+                {
+                    'title': step['title'],
+                    'details': step.get('details', []),
+                    'note': note,
+                    'chat': [{'role': m['role'], 'message': m['message'], 'created_at': m['created_at']}
+                             for m in messages]
+                }
+                for i, step, note, messages in iter_steps(topic)
+            ]
+        }
+        yield json.dumps(record) + '\n'
+
+
+class _ZipStream:
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_zip(topics):
+    """Yield a zip archive with one Markdown handbook per topic, built as it is sent"""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for topic in topics:
+            name = handbook_filename(topic['name'], suffix='.md')
+            with archive.open(f"{topic['id']:04d}_{name}", 'w') as entry:
+                for chunk in iter_handbook(topic):
+                    entry.write(chunk.encode('utf-8'))
+                    data = stream.drain()
+                    if data:
+                        yield data
+    yield stream.drain()
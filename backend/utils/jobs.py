@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+import uuid
+
+import backend.utils.database as db
+from backend.utils import tracing
+
+# Seconds a worker sleeps between checks for jobs queued by other processes
+POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1))
+# Jobs running longer than this are assumed to belong to a dead worker and are requeued
+JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', 600))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 2))
+# Finished jobs are kept this long so clients can fetch their result
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 24 * 3600))
+
+
+class JobQueue:
+    """
+    Background jobs persisted in the jobs table. Any process that registers a handler
+    and starts workers can execute jobs, so results survive a web worker restart and
+    the pool can run in a separate process (see worker.py).
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def register(self, kind, handler):
+        """Register handler(payload) -> JSON-serializable result for a job kind"""
+        self.handlers[kind] = handler
+
+    def submit(self, kind, payload):
+        """Queue a job and return its id"""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        job_id = uuid.uuid4().hex
+        db.create_job(job_id, kind, payload)
+        tracing.annotate(job_id=job_id)
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        return db.get_job(job_id)
+
+    def start(self, workers):
+        """Start worker threads in this process; 0 means this process only enqueues"""
+        db.requeue_stale_jobs(JOB_TIMEOUT, JOB_MAX_ATTEMPTS)
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run_once(self):
+        """Claim and run one job, returning False when the queue is empty"""
+        job = db.claim_next_job(list(self.handlers))
+        if not job:
+            return False
+
+        # Each job is its own trace; job_id links it to the request that queued it
+        root = tracing.start_trace(f"job {job['kind']}", job_id=job['id'])
+        error = None
+        try:
+            result = self.handlers[job['kind']](job['payload'])
+            db.finish_job(job['id'], result=result)
+        except Exception as e:
+            error = e
+            print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+            db.finish_job(job['id'], error=str(e) or e.__class__.__name__)
+        finally:
+            tracing.end_trace(root, error)
+        return True
+
+    def _work(self):
+        last_cleanup = 0
+        while not self._stopping.is_set():
+            try:
+                if self.run_once():
+                    continue
+                if time.time() - last_cleanup > 3600:
+                    db.requeue_stale_jobs(JOB_TIMEOUT, JOB_MAX_ATTEMPTS)
+                    db.delete_finished_jobs(JOB_RETENTION)
+                    last_cleanup = time.time()
+            except Exception as e:
+                print(f"Job worker error: {e}")
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+
+
+queue = JobQueue()
@@ -0,0 +1,206 @@
+import json
+
+from backend.utils.tracing import traced
+
+# A JSON value only counts as the response's root if it starts a line or follows one
+# of these, so inline citation markers such as "[1]" in prose are skipped
+_ROOT_PRECEDERS = ('', '\n', '`', ':', '=')
+
+
+class JSONStreamParser:
+    """
+    Incremental, bracket-aware scanner that pulls the first complete JSON object or
+    array out of LLM output, which may be wrapped in prose or markdown code fences.
+
+    feed() accepts text as it arrives and returns the array elements completed by that
+    chunk as (path, value) pairs. Elements are reported for the root array (path ())
+    and for arrays reached from the root through object keys only, e.g. ('mcqs',) for
+    {"mcqs": [...]}; arrays nested inside other arrays are left to the final value.
+    Once the root closes, done is True and value holds the parsed root.
+    """
+
+    def __init__(self, expect=None, strict_start=True):
+        if expect not in (None, 'object', 'array'):
+            raise ValueError("expect must be None, 'object' or 'array'")
+        self.openers = {'object': '{', 'array': '['}.get(expect, '{[')
+        self.strict_start = strict_start
+        self.done = False
+        self.value = None
+        self._buf = ''
+        self._pos = 0
+        self._root = None  # index in _buf where the current root candidate starts
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._events = []
+
+    def feed(self, chunk):
+        """Add text and return the array elements it completed"""
+        if self.done or not chunk:
+            return []
+        self._buf += chunk
+        self._scan()
+        events, self._events = self._events, []
+        return events
+
+    def close(self):
+        """Return the root value, raising ValueError if no complete JSON value was found"""
+        if not self.done:
+            raise ValueError("No complete JSON value found in response")
+        return self.value
+
+    def _can_start(self, i):
+        if not self.strict_start:
+            return True
+        j = i - 1
+        while j >= 0 and self._buf[j] in ' \t\r':
+            j -= 1
+        return (self._buf[j] if j >= 0 else '') in _ROOT_PRECEDERS
+
+    def _scan(self):
+        buf = self._buf
+        while self._pos < len(buf) and not self.done:
+            i = self._pos
+            ch = buf[i]
+            self._pos += 1
+
+            if self._root is None:
+                if ch in self.openers and self._can_start(i):
+                    self._root = i
+                    self._push(ch, i, name=None)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame['type'] == '{' and frame['expect_key']:
+                        frame['last_string'] = buf[self._string_start:i + 1]
+                continue
+
+            frame = self._stack[-1]
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._begin_item(frame, i)
+            elif ch in '{[':
+                self._begin_item(frame, i)
+                name = frame['key'] if frame['type'] == '{' else frame['index']
+                self._push(ch, i, name)
+            elif ch in '}]':
+                self._finish_scalar(frame, i)
+                self._stack.pop()
+                if not self._stack:
+                    self._finish_root(i)
+                else:
+                    parent = self._stack[-1]
+                    if parent['type'] == '[' and parent['emits']:
+                        self._emit(parent, i + 1)
+            elif ch == ',':
+                self._finish_scalar(frame, i)
+                if frame['type'] == '{':
+                    frame['expect_key'] = True
+            elif ch == ':' and frame['type'] == '{':
+                frame['expect_key'] = False
+                try:
+                    frame['key'] = json.loads(frame['last_string'])
+                except (TypeError, ValueError):
+                    frame['key'] = None
+            elif not ch.isspace():
+                self._begin_item(frame, i)
+
+    def _push(self, ch, i, name):
+        """Open a container; name is its key or index in the parent (None for the root)"""
+        # An array's elements are reported if every container above it is an object
+        emits = ch == '[' and all(f['type'] == '{' for f in self._stack)
+        path = self._stack[-1]['path'] + (name,) if self._stack else ()
+        self._stack.append({
+            'type': ch, 'path': path, 'emits': emits, 'key': None, 'index': 0,
+            'item_start': None, 'expect_key': True, 'last_string': None
+        })
+
+    def _begin_item(self, frame, i):
+        if frame['type'] == '[' and frame['item_start'] is None:
+            frame['item_start'] = i
+
+    def _finish_scalar(self, frame, i):
+        """A ',' or closing bracket ends a scalar element of an emitting array"""
+        if frame['type'] == '[' and frame['item_start'] is not None:
+            if frame['emits']:
+                self._emit(frame, i)
+            else:
+                frame['item_start'] = None
+                frame['index'] += 1
+
+    def _emit(self, frame, end):
+        text = self._buf[frame['item_start']:end].strip()
+        frame['item_start'] = None
+        frame['index'] += 1
+        try:
+            self._events.append((frame['path'], json.loads(text)))
+        except ValueError:
+            pass
+
+    def _finish_root(self, i):
+        try:
+            value = json.loads(self._buf[self._root:i + 1])
+        except ValueError:
+            # Balanced but not JSON (e.g. "[see below]"); look for the next candidate
+            self._reject_root()
+            return
+        if not self.strict_start and isinstance(value, list) and \
+                not any(isinstance(item, (dict, list)) for item in value):
+            # Anywhere in prose, an array of plain values is a citation marker such as "[1]"
+            self._reject_root()
+            return
+        self.value = value
+        self.done = True
+
+    def _reject_root(self):
+        self._pos = self._root + 1
+        self._root = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._events = []
+
+
+@traced('json.extract')
+def extract_json(text, expect=None):
+    """
+    First complete JSON object or array in an LLM response. Raises ValueError when
+    there is none. Values at the start of a line or after a fence, ':' or '=' are
+    preferred; any bracket is tried if none of those parse, skipping arrays that hold
+    no objects or arrays.
+    """
+    for strict_start in (True, False):
+        parser = JSONStreamParser(expect, strict_start=strict_start)
+        parser.feed(text)
+        if parser.done:
+            return parser.value
+    raise ValueError("No JSON value found in AI response")
+
+def iter_json_elements(chunks, expect=None):
+    """
+    Consume a stream of text chunks and yield ('element', (path, value)) for each array
+    element as it closes, then ('done', root_value). Raises ValueError if the stream
+    ends without a complete JSON value.
+    """
+    parser = JSONStreamParser(expect)
+    text = []
+    for chunk in chunks:
+        text.append(chunk)
+        for event in parser.feed(chunk):
+            yield 'element', event
+        if parser.done:
+            break
+    if not parser.done:
+        # Fall back to the relaxed whole-text search used for complete responses
+        yield 'done', extract_json(''.join(text), expect)
+        return
+    yield 'done', parser.value
@@ -0,0 +1,178 @@
+import json
+import hashlib
+import os
+import random
+import threading
+import time
+
+from backend.utils.database import DB_PATH, get_connection
+
+# Stored next to learning_assistant.db so it shares the same volume
+CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), 'llm_cache.db'))
+CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 5000))
+# Expired rows are deleted, and the size cap enforced, at most this often
+PURGE_INTERVAL = int(os.getenv('LLM_CACHE_PURGE_INTERVAL', 300))
+
+# Time-to-live per endpoint in seconds. Endpoints not listed here are never cached.
+# Override any of them with LLM_CACHE_TTL_<ENDPOINT>, e.g. LLM_CACHE_TTL_JOB_MARKET=3600
+DEFAULT_TTLS = {
+    'roadmap': 7 * 24 * 3600,
+    'resources': 24 * 3600,
+    'assessment': 24 * 3600,
+    'job_market': 6 * 3600,
+    'quiz': 24 * 3600,
+    'mock_test': 24 * 3600,
+}
+
+def get_ttl(endpoint):
+    """TTL in seconds for an endpoint, 0 means do not cache"""
+    if not endpoint:
+        return 0
+    override = os.getenv(f'LLM_CACHE_TTL_{endpoint.upper()}')
+    if override is not None:
+        return int(override)
+    return DEFAULT_TTLS.get(endpoint, 0)
+
+def make_key(messages, model, temperature):
+    """Hash the normalized request so whitespace-only prompt differences share an entry"""
+    normalized = [
+        {'role': m.get('role'), 'content': ' '.join(str(m.get('content', '')).split())}
+        for m in messages
+    ]
+    payload = json.dumps({'messages': normalized, 'model': model, 'temperature': temperature}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with per-endpoint TTLs and LRU eviction"""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, purge_interval=PURGE_INTERVAL):
+        self.path = path
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._last_purge = 0.0
+        self._init_db()
+
+    def _connect(self):
+        return get_connection(self.path)
+
+    def _init_db(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS llm_cache
+                     (key TEXT NOT NULL,
+                      variant INTEGER NOT NULL,
+                      endpoint TEXT,
+                      response TEXT NOT NULL,
+                      created_at REAL NOT NULL,
+                      expires_at REAL NOT NULL,
+                      last_used REAL NOT NULL,
+                      PRIMARY KEY (key, variant))''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache (expires_at)')
+        conn.commit()
+
+    def _count(self, endpoint, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, {'hits': 0, 'misses': 0, 'stores': 0})
+            counters[outcome] += 1
+
+    def get(self, key, endpoint=None, variants=1):
+        """
+        Return a cached response or None.
+        With variants > 1 the entry only counts as a hit once that many distinct
+        responses are stored; a random one of them is returned.
+        """
+        now = time.time()
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''SELECT variant, response FROM llm_cache
+                     WHERE key = ? AND expires_at > ?''', (key, now))
+        rows = c.fetchall()
+
+        if len(rows) < max(variants, 1):
+            self._count(endpoint, 'misses')
+            return None
+
+        variant, response = random.choice(rows)
+        c.execute('UPDATE llm_cache SET last_used = ? WHERE key = ? AND variant = ?', (now, key, variant))
+        conn.commit()
+        self._count(endpoint, 'hits')
+        return json.loads(response)
+
+    def set(self, key, response, ttl, endpoint=None, variants=1):
+        """Store a response, replacing expired variants of the same key"""
+        now = time.time()
+        conn = self._connect()
+        c = conn.cursor()
+
+        # Drop this key's expired variants first so their slots can be reused
+        c.execute('DELETE FROM llm_cache WHERE key = ? AND expires_at <= ?', (key, now))
+        c.execute('SELECT variant FROM llm_cache WHERE key = ?', (key,))
+        used = {row[0] for row in c.fetchall()}
+        free = [v for v in range(max(variants, 1)) if v not in used]
+        variant = free[0] if free else random.randrange(max(variants, 1))
+
+        c.execute('''INSERT OR REPLACE INTO llm_cache
+                     (key, variant, endpoint, response, created_at, expires_at, last_used)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (key, variant, endpoint, json.dumps(response), now, now + ttl, now))
+        conn.commit()
+        self._count(endpoint, 'stores')
+
+        with self._lock:
+            due = now - self._last_purge >= self.purge_interval
+            if due:
+                self._last_purge = now
+        if due:
+            self.purge(now)
+
+    def purge(self, now=None):
+        """Delete expired entries, then evict least recently used rows beyond max_entries"""
+        now = now or time.time()
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,))
+        c.execute('SELECT COUNT(*) FROM llm_cache')
+        overflow = c.fetchone()[0] - self.max_entries
+        if overflow > 0:
+            c.execute('''DELETE FROM llm_cache WHERE rowid IN
+                         (SELECT rowid FROM llm_cache ORDER BY last_used LIMIT ?)''', (overflow,))
+        conn.commit()
+
+    def stats(self):
+        """Hit/miss counters per endpoint plus the current number of stored entries"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('SELECT COUNT(*) FROM llm_cache')
+        entries = c.fetchone()[0]
+
+        with self._lock:
+            endpoints = {name: dict(counters) for name, counters in self._counters.items() if name}
+        hits = sum(e['hits'] for e in endpoints.values())
+        misses = sum(e['misses'] for e in endpoints.values())
+        return {
+            'enabled': CACHE_ENABLED,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0,
+            'endpoints': endpoints
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Process-wide LLMCache instance"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
@@ -0,0 +1,317 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# With several worker processes, each one writes its samples here and /metrics
+# adds them up; unset, /metrics reports the process that serves the scrape
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_SYNC_INTERVAL = float(os.getenv('METRICS_SYNC_INTERVAL', 10))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def merge(self, samples, into):
+        for labels, value in samples:
+            key = tuple(labels)
+            into[key] = into.get(key, 0) + value
+
+    def lines(self, values):
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """
+    Current value per label set; across worker processes the highest value is reported.
+    Values saved by a process that has exited are not current, so they are left out.
+    """
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = value
+
+    def merge(self, samples, into):
+        for labels, value in samples:
+            key = tuple(labels)
+            into[key] = max(into.get(key, value), value)
+
+    def lines(self, values):
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set, stored as [bucket counts..., +Inf count, sum]"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    def merge(self, samples, into):
+        for labels, counts in samples:
+            key = tuple(labels)
+            current = into.get(key)
+            into[key] = counts if current is None else [a + b for a, b in zip(current, counts)]
+
+    def lines(self, values):
+        for labels, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labels + ('le',), labels + (_format_value(bound),))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            label_text = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+REGISTRY = []
+
+HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests by route and status', ('method', 'route', 'status'))
+HTTP_LATENCY = Histogram('http_request_duration_seconds', 'Time until the response headers are ready',
+                         ('method', 'route'))
+HTTP_RESPONSE_BYTES = Counter('http_response_bytes_total', 'Bytes in responses with a known length',
+                              ('method', 'route'))
+
+LLM_REQUESTS = Counter('llm_requests_total', 'Upstream chat completions by call site and result',
+                       ('endpoint', 'status'))
+LLM_LATENCY = Histogram('llm_request_duration_seconds', 'Upstream chat completion time, retries included',
+                        ('endpoint',))
+LLM_FIRST_CHUNK = Histogram('llm_stream_first_chunk_seconds', 'Time to the first streamed content delta',
+                            ('endpoint',))
+LLM_RETRIES = Counter('llm_retries_total', 'Retries made by the HTTP retry policy', ('endpoint', 'reason'))
+LLM_DEADLINE_EXCEEDED = Counter('llm_deadline_exceeded_total', 'Calls that ran out of time budget', ('endpoint',))
+LLM_BREAKER_STATE = Gauge('llm_circuit_breaker_state', 'Circuit breaker state: 0 closed, 1 half open, 2 open',
+                          ('client',))
+LLM_BREAKER_TRANSITIONS = Counter('llm_circuit_breaker_transitions_total', 'Circuit breaker state changes',
+                                  ('client', 'state'))
+LLM_BREAKER_REJECTED = Counter('llm_circuit_breaker_rejected_total', 'Calls failed fast by an open breaker',
+                               ('endpoint',))
+LLM_HEDGES = Counter('llm_hedged_requests_total', 'Hedged attempts sent, by which attempt answered first',
+                     ('endpoint', 'winner'))
+LLM_COALESCED = Counter('llm_coalesced_total', 'Calls that shared an identical in-flight request',
+                        ('endpoint', 'scope'))
+LLM_CACHE_HITS = Counter('llm_cache_hits_total', 'Chat completions answered from the response cache', ('endpoint',))
+LLM_PROMPT_CHARS = Histogram('llm_prompt_chars', 'Characters in the prompt messages', ('endpoint',),
+                             buckets=SIZE_BUCKETS)
+LLM_COMPLETION_CHARS = Histogram('llm_completion_chars', 'Characters in the returned content', ('endpoint',),
+                                 buckets=SIZE_BUCKETS)
+LLM_TOKENS = Counter('llm_tokens_total', 'Token usage reported by the API', ('endpoint', 'kind'))
+
+RESUME_EXTRACT = Histogram('resume_extract_seconds', 'Resume text extraction time by outcome', ('outcome',))
+
+
+class LLMCall:
+    """
+    Records one upstream chat completion: latency, outcome, sizes and token usage.
+    Use as a context manager around the request, setting status and calling
+    add_result() / add_delta() as data arrives; streaming callers use start() and finish().
+    """
+
+    def __init__(self, endpoint, messages):
+        self.endpoint = endpoint or 'other'
+        self.status = 'error'
+        self.prompt_chars = sum(len(m.get('content') or '') for m in messages)
+        self.completion_chars = 0
+        self.usage = None
+        self._started = None
+        self._first_chunk = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        return self
+
+    def add_result(self, result):
+        choices = result.get('choices') or [{}]
+        content = (choices[0].get('message') or {}).get('content') or ''
+        self.completion_chars += len(content)
+        self.usage = result.get('usage') or self.usage
+
+    def add_delta(self, delta):
+        if self._first_chunk is None:
+            self._first_chunk = time.perf_counter()
+        self.completion_chars += len(delta)
+
+    def finish(self):
+        if self._started is None:
+            return
+        LLM_LATENCY.observe(time.perf_counter() - self._started, self.endpoint)
+        if self._first_chunk is not None:
+            LLM_FIRST_CHUNK.observe(self._first_chunk - self._started, self.endpoint)
+        LLM_REQUESTS.inc(self.endpoint, str(self.status))
+        LLM_PROMPT_CHARS.observe(self.prompt_chars, self.endpoint)
+        if self.completion_chars:
+            LLM_COMPLETION_CHARS.observe(self.completion_chars, self.endpoint)
+        if self.usage:
+            for kind in ('prompt_tokens', 'completion_tokens'):
+                if isinstance(self.usage.get(kind), int):
+                    LLM_TOKENS.inc(self.endpoint, kind[:-len('_tokens')], amount=self.usage[kind])
+        self._started = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.status == 'error':
+            self.status = 'timeout' if 'Timeout' in exc_type.__name__ else 'error'
+        self.finish()
+
+
+def _local_values():
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+def _snapshot_path(pid=None):
+    return os.path.join(METRICS_DIR, f"metrics-{pid or os.getpid()}.json")
+
+def write_snapshot():
+    """Save this process's samples to METRICS_DIR for other workers' /metrics"""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path()
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(_local_values(), f)
+    os.replace(tmp, path)
+
+def clear_snapshots():
+    """Remove samples left by a previous run; called by the gunicorn master on start"""
+    if METRICS_DIR:
+        for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+            os.unlink(path)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _snapshots():
+    """
+    (samples, alive) for this process plus, with METRICS_DIR, those saved by other
+    processes; alive is False for snapshots left by a worker that has exited
+    """
+    yield _local_values(), True
+    if not METRICS_DIR:
+        return
+    own = _snapshot_path()
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        if path == own:
+            continue
+        try:
+            with open(path) as f:
+                values = json.load(f)
+        except (OSError, ValueError):
+            continue
+        pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+        yield values, pid.isdigit() and _pid_alive(int(pid))
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    merged = {metric.name: {} for metric in REGISTRY}
+    for values, alive in _snapshots():
+        for metric in REGISTRY:
+            # Counters and histograms of exited workers still count; their gauges are stale
+            if metric.kind == 'gauge' and not alive:
+                continue
+            metric.merge(values.get(metric.name, []), merged[metric.name])
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.lines(merged[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+_sync_thread = None
+
+def _sync_loop():
+    while True:
+        time.sleep(METRICS_SYNC_INTERVAL)
+        try:
+            write_snapshot()
+        except OSError as e:
+            print(f"Could not write metrics snapshot: {e}")
+
+def start_sync():
+    """Periodically write this process's samples when METRICS_DIR is set"""
+    global _sync_thread
+    if not METRICS_DIR or _sync_thread is not None:
+        return
+    _sync_thread = threading.Thread(target=_sync_loop, name='metrics-sync', daemon=True)
+    _sync_thread.start()
+    atexit.register(write_snapshot)
@@ -1,13 +1,38 @@
-from backend.api.perplexity import PerplexityClient
+from backend.api.perplexity import get_client
+from backend.api import resilience
+from backend.utils.json_stream import extract_json, iter_json_elements
+from backend.utils.tracing import traced
+from concurrent.futures import ThreadPoolExecutor, wait
+import contextvars
 import json
+import os
 import re
+import time
+
+# Mock tests are generated at a high temperature for variety, so the cache keeps a pool of variants
+MOCK_TEST_CACHE_VARIANTS = int(os.getenv('MOCK_TEST_CACHE_VARIANTS', 5))
+
+# "per_answer" grades each subjective answer with its own concurrent request, "batch" uses one prompt for all
+GRADING_MODE = os.getenv('MOCK_TEST_GRADING_MODE', 'per_answer')
+# Most answers one evaluation grades at the same time
+GRADING_WORKERS = int(os.getenv('MOCK_TEST_GRADING_WORKERS', 8))
+# Answers shorter than this many characters or words ("ok", "idk") are scored 0 without asking the LLM
+MIN_ANSWER_CHARS = int(os.getenv('MOCK_TEST_MIN_ANSWER_CHARS', 15))
+MIN_ANSWER_WORDS = int(os.getenv('MOCK_TEST_MIN_ANSWER_WORDS', 3))
+
+def _parse_score(value):
+    """Score 0-10 from the grader's reply, which may be 7, 7.5, "7" or "7/10"."""
+    match = re.search(r'\d+(?:\.\d+)?', str(value))
+    if not match:
+        raise ValueError(f"No score in {value!r}")
+    return max(0, min(10, round(float(match.group()))))
 
 class MockTestGenerator:
     def __init__(self):
-        self.client = PerplexityClient()
+        self.client = get_client()
 
-    def generate_mock_test(self, topic):
-        """Generate a comprehensive mock test with MCQs and Subjective questions"""
+    @staticmethod
+    def _mock_test_messages(topic):
         prompt = f"""Generate a comprehensive mock test for the topic: {topic}.
         
         The test must include:
@@ -33,20 +58,38 @@ class MockTestGenerator:
           ]
         }}
         Return ONLY the JSON object."""
+        return [{"role": "user", "content": prompt}]
 
-        messages = [{"role": "user", "content": prompt}]
-        response = self.client.chat_completion(messages, temperature=0.7)
+    @traced('mock_test.generate')
+    def generate_mock_test(self, topic):
+        """Generate a comprehensive mock test with MCQs and Subjective questions"""
+        messages = self._mock_test_messages(topic)
+        response = self.client.chat_completion(messages, temperature=0.7, endpoint='mock_test', variants=MOCK_TEST_CACHE_VARIANTS)
         ai_response = response['choices'][0]['message']['content']
         
-        # Extract JSON
-        if "```json" in ai_response:
-            ai_response = ai_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_response:
-            ai_response = ai_response.split("```")[1].split("```")[0].strip()
-            
-        return json.loads(ai_response)
+        return extract_json(ai_response, expect='object')
 
-    def evaluate_test(self, topic, mcq_answers, subjective_answers, questions):
+    def stream_mock_test(self, topic):
+        """
+        Generate a mock test as it streams in: yields ('mcq', question) and
+        ('subjective', question) as each one closes, then ('done', test). Uses the same
+        cached variants as generate_mock_test, so a hit arrives all at once.
+        """
+        messages = self._mock_test_messages(topic)
+        chunks = self.client.chat_completion_stream(messages, temperature=0.7, endpoint='mock_test',
+                                                    cache=True, variants=MOCK_TEST_CACHE_VARIANTS)
+        kinds = {('mcqs',): 'mcq', ('subjective',): 'subjective'}
+        for kind, value in iter_json_elements(chunks, expect='object'):
+            if kind == 'done':
+                yield 'done', value
+            elif value[0] in kinds and isinstance(value[1], dict):
+                yield kinds[value[0]], value[1]
+        # Read whatever follows the JSON so the whole response reaches the cache
+        for _ in chunks:
+            pass
+
+    @traced('mock_test.evaluate')
+    def evaluate_test(self, topic, mcq_answers, subjective_answers, questions, grading_mode=None):
         """Evaluate both MCQ and Subjective answers using AI"""
         
         # Prepare evaluation data
@@ -70,10 +113,28 @@ class MockTestGenerator:
                 "correct_answer": q['correct'],
                 "is_correct": is_correct
             })
-            
+        
+        if (grading_mode or GRADING_MODE) == 'batch':
+            subjective_eval = self._grade_batch(topic, questions['subjective'], subjective_answers)
+        else:
+            subjective_eval = self._grade_per_answer(topic, questions['subjective'], subjective_answers)
+        
+        # Calculate final results
+        result = {
+            "mcq_score": mcq_score,
+            "total_mcqs": total_mcqs,
+            "mcq_details": eval_data['mcqs'],
+            "subjective_details": subjective_eval['subjective_evaluation'],
+            "overall_feedback": subjective_eval['overall_feedback']
+        }
+        return result
+
+    @traced('mock_test.grade_batch')
+    def _grade_batch(self, topic, subjective_questions, subjective_answers):
+        """Grade all subjective answers with a single prompt"""
         # Prepare subjective answers for AI
         subjective_for_ai = []
-        for i, q in enumerate(questions['subjective']):
+        for i, q in enumerate(subjective_questions):
             user_ans = subjective_answers.get(str(q['id']))
             subjective_for_ai.append({
                 "question": q['question'],
@@ -105,23 +166,102 @@ class MockTestGenerator:
         Return ONLY the JSON object."""
 
         messages = [{"role": "user", "content": prompt}]
-        response = self.client.chat_completion(messages, temperature=0.3)
+        response = self.client.chat_completion(messages, temperature=0.3, endpoint='mock_test_grading')
         ai_eval_response = response['choices'][0]['message']['content']
         
-        # Extract JSON
-        if "```json" in ai_eval_response:
-            ai_eval_response = ai_eval_response.split("```json")[1].split("```")[0].strip()
-        elif "```" in ai_eval_response:
-            ai_eval_response = ai_eval_response.split("```")[1].split("```")[0].strip()
-            
-        subjective_eval = json.loads(ai_eval_response)
+        return extract_json(ai_eval_response, expect='object')
+
+    @traced('mock_test.grade_answer')
+    def _grade_answer(self, topic, question, user_answer):
+        """Grade one subjective answer with its own small request"""
+        prompt = f"""Evaluate this answer from a mock test on "{topic}".
         
-        # Calculate final results
-        result = {
-            "mcq_score": mcq_score,
-            "total_mcqs": total_mcqs,
-            "mcq_details": eval_data['mcqs'],
-            "subjective_details": subjective_eval['subjective_evaluation'],
-            "overall_feedback": subjective_eval['overall_feedback']
+        Question: {question['question']}
+        Guidelines: {question.get('guidelines', '')}
+        Answer: {user_answer}
+        
+        Return your response EXACTLY as a JSON object:
+        {{
+          "score": 8, (a number between 0-10)
+          "feedback": "Constructive feedback.",
+          "key_point": "The key point a model answer would make."
+        }}
+        Return ONLY the JSON object."""
+
+        messages = [{"role": "user", "content": prompt}]
+        response = self.client.chat_completion(messages, temperature=0.3, endpoint='mock_test_grading')
+        evaluation = extract_json(response['choices'][0]['message']['content'], expect='object')
+        
+        return {
+            "id": question['id'],
+            "score": _parse_score(evaluation.get('score')),
+            "feedback": evaluation.get('feedback', ''),
+            "key_point": evaluation.get('key_point', '')
+        }
+
+    def _grade_per_answer(self, topic, subjective_questions, subjective_answers):
+        """
+        Grade each subjective answer concurrently, on threads owned by this evaluation.
+        Trivially short answers get 0 locally. An answer whose grading fails or outlives
+        the mock_test_grading budget is marked ungraded (score None) and left out of the
+        totals. Returns the same shape as _grade_batch.
+        """
+        evaluations = {}
+        to_grade = []
+        for q in subjective_questions:
+            user_ans = (subjective_answers.get(str(q['id'])) or '').strip()
+            if len(user_ans) < MIN_ANSWER_CHARS or len(user_ans.split()) < MIN_ANSWER_WORDS:
+                evaluations[q['id']] = {
+                    "id": q['id'],
+                    "score": 0,
+                    "feedback": "No answer was given, or the answer was too short to evaluate.",
+                    "key_point": q.get('guidelines', '')
+                }
+            else:
+                to_grade.append((q, user_ans))
+
+        if to_grade:
+            deadline = resilience.deadline_for(resilience.get_budget('mock_test_grading'))
+            pool = ThreadPoolExecutor(max_workers=min(len(to_grade), GRADING_WORKERS),
+                                      thread_name_prefix='mock-test-grading')
+            # Run in a copy of this context so the grading spans join the request's trace
+            # and the calls share the request's time budget
+            futures = {pool.submit(contextvars.copy_context().run, self._grade_answer, topic, q, user_ans): q
+                       for q, user_ans in to_grade}
+            wait(futures, timeout=max(0, deadline - time.monotonic()))
+            pool.shutdown(wait=False, cancel_futures=True)
+            for future, q in futures.items():
+                try:
+                    if not future.done():
+                        raise TimeoutError("grading ran out of time")
+                    evaluations[q['id']] = future.result()
+                except Exception as e:
+                    print(f"Could not grade answer {q['id']}: {e}")
+                    evaluations[q['id']] = {
+                        "id": q['id'],
+                        "score": None,
+                        "ungraded": True,
+                        "feedback": "This answer could not be graded right now. Submit the test again to grade it.",
+                        "key_point": q.get('guidelines', '')
+                    }
+
+        evaluations = [evaluations[q['id']] for q in subjective_questions]
+        graded = [e for e in evaluations if e['score'] is not None]
+        ungraded = len(evaluations) - len(graded)
+        if not evaluations:
+            overall = "There were no subjective questions to evaluate."
+        elif not graded:
+            overall = "Your subjective answers could not be graded right now. Submit the test again to grade them."
+        else:
+            total = sum(e['score'] for e in graded)
+            weakest = min(graded, key=lambda e: e['score'])
+            overall = f"You scored {total}/{len(graded) * 10} on the graded subjective questions."
+            if ungraded:
+                overall += f" {ungraded} could not be graded right now; submit the test again to grade them."
+            if weakest['score'] < 7:
+                overall += f" Focus next on question {weakest['id']}: {weakest['feedback']}"
+        
+        return {
+            "subjective_evaluation": evaluations,
+            "overall_feedback": overall
         }
-        return result
@@ -1,13 +1,36 @@
-from backend.api.perplexity import PerplexityClient
+from backend.api.perplexity import get_client
+from backend.utils.tracing import traced
 import json
+import os
 import re
 
+# Quizzes are generated at a high temperature for variety, so the cache keeps a pool of variants
+QUIZ_CACHE_VARIANTS = int(os.getenv('QUIZ_CACHE_VARIANTS', 5))
+
+QUIZ_QUESTIONS = 5
+QUIZ_OPTIONS = ('A', 'B', 'C', 'D')
+
+
+def is_complete_quiz(questions):
+    """True for QUIZ_QUESTIONS questions that each have text, all four options and a correct letter"""
+    if not isinstance(questions, list) or len(questions) != QUIZ_QUESTIONS:
+        return False
+    for question in questions:
+        options = question.get('options') or {}
+        if not question.get('question') or sorted(options) != list(QUIZ_OPTIONS):
+            return False
+        if question.get('correct') not in QUIZ_OPTIONS:
+            return False
+    return True
+
+
 class QuizGenerator:
     def __init__(self):
-        self.client = PerplexityClient()
+        self.client = get_client()
     
-    def generate_quiz(self, topic, step_title, step_details):
-        """Generate a quiz for a specific learning step"""
+    @traced('quiz.generate')
+    def generate_quiz(self, topic, step_title, step_details, cache=True):
+        """Generate a quiz for a specific learning step; cache=False always asks for a new one"""
         prompt = f"""Create a quiz to test understanding of this learning step:
 
 Topic: {topic}
@@ -33,11 +56,13 @@ Q2: [Question text]
 Make questions practical and test real understanding, not just memorization."""
 
         messages = [{"role": "user", "content": prompt}]
-        response = self.client.chat_completion(messages, temperature=0.7)
+        response = self.client.chat_completion(messages, temperature=0.7, endpoint='quiz',
+                                             cache=cache, variants=QUIZ_CACHE_VARIANTS)
         quiz_text = response['choices'][0]['message']['content']
         
         return self._parse_quiz(quiz_text)
     
+    @traced('quiz.parse')
     def _parse_quiz(self, quiz_text):
         """Parse the quiz text into structured format"""
         questions = []
@@ -72,7 +97,7 @@ Make questions practical and test real understanding, not just memorization."""
             # Match correct answer pattern
             corr_match = re.match(r'Correct:\s*([A-D])', line, re.IGNORECASE)
             if corr_match and current_question:
-                current_question['correct'] = corr_match.group(1)
+                current_question['correct'] = corr_match.group(1).upper()
                 continue
         
         # Add last question
@@ -83,4 +108,7 @@ Make questions practical and test real understanding, not just memorization."""
     
     def check_answer(self, question, user_answer):
         """Check if the user's answer is correct"""
-        return user_answer.upper() == question['correct'].upper()
+        correct = question.get('correct')
+        if not correct or not isinstance(user_answer, str):
+            return False
+        return user_answer.upper() == correct.upper()
@@ -0,0 +1,251 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from backend.utils import metrics
+
+# Characters of resume text sent to the LLM; extraction stops once it has this many
+MAX_CHARS = 4000
+MAX_UPLOAD_BYTES = int(float(os.getenv('RESUME_MAX_UPLOAD_MB', 5)) * 1024 * 1024)
+# Uploads larger than this are copied to a temporary file instead of being held in memory
+SPOOL_THRESHOLD = 512 * 1024
+# Parsing runs in separate processes so a slow or hostile file cannot stall a web worker.
+# 0 parses in the calling thread (still with the early stop, but without the limits).
+# The processes are spawned, so they are plain Python even when the web worker runs
+# gevent: the SIGALRM time limit is set in their main thread, and the web worker only
+# waits on the pool's pipes and futures, which gevent's patches make cooperative.
+EXTRACT_WORKERS = int(os.getenv('RESUME_EXTRACT_WORKERS', 2))
+EXTRACT_TIMEOUT = float(os.getenv('RESUME_EXTRACT_TIMEOUT', 10))
+EXTRACT_MEMORY_MB = int(os.getenv('RESUME_EXTRACT_MEMORY_MB', 512))
+TASKS_PER_CHILD = 100
+
+SUPPORTED_TYPES = ('.pdf', '.docx')
+
+
+class ExtractionError(Exception):
+    """The upload could not be turned into resume text; the message is safe to show"""
+
+
+class UploadTooLarge(ExtractionError):
+    pass
+
+
+def _init_worker(memory_mb):
+    """Cap the address space of each parsing process"""
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def _on_alarm(signum, frame):
+    raise TimeoutError("Resume parsing took too long")
+
+def _read_pdf(source, max_chars):
+    from pypdf import PdfReader
+    reader = PdfReader(source)
+    parts, length = [], 0
+    for page in reader.pages:
+        page_text = page.extract_text() or ''
+        parts.append(page_text)
+        length += len(page_text)
+        if length >= max_chars:
+            break
+    return '\n'.join(parts)
+
+def _read_docx(source, max_chars):
+    import docx
+    doc = docx.Document(source)
+    parts, length = [], 0
+    for para in doc.paragraphs:
+        parts.append(para.text)
+        length += len(para.text) + 1
+        if length >= max_chars:
+            break
+    return '\n'.join(parts)
+
+def extract_text(kind, source, max_chars=MAX_CHARS, time_limit=None):
+    """
+    Text of a .pdf or .docx file given as bytes or a path, stopping after max_chars.
+    With time_limit (seconds) a SIGALRM aborts parsing; only usable in a process's main thread.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    if time_limit:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        text = _read_pdf(source, max_chars) if kind == '.pdf' else _read_docx(source, max_chars)
+    finally:
+        if time_limit:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return text[:max_chars]
+
+
+def text_hash(text):
+    """SHA-256 of extracted text with whitespace and case normalized"""
+    normalized = ' '.join(text.split()).lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class SpooledUpload:
+    """An upload copied off the request: bytes in memory or a temporary file, plus its SHA-256"""
+
+    def __init__(self, kind, source, on_disk, sha256, size):
+        self.kind = kind
+        self.source = source
+        self.on_disk = on_disk
+        self.sha256 = sha256
+        self.size = size
+
+    def close(self):
+        if self.on_disk and self.source:
+            os.unlink(self.source)
+        self.source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResumeExtractor:
+    """Runs extract_text in a process pool and records timing per file"""
+
+    def __init__(self, workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT, memory_mb=EXTRACT_MEMORY_MB,
+                 max_upload_bytes=MAX_UPLOAD_BYTES):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_upload_bytes = max_upload_bytes
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {'files': 0, 'errors': 0, 'timeouts': 0, 'too_large': 0, 'spooled': 0,
+                       'last_ms': 0.0, 'max_ms': 0.0, 'total_ms': 0.0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: a forked copy of a gevent worker is not safe to run
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.memory_mb,),
+                    max_tasks_per_child=TASKS_PER_CHILD
+                )
+            return self._pool
+
+    def _reset_pool(self):
+        """Throw away a pool whose worker is stuck or died, killing its processes"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        for process in list(getattr(pool, '_processes', {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def receive(self, filename, stream):
+        """
+        Check the file type and copy the upload in chunks, hashing it and enforcing
+        max_upload_bytes. Small files stay in memory; larger ones go to a temporary file.
+        """
+        kind = os.path.splitext(filename or '')[1].lower()
+        if kind not in SUPPORTED_TYPES:
+            raise ExtractionError('Unsupported file format')
+
+        digest = hashlib.sha256()
+        buffer = io.BytesIO()
+        spool = None
+        size = 0
+        while True:
+            chunk = stream.read(64 * 1024)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_upload_bytes:
+                if spool:
+                    spool.close()
+                    os.unlink(spool.name)
+                self._count('too_large')
+                raise UploadTooLarge(f"Resume must be smaller than {self.max_upload_bytes / (1024 * 1024):g} MB")
+            digest.update(chunk)
+            if spool is None and size > SPOOL_THRESHOLD:
+                spool = tempfile.NamedTemporaryFile(prefix='resume-', delete=False)
+                spool.write(buffer.getvalue())
+                buffer = None
+                self._count('spooled')
+            if spool:
+                spool.write(chunk)
+            else:
+                buffer.write(chunk)
+        if spool:
+            spool.close()
+            return SpooledUpload(kind, spool.name, True, digest.hexdigest(), size)
+        return SpooledUpload(kind, buffer.getvalue(), False, digest.hexdigest(), size)
+
+    def extract(self, upload, max_chars=MAX_CHARS):
+        """Extract up to max_chars of text from a SpooledUpload"""
+        started = time.perf_counter()
+        future = None
+        outcome = 'error'
+        try:
+            if self.workers <= 0:
+                text = extract_text(upload.kind, upload.source, max_chars)
+            else:
+                future = self._get_pool().submit(extract_text, upload.kind, upload.source, max_chars, self.timeout)
+                # The worker enforces the limit itself; the extra second covers process start-up
+                text = future.result(timeout=self.timeout + 1)
+            outcome = 'ok'
+            return text
+        except (TimeoutError, FutureTimeout):
+            outcome = 'timeout'
+            self._count('timeouts')
+            # A worker that stopped itself is still usable; one that did not respond is killed
+            if future is not None and not future.done():
+                self._reset_pool()
+            raise ExtractionError('Resume took too long to process')
+        except (MemoryError, BrokenProcessPool):
+            self._count('errors')
+            self._reset_pool()
+            raise ExtractionError('Resume is too large or complex to process')
+        except ExtractionError:
+            raise
+        except Exception as e:
+            self._count('errors')
+            raise ExtractionError(f'Could not read resume: {e}')
+        finally:
+            self._record(time.perf_counter() - started, outcome)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _record(self, seconds, outcome):
+        metrics.RESUME_EXTRACT.observe(seconds, outcome)
+        elapsed_ms = seconds * 1000
+        with self._lock:
+            self._stats['files'] += 1
+            self._stats['last_ms'] = elapsed_ms
+            self._stats['max_ms'] = max(self._stats['max_ms'], elapsed_ms)
+            self._stats['total_ms'] += elapsed_ms
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total_ms = stats.pop('total_ms')
+        stats['avg_ms'] = round(total_ms / stats['files'], 3) if stats['files'] else 0
+        stats['last_ms'] = round(stats['last_ms'], 3)
+        stats['max_ms'] = round(stats['max_ms'], 3)
+        stats['workers'] = self.workers
+        return stats
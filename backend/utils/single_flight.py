@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from backend.api import resilience
+from backend.utils.database import get_connection
+from backend.utils.llm_cache import CACHE_PATH
+from backend.utils import metrics, tracing
+
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+# Also coalesce with identical calls running in other worker processes, through the cache database
+SINGLE_FLIGHT_SHARED = os.getenv('SINGLE_FLIGHT_SHARED', 'true').lower() == 'true'
+# A call still unfinished after this many seconds is assumed dead and another process takes over
+SINGLE_FLIGHT_LEASE = float(os.getenv('SINGLE_FLIGHT_LEASE', 120))
+# Finished rows are kept this long, only so late pollers can read the result
+RESULT_RETENTION = 60
+POLL_MIN = 0.05
+POLL_MAX = 0.5
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one upstream call per key at a time. Callers arriving while a call
+    with the same key is running wait for it and get the same result (or exception).
+    Within a process this is a dict of running calls; across processes the leader
+    claims a row in llm_inflight and followers poll it until the result is stored.
+    A follower in another process whose leader fails makes the call itself. No
+    follower waits past its own deadline: it gets DeadlineExceeded instead.
+    """
+
+    def __init__(self, path=CACHE_PATH, shared=SINGLE_FLIGHT_SHARED, lease=SINGLE_FLIGHT_LEASE):
+        self.path = path
+        self.shared = shared
+        self.lease = lease
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'coalesced_local': 0, 'coalesced_shared': 0, 'takeovers': 0,
+                       'deadline_exceeded': 0}
+        if shared:
+            self._init_db()
+
+    def _connect(self):
+        return get_connection(self.path)
+
+    def _init_db(self):
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS llm_inflight
+                     (key TEXT PRIMARY KEY,
+                      owner TEXT NOT NULL,
+                      started_at REAL NOT NULL,
+                      finished_at REAL,
+                      result TEXT,
+                      error TEXT)''')
+        conn.commit()
+
+    def do(self, key, fn, endpoint=None, deadline=None):
+        """
+        Return fn(), sharing one execution between concurrent callers with the same key.
+        deadline (a time.monotonic() value, by default the endpoint's time budget from
+        now) bounds how long this caller waits for someone else's call.
+        """
+        if deadline is None:
+            deadline = resilience.deadline_for(resilience.get_budget(endpoint))
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(max(0, deadline - time.monotonic())):
+                self._deadline_exceeded(endpoint)
+            self._coalesced('coalesced_local', endpoint)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_shared(key, fn, endpoint, deadline) if self.shared else self._lead(fn)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _lead(self, fn):
+        self._count('leaders')
+        return fn()
+
+    def _run_shared(self, key, fn, endpoint, deadline):
+        owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        while True:
+            if self._claim(key, owner):
+                try:
+                    result = self._lead(fn)
+                except Exception as e:
+                    self._finish(key, owner, error=str(e) or e.__class__.__name__)
+                    raise
+                self._finish(key, owner, result=result)
+                return result
+
+            found, result = self._wait(key, endpoint, deadline)
+            if found:
+                self._coalesced('coalesced_shared', endpoint)
+                return result
+            # The other process failed or went away; try to take the call over
+            self._count('takeovers')
+
+    def _claim(self, key, owner):
+        """Become the process making the call unless a live one already is"""
+        now = time.time()
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''INSERT INTO llm_inflight (key, owner, started_at) VALUES (?, ?, ?)
+                     ON CONFLICT(key) DO UPDATE SET
+                         owner = excluded.owner, started_at = excluded.started_at,
+                         finished_at = NULL, result = NULL, error = NULL
+                     WHERE llm_inflight.finished_at IS NOT NULL OR llm_inflight.started_at < ?''',
+                  (key, owner, now, now - self.lease))
+        claimed = c.rowcount == 1
+        conn.commit()
+        return claimed
+
+    def _wait(self, key, endpoint, deadline):
+        """
+        Poll another process's call. Returns (True, result) once it succeeds, or
+        (False, None) if it failed, expired or the row was taken over. Raises
+        DeadlineExceeded if it is still running at deadline.
+        """
+        conn = self._connect()
+        c = conn.cursor()
+        delay = POLL_MIN
+        owner = None
+        while True:
+            c.execute('SELECT owner, started_at, finished_at, result, error FROM llm_inflight WHERE key = ?', (key,))
+            row = c.fetchone()
+            if row is None:
+                return False, None
+            if owner is None:
+                owner = row[0]
+            elif row[0] != owner:
+                return False, None
+            if row[2] is not None:
+                if row[4] is not None or row[3] is None:
+                    return False, None
+                return True, json.loads(row[3])
+            if row[1] < time.time() - self.lease:
+                return False, None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._deadline_exceeded(endpoint)
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX)
+
+    def _finish(self, key, owner, result=None, error=None):
+        now = time.time()
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''UPDATE llm_inflight SET finished_at = ?, result = ?, error = ?
+                     WHERE key = ? AND owner = ?''',
+                  (now, json.dumps(result) if error is None else None, error, key, owner))
+        c.execute('DELETE FROM llm_inflight WHERE finished_at < ?', (now - RESULT_RETENTION,))
+        conn.commit()
+
+    def _deadline_exceeded(self, endpoint):
+        self._count('deadline_exceeded')
+        metrics.LLM_DEADLINE_EXCEEDED.inc(endpoint or 'other')
+        raise resilience.DeadlineExceeded(f"Gave up waiting for an identical {endpoint or 'chat'} completion")
+
+    def _coalesced(self, scope, endpoint):
+        self._count(scope)
+        metrics.LLM_COALESCED.inc(endpoint or 'other', scope.split('_')[1])
+        tracing.annotate(coalesced=scope.split('_')[1])
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        stats['coalesced'] = stats['coalesced_local'] + stats['coalesced_shared']
+        stats['enabled'] = SINGLE_FLIGHT_ENABLED
+        stats['shared'] = self.shared
+        return stats
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight():
+    """Process-wide SingleFlight instance"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,378 @@
+import contextvars
+import fcntl
+import functools
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+# Where finished traces go: "jsonl" appends one line per span to TRACE_FILE,
+# "otlp" posts them to an OpenTelemetry collector, empty keeps only the slow-request log
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', '').lower()
+_DATA_DIR = os.path.dirname(os.path.abspath(os.getenv('DATABASE_PATH', 'learning_assistant.db')))
+TRACE_FILE = os.getenv('TRACE_FILE', os.path.join(_DATA_DIR, 'traces.jsonl'))
+OTLP_ENDPOINT = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318').rstrip('/')
+SERVICE_NAME = os.getenv('OTEL_SERVICE_NAME', 'learning-assistant')
+# Requests slower than this are written to SLOW_REQUEST_LOG with their whole span tree; 0 disables.
+# The default sits a little above a normal AI call, so only requests that stall or chain calls are logged
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 12000))
+SLOW_REQUEST_LOG = os.getenv('SLOW_REQUEST_LOG', os.path.join(_DATA_DIR, 'slow_requests.jsonl'))
+# TRACE_FILE and SLOW_REQUEST_LOG are moved to <file>.1 once they pass this size; 0 never rotates
+TRACE_LOG_MAX_BYTES = int(os.getenv('TRACE_LOG_MAX_BYTES', 10 * 1024 * 1024))
+# Spans kept per trace; later ones are counted but dropped
+MAX_SPANS = 1000
+EXPORT_QUEUE_SIZE = 1000
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attributes', 'start', 'end', 'error', '_started')
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration_ms(self):
+        return round((self.end - self.start) * 1000, 3) if self.end is not None else None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error=None):
+        self.end = self.start + (time.perf_counter() - self._started)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'request_id': self.trace.request_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class Trace:
+    """The spans of one request or background job"""
+
+    def __init__(self, request_id=None):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id or self.trace_id
+        self.spans = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def tree(self):
+        """Spans nested under their parents, for the slow-request log"""
+        nodes = {span.span_id: dict(span.to_dict(), children=[]) for span in self.spans}
+        roots = []
+        for span in self.spans:
+            node = nodes[span.span_id]
+            node.pop('trace_id')
+            node.pop('request_id')
+            parent = nodes.get(span.parent_id)
+            (parent['children'] if parent else roots).append(node)
+        return roots
+
+
+# Innermost open span of the request or job running in this thread or greenlet
+_current = contextvars.ContextVar('trace_span', default=None)
+
+def current_span():
+    return _current.get()
+
+def current_request_id():
+    span = _current.get()
+    return span.trace.request_id if span else None
+
+def annotate(**attributes):
+    """Add attributes to the current span, if any"""
+    span = _current.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+def propagation_headers(span=None):
+    """Headers that carry the request id and W3C trace context of span (default: the current one)"""
+    span = span or _current.get()
+    if span is None:
+        return {}
+    return {
+        'X-Request-ID': span.trace.request_id,
+        'traceparent': f"00-{span.trace.trace_id}-{span.span_id}-01"
+    }
+
+
+def start_trace(name, request_id=None, **attributes):
+    """Open the root span of a new trace and make it current; close it with end_trace()"""
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(request_id)
+    span = Span(trace, name, None, attributes)
+    trace.add(span)
+    _current.set(span)
+    return span
+
+def end_trace(root, error=None):
+    """Close a root span and hand its trace to the exporter"""
+    if root is None or root.end is not None:
+        return
+    root.finish(error)
+    if _current.get() is root:
+        _current.set(None)
+    _exporter.submit(root.trace)
+
+
+class _SpanContext:
+    __slots__ = ('name', 'attributes', 'span', 'token')
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            return None
+        self.span = Span(parent.trace, self.name, parent.span_id, self.attributes)
+        parent.trace.add(self.span)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return
+        self.span.finish(exc)
+        try:
+            _current.reset(self.token)
+        except ValueError:
+            # Closed from another context, e.g. a generator finished elsewhere
+            pass
+
+def span(name, **attributes):
+    """
+    Context manager timing a child of the current span. Outside a trace it does
+    nothing and yields None, so instrumented code costs one lookup when idle.
+    """
+    return _SpanContext(name, attributes)
+
+def open_span(name, **attributes):
+    """
+    Child of the current span that is not made current, for work that spans yields of
+    a generator; the caller must call finish() on it. Returns None outside a trace.
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    parent.trace.add(child)
+    return child
+
+def traced(name):
+    """Decorator running the function inside span(name); a generator's span lasts until it is exhausted"""
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                child = open_span(name)
+                if child is None:
+                    yield from fn(*args, **kwargs)
+                    return
+                error = None
+                try:
+                    yield from fn(*args, **kwargs)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    child.finish(error)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with _SpanContext(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def _otlp_span(span):
+    attributes = dict(span.attributes, **{'request.id': span.trace.request_id})
+    record = {
+        'traceId': span.trace.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': 2 if span.parent_id is None else 1,  # SERVER for the root, INTERNAL below it
+        'startTimeUnixNano': str(int(span.start * 1e9)),
+        'endTimeUnixNano': str(int((span.end or span.start) * 1e9)),
+        'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in attributes.items()],
+        'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+    }
+    if span.parent_id:
+        record['parentSpanId'] = span.parent_id
+    return record
+
+
+def _rotate(path, max_bytes=None):
+    """
+    Move path to path.1, replacing the previous one, once it has grown past max_bytes.
+    The size check and the move happen under an flock on path.lock, so when several
+    gunicorn workers see a full file only the first rotates it and the others find
+    the new, small one instead of rotating again over path.1.
+    """
+    max_bytes = TRACE_LOG_MAX_BYTES if max_bytes is None else max_bytes
+    if max_bytes <= 0:
+        return
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+    except FileNotFoundError:
+        return
+    with open(f"{path}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.getsize(path) >= max_bytes:
+                os.replace(path, f"{path}.1")
+        except FileNotFoundError:
+            pass
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class TraceExporter:
+    """Writes finished traces from a background thread so requests never wait on the export"""
+
+    def __init__(self, exporter=TRACE_EXPORTER, slow_ms=SLOW_REQUEST_MS):
+        self.exporter = exporter
+        self.slow_ms = slow_ms
+        self._queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'traces': 0, 'spans': 0, 'slow': 0, 'dropped': 0, 'errors': 0}
+
+    def submit(self, trace):
+        is_slow = self.slow_ms > 0 and trace.spans[0].duration_ms >= self.slow_ms
+        if not self.exporter and not is_slow:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((trace, is_slow))
+        except queue.Full:
+            self._count('dropped')
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._export(batch)
+            except Exception as e:
+                self._count('errors')
+                print(f"Trace export failed: {e}")
+
+    def _export(self, batch):
+        traces = [trace for trace, _ in batch]
+        if self.exporter == 'jsonl':
+            _rotate(TRACE_FILE)
+            with open(TRACE_FILE, 'a') as f:
+                for trace in traces:
+                    for span in trace.spans:
+                        f.write(json.dumps(span.to_dict(), default=str) + '\n')
+        elif self.exporter == 'otlp':
+            self._post_otlp(traces)
+
+        slow = [trace for trace, is_slow in batch if is_slow]
+        if slow:
+            _rotate(SLOW_REQUEST_LOG)
+            with open(SLOW_REQUEST_LOG, 'a') as f:
+                for trace in slow:
+                    root = trace.spans[0]
+                    f.write(json.dumps({
+                        'request_id': trace.request_id,
+                        'trace_id': trace.trace_id,
+                        'name': root.name,
+                        'start': root.start,
+                        'duration_ms': root.duration_ms,
+                        'dropped_spans': trace.dropped,
+                        'spans': trace.tree()
+                    }, default=str) + '\n')
+
+        with self._lock:
+            self._stats['traces'] += len(traces)
+            self._stats['spans'] += sum(len(trace.spans) for trace in traces)
+            self._stats['slow'] += len(slow)
+
+    def _post_otlp(self, traces):
+        import requests
+        body = {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{
+                'scope': {'name': 'backend.utils.tracing'},
+                'spans': [_otlp_span(span) for trace in traces for span in trace.spans]
+            }]
+        }]}
+        response = requests.post(f"{OTLP_ENDPOINT}/v1/traces", json=body, timeout=5)
+        response.raise_for_status()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['exporter'] = self.exporter or None
+        return stats
+
+
+_exporter = TraceExporter()
+
+def export_stats():
+    return _exporter.stats()
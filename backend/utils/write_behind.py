@@ -0,0 +1,177 @@
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+# Failed rows kept in stats()['dead_letters'], newest last
+DEAD_LETTERS_KEPT = 100
+
+
+class WriteBehindWriter:
+    """
+    Background writer that takes INSERT statements off the request path.
+    Rows are grouped per statement and written with executemany in a single
+    transaction every interval_ms, or sooner once batch_size rows are waiting.
+    A failed batch is retried retries times with backoff, then written row by row
+    so a bad row only loses itself; rows that still fail are counted in failed and
+    kept in dead_letters. Callers that need to read their own writes use
+    wait_for(key) or flush().
+    """
+
+    def __init__(self, connect, interval_ms=5, batch_size=200, retries=3, retry_backoff=0.05):
+        self.connect = connect
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._pending = Counter()  # key -> rows queued but not yet processed
+        self._submitted = 0
+        self._processed = 0  # highest sequence number committed or given up on
+        self._flush_requested = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._dead_letters = deque(maxlen=DEAD_LETTERS_KEPT)
+        self._stats = {'batches': 0, 'rows': 0, 'errors': 0, 'retries': 0, 'failed': 0,
+                       'last_flush_ms': 0.0, 'max_flush_ms': 0.0, 'total_flush_ms': 0.0}
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                    self._thread.start()
+
+    def submit(self, sql, params, key=None):
+        """Queue one row for sql; key marks it for wait_for (e.g. ('chat_history', topic_id))"""
+        self._ensure_started()
+        with self._cond:
+            self._submitted += 1
+            if key is not None:
+                self._pending[key] += 1
+            # Enqueue under the lock so sequence numbers reach the writer in order
+            self._queue.put((self._submitted, sql, params, key))
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_requested.set()
+
+    def flush(self, timeout=5):
+        """Block until everything submitted so far is processed; False on timeout or if rows failed meanwhile"""
+        with self._cond:
+            target = self._submitted
+            if self._processed >= target:
+                return True
+            failed = self._stats['failed']
+        self._ensure_started()
+        self._flush_requested.set()
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._processed >= target, timeout=timeout)
+            return done and self._stats['failed'] == failed
+
+    def wait_for(self, key, timeout=5):
+        """Flush only if rows for key are still queued, so reads see this process's writes"""
+        with self._cond:
+            if not self._pending.get(key):
+                return True
+        return self.flush(timeout)
+
+    def wait_for_any(self, predicate, timeout=5):
+        """Flush only if rows for some key matching predicate are still queued"""
+        with self._cond:
+            if not any(predicate(key) for key in self._pending):
+                return True
+        return self.flush(timeout)
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._flush_requested.is_set():
+                # Drain what is already queued without waiting further
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self._flush_requested.clear()
+        return batch
+
+    def _write_batch(self, conn, batch):
+        groups = OrderedDict()
+        for _, sql, params, _ in batch:
+            groups.setdefault(sql, []).append(params)
+        try:
+            for sql, rows in groups.items():
+                conn.executemany(sql, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        conn = self.connect()
+        failed = []
+        for attempt in range(self.retries + 1):
+            try:
+                self._write_batch(conn, batch)
+                break
+            except Exception as e:
+                with self._cond:
+                    self._stats['errors'] += 1
+                if attempt < self.retries:
+                    with self._cond:
+                        self._stats['retries'] += 1
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+                    continue
+                print(f"Write-behind batch of {len(batch)} rows failed, writing it row by row: {e}")
+                for item in batch:
+                    try:
+                        self._write_batch(conn, [item])
+                    except Exception as row_error:
+                        failed.append((item, row_error))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            for _, _, _, key in batch:
+                if key is not None:
+                    self._pending[key] -= 1
+                    if self._pending[key] <= 0:
+                        del self._pending[key]
+            for (seq, sql, params, key), error in failed:
+                print(f"Write-behind row dropped ({error}): {sql.split('(')[0].strip()} {params!r}")
+                self._dead_letters.append({'sql': sql, 'params': list(params), 'key': key,
+                                           'error': str(error), 'failed_at': time.time()})
+            self._processed = max(self._processed, max(item[0] for item in batch))
+            self._stats['batches'] += 1
+            self._stats['rows'] += len(batch) - len(failed)
+            self._stats['failed'] += len(failed)
+            self._stats['last_flush_ms'] = elapsed_ms
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], elapsed_ms)
+            self._stats['total_flush_ms'] += elapsed_ms
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self._write(batch)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = self._submitted - self._processed
+            stats['dead_letters'] = list(self._dead_letters)
+        total_flush_ms = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = round(total_flush_ms / stats['batches'], 3) if stats['batches'] else 0
+        stats['last_flush_ms'] = round(stats['last_flush_ms'], 3)
+        stats['max_flush_ms'] = round(stats['max_flush_ms'], 3)
+        return stats
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark for backend/utils/database.py.
+
+Compares the old connect-per-call pattern with the pooled per-thread connection
+on a mix of the calls a chat turn makes (save two messages, read history and note).
+
+    python benchmarks/db_benchmark.py --ops 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_connect_per_call(db_path, ops):
+    """The original pattern: sqlite3.connect -> query -> close for every call, default pragmas"""
+    def save_chat_message(topic_id, step_number, role, message):
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute('''INSERT INTO chat_history (topic_id, step_number, role, message)
+                     VALUES (?, ?, ?, ?)''', (topic_id, step_number, role, message))
+        conn.commit()
+        conn.close()
+
+    def get_chat_history(topic_id, step_number, limit=10):
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute('''SELECT role, message, created_at FROM chat_history
+                     WHERE topic_id = ? AND step_number = ?
+                     ORDER BY created_at DESC LIMIT ?''', (topic_id, step_number, limit))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+
+    def get_note(topic_id, step_number):
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute('''SELECT content FROM notes WHERE topic_id = ? AND step_number = ?''', (topic_id, step_number))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    # The pooled connection switched this file to WAL; measure the old default journal mode
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=DELETE')
+    conn.close()
+
+    return _run(ops, save_chat_message, get_chat_history, get_note)
+
+
+def run_pooled(db, ops):
+    return _run(ops, db.save_chat_message, db.get_chat_history, db.get_note)
+
+
+def _run(ops, save_chat_message, get_chat_history, get_note):
+    start = time.perf_counter()
+    for i in range(ops):
+        topic_id, step = 1, i % 10
+        save_chat_message(topic_id, step, 'user', f'question {i}')
+        save_chat_message(topic_id, step, 'assistant', f'answer {i}')
+        get_chat_history(topic_id, step)
+        get_note(topic_id, step)
+    elapsed = time.perf_counter() - start
+    return ops * 4 / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=1000, help="Chat turns to simulate (4 database calls each)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        import backend.utils.database as db
+        db.init_db()
+        # The old pattern gets its own copy of the empty schema; the pooled connections
+        # (including the write-behind thread's) stay open on the original
+        before_path = os.path.join(tmp, 'before.db')
+        src, dst = sqlite3.connect(os.environ['DATABASE_PATH']), sqlite3.connect(before_path)
+        src.backup(dst)
+        src.close()
+        dst.close()
+
+        pooled = run_pooled(db, args.ops)
+        db.close_connections()
+        before = run_connect_per_call(before_path, args.ops)
+
+    print(f"connect per call : {before:10.0f} ops/sec")
+    print(f"pooled connection: {pooled:10.0f} ops/sec ({pooled / before:.1f}x)")
@@ -0,0 +1,28 @@
+// Run a long AI request as a background job: ask for ?async=1, then poll /api/jobs/<id>.
+// wrapResult turns the job's result into the body the synchronous route would have returned,
+// so callers handle both the same way. Routes that answer at once (cache hits, errors)
+// return their body unchanged. Polling gives up after the timeout the server sends with the
+// job (its REQUEST_BUDGET), or as soon as the status request fails.
+async function fetchJob(url, options, wrapResult) {
+    const jobUrl = url + (url.includes('?') ? '&' : '?') + 'async=1';
+    const response = await fetch(jobUrl, options);
+    const data = await response.json();
+    if (response.status !== 202) return data;
+
+    const deadline = Date.now() + (data.timeout || 100) * 1000;
+    let delay = 500;
+    while (Date.now() + delay < deadline) {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 1.5, 3000);
+
+        const statusResponse = await fetch(data.status_url);
+        const status = statusResponse.ok ? await statusResponse.json().catch(() => null) : null;
+        if (!status) return { success: false, error: `Could not check the request (${statusResponse.status})` };
+        if (!status.success) return status;
+
+        const job = status.job;
+        if (job.status === 'done') return wrapResult(job.result);
+        if (job.status === 'failed') return { success: false, error: job.error || 'The request failed' };
+    }
+    return { success: false, error: 'The request timed out' };
+}
@@ -88,6 +88,9 @@ const startingTopic = document.getElementById('starting-topic');
 let assessmentData = null;
 let assessmentAnswers = {};
 let currentAssessmentIndex = 0;
+let assessmentStreaming = false;
+let assessmentWaiting = false;
+const EXPECTED_ASSESSMENT_QUESTIONS = 10;
 
 // Mobile / Sidebar Elements
 const leftSidebar = document.querySelector('.sidebar');
@@ -330,19 +333,35 @@ async function startLearning() {
     }
 
     showLoading();
+    const loadingSteps = document.getElementById('loading-steps');
+    if (loadingSteps) loadingSteps.innerHTML = '';
 
     try {
-        const response = await fetch('/api/start-topic', {
+        // Steps are listed on the loading screen as soon as each one is generated
+        let data = null;
+        await streamEvents('/api/start-topic/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({ topic, persona, difficulty }),
+        }, (event, payload) => {
+            if (event === 'step') {
+                if (loadingSteps) {
+                    const item = document.createElement('li');
+                    item.textContent = payload.title;
+                    loadingSteps.appendChild(item);
+                }
+            } else if (event === 'done') {
+                data = payload;
+            } else if (event === 'error') {
+                throw new Error(payload.error);
+            }
         });
 
-        const data = await response.json();
-
-        if (data.success) {
+        if (data && data.success) {
+            // The cookie cannot be set by a streamed response once it has started
+            document.cookie = `topic_id=${data.topic_id}; path=/`;
             roadmapData = data;
             roadmapData.persona = persona;
             roadmapData.difficulty = difficulty;
@@ -356,7 +375,7 @@ async function startLearning() {
             showScreen('learning-screen');
             await updateLearningScreen();
         } else {
-            alert('Error: ' + (data.error || 'Failed to generate roadmap'));
+            alert('Error: Failed to generate roadmap');
             showScreen('start-screen');
         }
     } catch (error) {
@@ -557,17 +576,15 @@ async function loadGuide() {
     `;
 
     try {
-        const response = await fetch('/api/get-guide', {
-            method: 'POST',
+        let guideText = '';
+        await streamEvents('/api/get-guide/stream', { method: 'POST' }, (event, data) => {
+            if (event === 'delta') {
+                guideText += data.text;
+                guideContent.textContent = guideText;
+            } else if (event === 'error') {
+                guideContent.innerHTML = `<p style="color: #ef4444;">Failed to load guide.</p>`;
+            }
         });
-
-        const data = await response.json();
-
-        if (data.success) {
-            guideContent.textContent = data.guide;
-        } else {
-            guideContent.innerHTML = `<p style="color: #ef4444;">Failed to load guide.</p>`;
-        }
     } catch (error) {
         guideContent.innerHTML = `<p style="color: #ef4444;">Error: ${error.message}</p>`;
     }
@@ -656,39 +673,48 @@ async function sendChat() {
     chatInput.value = '';
 
     try {
-        const response = await fetch('/api/chat', {
+        let messageDiv = null;
+        let answer = '';
+        await streamEvents('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({ message }),
+        }, (event, data) => {
+            if (event === 'delta') {
+                answer += data.text;
+                if (!messageDiv) {
+                    messageDiv = addChatMessage('assistant', answer);
+                } else {
+                    messageDiv.textContent = cleanChatText(answer);
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+            } else if (event === 'error') {
+                addChatMessage('assistant', 'Sorry, I encountered an error. Please try again.');
+            }
         });
-
-        const data = await response.json();
-
-        if (data.success) {
-            addChatMessage('assistant', data.response);
-        } else {
-            addChatMessage('assistant', 'Sorry, I encountered an error. Please try again.');
-        }
     } catch (error) {
         addChatMessage('assistant', 'Error: ' + error.message);
     }
 }
 
-function addChatMessage(role, message) {
-    const messageDiv = document.createElement('div');
-    messageDiv.className = `chat-message ${role}`;
-
+function cleanChatText(message) {
     // Clean text by removing markdown characters (* and #)
-    const cleanedMessage = message
+    return message
         .replace(/[*#]/g, '') // Remove all * and #
         .replace(/\n\s*\n/g, '\n') // Remove extra empty lines
         .trim();
+}
+
+function addChatMessage(role, message) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `chat-message ${role}`;
 
-    messageDiv.textContent = cleanedMessage;
+    messageDiv.textContent = cleanChatText(message);
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv;
 }
 
 function clearChat() {
@@ -882,33 +908,64 @@ async function startAssessment() {
     assessmentQuestions.classList.remove('hidden');
     questionContainer.innerHTML = '<div class="guide-loading"><i class="fas fa-spinner fa-spin"></i><p>Generating Assessment...</p></div>';
 
-    try {
-        const response = await fetch('/api/generate-assessment', { method: 'POST' });
-        const data = await response.json();
+    // Questions arrive one by one; the first is shown while the rest are still generating
+    assessmentData = [];
+    currentAssessmentIndex = 0;
+    assessmentAnswers = {};
+    assessmentStreaming = true;
+    assessmentWaiting = false;
 
-        if (data.success) {
-            assessmentData = data.questions;
-            currentAssessmentIndex = 0;
-            assessmentAnswers = {};
-            showAssessmentQuestion();
-        } else {
-            alert('Error: ' + data.error);
-            resetAssessment();
+    try {
+        await streamEvents('/api/generate-assessment/stream', { method: 'POST' }, (event, data) => {
+            if (event === 'question') {
+                assessmentData.push(data);
+                if (assessmentData.length === 1) {
+                    showAssessmentQuestion();
+                } else if (assessmentWaiting) {
+                    assessmentWaiting = false;
+                    currentAssessmentIndex++;
+                    showAssessmentQuestion();
+                }
+            } else if (event === 'done') {
+                assessmentStreaming = false;
+                if (assessmentWaiting) {
+                    assessmentWaiting = false;
+                    submitAssessment();
+                } else if (assessmentData.length) {
+                    updateAssessmentProgress();
+                }
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
+        assessmentStreaming = false;
+        if (!assessmentData.length) {
+            throw new Error('No assessment questions were generated');
         }
     } catch (error) {
+        assessmentStreaming = false;
         alert('Error: ' + error.message);
         resetAssessment();
     }
 }
 
+function assessmentTotal() {
+    return assessmentStreaming
+        ? Math.max(assessmentData.length, EXPECTED_ASSESSMENT_QUESTIONS)
+        : assessmentData.length;
+}
+
+function updateAssessmentProgress() {
+    const total = assessmentTotal();
+    assessmentQuestionCount.textContent = `Question ${currentAssessmentIndex + 1} of ${total}`;
+    assessmentProgressFill.style.width = `${((currentAssessmentIndex) / total) * 100}%`;
+}
+
 function showAssessmentQuestion() {
     if (!assessmentData) return;
 
     const q = assessmentData[currentAssessmentIndex];
-    const total = assessmentData.length;
-
-    assessmentQuestionCount.textContent = `Question ${currentAssessmentIndex + 1} of ${total}`;
-    assessmentProgressFill.style.width = `${((currentAssessmentIndex) / total) * 100}%`;
+    updateAssessmentProgress();
 
     questionContainer.innerHTML = `
         <div class="assessment-question animated-fade-in">
@@ -933,9 +990,13 @@ function showAssessmentQuestion() {
             this.classList.add('selected');
 
             setTimeout(() => {
-                if (currentAssessmentIndex < total - 1) {
+                if (currentAssessmentIndex < assessmentData.length - 1) {
                     currentAssessmentIndex++;
                     showAssessmentQuestion();
+                } else if (assessmentStreaming) {
+                    // The next question is still being generated
+                    assessmentWaiting = true;
+                    questionContainer.innerHTML = '<div class="guide-loading"><i class="fas fa-spinner fa-spin"></i><p>Loading next question...</p></div>';
                 } else {
                     submitAssessment();
                 }
@@ -994,4 +1055,6 @@ function resetAssessment() {
     assessmentData = null;
     assessmentAnswers = {};
     currentAssessmentIndex = 0;
+    assessmentStreaming = false;
+    assessmentWaiting = false;
 }
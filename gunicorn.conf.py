@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+# Gunicorn settings. LLM-bound routes spend almost all their time waiting on the
+# Perplexity API, so by default each worker runs gevent: requests, sockets and
+# threads are monkey-patched and one process can hold hundreds of requests that
+# are waiting upstream instead of one per sync worker.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 500))  # concurrent requests per gevent worker
+threads = int(os.getenv('GUNICORN_THREADS', 4))  # only used by the gthread worker class
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Each worker counts its own metrics; with more than one, they share snapshots in
+# METRICS_DIR so /metrics reports every worker, not just the one that was scraped.
+# Set here, before the workers import backend.utils.metrics, unless already configured.
+if workers > 1:
+    os.environ.setdefault('METRICS_DIR', os.path.join(
+        tempfile.gettempdir(), f"learning-assistant-metrics-{os.getenv('PORT', '5000')}"))
+
+
+def on_starting(server):
+    """Drop metric samples written by workers of a previous run"""
+    from backend.utils import metrics
+    metrics.clear_snapshots()
+
+
+def worker_exit(server, worker):
+    """Commit rows still queued by the write-behind writer and save metrics before the worker goes away"""
+    import backend.utils.database as db
+    from backend.utils import metrics
+    db.flush_writes()
+    metrics.write_snapshot()
@@ -0,0 +1,228 @@
+"""
+Drives simulated learners through the app and reports throughput, latency percentiles
+and error rate per route. Each virtual user repeats a journey:
+
+    start-topic -> (get-guide -> chat -> generate-quiz -> submit-quiz -> next-step) x steps
+    -> generate-mock-test -> evaluate-mock-test
+
+    python -m loadtest.load_generator --base-url http://127.0.0.1:5000 --users 50 --duration 60
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import requests
+
+TOPICS = ['Python', 'Machine Learning', 'Web Development', 'Data Structures', 'SQL',
+          'Cyber Security', 'Cloud Computing', 'UI/UX Design']
+CHAT_MESSAGES = ['Can you explain this with an example?', 'What are common mistakes here?',
+                 'How is this used in real projects?', 'Summarize the key idea in two sentences.']
+
+
+class JourneyFailed(Exception):
+    """A step failed, so the rest of the journey cannot run"""
+
+
+class Recorder:
+    """Latencies and outcomes per route, shared by all virtual users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.journeys = 0
+        self.failed_journeys = 0
+
+    def record(self, route, seconds, status, ok):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            self.statuses[route][status] += 1
+            if not ok:
+                self.errors[route] += 1
+
+    def journey_done(self, ok):
+        with self._lock:
+            if ok:
+                self.journeys += 1
+            else:
+                self.failed_journeys += 1
+
+
+class VirtualUser:
+    def __init__(self, base_url, recorder, rng, steps=2, think=0.0, stream=False, timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.rng = rng
+        self.steps = steps
+        self.think = think
+        self.stream = stream
+        self.timeout = timeout
+        self.http = requests.Session()
+        # Stable identity across journeys, like a returning browser
+        self.http.cookies.set('session_id', uuid.uuid4().hex)
+
+    def _call(self, route, payload=None, method='POST'):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.http.request(method, self.base_url + route, json=payload,
+                                         timeout=self.timeout, stream=route.endswith('/stream'))
+            status = response.status_code
+            if route.endswith('/stream'):
+                # Time the whole stream, not just the headers
+                body = b''.join(response.iter_content(chunk_size=None))
+                ok = response.ok and b'event: error' not in body
+                data = None
+            else:
+                data = response.json() if response.content else None
+                ok = response.ok and not (isinstance(data, dict) and data.get('error'))
+        except (requests.RequestException, ValueError):
+            ok, data = False, None
+        self.recorder.record(route, time.perf_counter() - started, status, ok)
+        if self.think:
+            time.sleep(self.rng.uniform(0, 2 * self.think))
+        if not ok:
+            raise JourneyFailed(route)
+        return data
+
+    def run_journey(self):
+        topic = self.rng.choice(TOPICS)
+        difficulty = self.rng.choice(['Beginner', 'Intermediate', 'Advanced'])
+        try:
+            self._call('/api/start-topic', {'topic': topic, 'persona': 'General', 'difficulty': difficulty})
+            for _ in range(self.steps):
+                if self.stream:
+                    self._call('/api/get-guide/stream', {})
+                    self._call('/api/chat/stream', {'message': self.rng.choice(CHAT_MESSAGES)})
+                else:
+                    self._call('/api/get-guide', {})
+                    self._call('/api/chat', {'message': self.rng.choice(CHAT_MESSAGES)})
+                quiz = self._call('/api/generate-quiz', {})
+                questions = quiz.get('questions', [])
+                answers = {str(i): self.rng.choice('ABCD') for i in range(len(questions))}
+                self._call('/api/submit-quiz', {'answers': answers, 'questions': questions})
+                self._call('/api/next-step', {})
+            test = self._call('/api/generate-mock-test', {})['data']
+            self._call('/api/evaluate-mock-test', {
+                'topic': topic,
+                'questions': test,
+                'mcq_answers': {str(q['id']): self.rng.choice('ABCD') for q in test.get('mcqs', [])},
+                'subjective_answers': {str(q['id']): 'It depends on the problem, but the main idea is to '
+                                       'break it into smaller parts and test each one.'
+                                       for q in test.get('subjective', [])}
+            })
+        except (JourneyFailed, KeyError, TypeError, AttributeError):
+            self.recorder.journey_done(False)
+            return
+        self.recorder.journey_done(True)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for route, values in recorder.latencies.items():
+        values = sorted(values)
+        routes[route] = {
+            'requests': len(values),
+            'errors': recorder.errors[route],
+            'error_rate': recorder.errors[route] / len(values),
+            'rps': len(values) / elapsed,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': values[-1] * 1000,
+            'statuses': {str(k): v for k, v in recorder.statuses[route].items()}
+        }
+    total = sum(r['requests'] for r in routes.values())
+    errors = sum(r['errors'] for r in routes.values())
+    return {
+        'elapsed_s': elapsed,
+        'requests': total,
+        'rps': total / elapsed if elapsed else 0,
+        'error_rate': errors / total if total else 0,
+        'journeys': recorder.journeys,
+        'failed_journeys': recorder.failed_journeys,
+        'routes': routes
+    }
+
+def print_report(summary):
+    print(f"\n{summary['requests']} requests in {summary['elapsed_s']:.1f}s "
+          f"({summary['rps']:.1f} req/s), error rate {summary['error_rate']:.2%}, "
+          f"{summary['journeys']} journeys completed, {summary['failed_journeys']} failed\n")
+    header = f"{'route':<28}{'reqs':>7}{'rps':>8}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(header)
+    print('-' * len(header))
+    for route, r in sorted(summary['routes'].items()):
+        print(f"{route:<28}{r['requests']:>7}{r['rps']:>8.2f}{r['error_rate']:>7.1%}"
+              f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}{r['max_ms']:>9.0f}")
+
+def run(base_url, users, duration=None, journeys=None, steps=2, think=0.0, stream=False, seed=None):
+    """Run users virtual users until duration seconds pass or journeys journeys have started"""
+    recorder = Recorder()
+    seeds = random.Random(seed)
+    stop_at = time.monotonic() + duration if duration else None
+    remaining = [journeys]
+    lock = threading.Lock()
+
+    def take_journey():
+        if stop_at is not None and time.monotonic() >= stop_at:
+            return False
+        if remaining[0] is None:
+            return True
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def user_loop(user):
+        while take_journey():
+            user.run_journey()
+
+    started = time.monotonic()
+    threads = []
+    for i in range(users):
+        user = VirtualUser(base_url, recorder, random.Random(seeds.random()), steps, think, stream)
+        thread = threading.Thread(target=user_loop, args=(user,), name=f'user-{i}', daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return summarize(recorder, time.monotonic() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the learning assistant")
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=10, help="concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=None, help="seconds to run (default: 60)")
+    parser.add_argument('--journeys', type=int, default=None, help="stop after this many journeys")
+    parser.add_argument('--steps', type=int, default=2, help="roadmap steps walked per journey")
+    parser.add_argument('--think-ms', type=float, default=0, help="mean pause between requests")
+    parser.add_argument('--stream', action='store_true', help="use the streaming guide and chat routes")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', metavar='PATH', help="also write the summary as JSON")
+    args = parser.parse_args()
+
+    duration = args.duration if args.duration or args.journeys else 60
+    summary = run(args.base_url, args.users, duration, args.journeys, args.steps,
+                  args.think_ms / 1000, args.stream, args.seed)
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
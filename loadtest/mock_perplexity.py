@@ -0,0 +1,301 @@
+"""
+Stand-in for the Perplexity /chat/completions API, for benchmarking without API credits.
+
+Replies are chosen from the prompt and shaped like the app expects: numbered roadmaps,
+"Q1:" quizzes, and the JSON objects and lists the other routes extract. Latency,
+error rates and streaming speed are configurable:
+
+    python -m loadtest.mock_perplexity --port 8600 --latency lognormal --latency-ms 800 --rate-429 0.02
+    PERPLEXITY_BASE_URL=http://127.0.0.1:8600 gunicorn -c gunicorn.conf.py app:app
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ('practice concept example pattern function module state data model test design debug '
+         'performance interface value structure review project tool workflow').split()
+
+
+def _sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + '.'
+
+def _paragraphs(rng, count=4):
+    return '\n\n'.join(' '.join(_sentence(rng) for _ in range(4)) for _ in range(count))
+
+def _options(rng):
+    return {letter: _sentence(rng, 5)[:-1] for letter in 'ABCD'}
+
+
+def roadmap(rng, prompt):
+    lines = []
+    for i in range(1, rng.randint(6, 9) + 1):
+        lines.append(f"{i}. **Stage {i}: {_sentence(rng, 3)[:-1]}**")
+        lines.extend(f"   - {_sentence(rng, 6)}" for _ in range(3))
+    return '\n'.join(lines)
+
+def quiz(rng, prompt):
+    blocks = []
+    for i in range(1, 6):
+        options = _options(rng)
+        blocks.append('\n'.join([f"Q{i}: {_sentence(rng, 9)[:-1]}?"] +
+                                [f"{letter}) {text}" for letter, text in options.items()] +
+                                [f"Correct: {rng.choice('ABCD')}"]))
+    return '\n\n'.join(blocks)
+
+def mock_test(rng, prompt):
+    return json.dumps({
+        'mcqs': [{'id': i, 'question': _sentence(rng, 10)[:-1] + '?', 'options': _options(rng),
+                  'correct': rng.choice('ABCD')} for i in range(1, 6)],
+        'subjective': [{'id': i, 'question': _sentence(rng, 12)[:-1] + '?', 'guidelines': _sentence(rng)}
+                       for i in range(1, 4)]
+    }, indent=2)
+
+def grade_answer(rng, prompt):
+    return json.dumps({'score': rng.randint(3, 10), 'feedback': _sentence(rng), 'key_point': _sentence(rng)})
+
+def grade_batch(rng, prompt):
+    return json.dumps({
+        'subjective_evaluation': [{'id': i, 'score': rng.randint(3, 10), 'feedback': _sentence(rng),
+                                   'key_point': _sentence(rng)} for i in range(1, 4)],
+        'overall_feedback': _sentence(rng, 20)
+    })
+
+def assessment(rng, prompt):
+    questions = [{'id': i, 'question': _sentence(rng, 9)[:-1] + '?', 'options': _options(rng)}
+                 for i in range(1, 11)]
+    # Fenced like real responses often are, so the scanner has prose to skip
+    return "Here is your assessment:\n```json\n" + json.dumps(questions, indent=2) + "\n```"
+
+def assessment_analysis(rng, prompt):
+    return json.dumps({'recommendedDomain': 'Data Science', 'explanation': _sentence(rng, 20),
+                       'startingTopic': 'Python Programming'})
+
+def resources(rng, prompt):
+    return json.dumps([{'title': _sentence(rng, 5)[:-1], 'type': rng.choice(['Article', 'Video', 'Course']),
+                        'url': f"https://example.com/{uuid.uuid4().hex[:8]}"} for _ in range(3)])
+
+def resume(rng, prompt):
+    return json.dumps({'atsScore': rng.randint(40, 95), 'verdict': 'Fair', 'verdictText': _sentence(rng),
+                       'strengths': [_sentence(rng) for _ in range(3)],
+                       'improvements': [_sentence(rng) for _ in range(3)],
+                       'recommendations': [_sentence(rng) for _ in range(3)]})
+
+def report(rng, prompt):
+    return json.dumps({'readinessScore': rng.randint(20, 95), 'status': 'Learning',
+                       'softSkills': ['Communication', 'Problem Solving', 'Time Management'],
+                       'summary': _sentence(rng, 25), 'nextSteps': _sentence(rng, 15)})
+
+def job_market(rng, prompt):
+    posting = lambda: {'title': _sentence(rng, 3)[:-1], 'company': 'Example Corp', 'location': 'Remote',
+                       'platform': 'LinkedIn', 'url': 'https://www.linkedin.com/jobs/search/?keywords=engineer'}
+    return json.dumps({
+        'trends': {'labels': [f"Domain {i}" for i in range(1, 6)], 'values': [rng.randint(30, 100) for _ in range(5)]},
+        'domainTraffic': {'labels': [f"Month {i}" for i in range(1, 7)],
+                          'values': [rng.randint(100, 1000) for _ in range(6)]},
+        'salaries': {'fresher': '$60k - $80k', 'experienced': '$120k - $180k'},
+        'summaryNews': _sentence(rng, 40),
+        'internships': [posting() for _ in range(3)],
+        'jobs': [posting() for _ in range(3)]
+    })
+
+def prose(rng, prompt):
+    return _paragraphs(rng)
+
+# First matching prompt fragment picks the reply; anything else (guides, chat) gets prose
+REPLIES = [
+    ('curriculum designer', roadmap),
+    ('Create a quiz', quiz),
+    ('Generate a comprehensive mock test', mock_test),
+    ('Evaluate this answer', grade_answer),
+    ('Evaluate the following subjective answers', grade_batch),
+    ('career path assessment', assessment),
+    ('career assessment answers', assessment_analysis),
+    ('learning resources', resources),
+    ('Applicant Tracking System', resume),
+    ('career readiness report', report),
+    ('job market analysis', job_market),
+]
+
+def reply_for(messages, rng):
+    prompt = '\n'.join(m.get('content') or '' for m in messages)
+    for fragment, build in REPLIES:
+        if fragment in prompt:
+            return build(rng, prompt)
+    return prose(rng, prompt)
+
+
+class MockSettings:
+    def __init__(self, latency='lognormal', latency_ms=800.0, spread=0.5, rate_429=0.0, rate_5xx=0.0,
+                 chunk_ms=20.0, chunk_words=3, seed=None):
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.spread = spread
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.chunk_ms = chunk_ms
+        self.chunk_words = chunk_words
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'streams': 0, '429': 0, '5xx': 0}
+
+    def delay(self):
+        """Seconds to wait before the first byte"""
+        with self.lock:
+            if self.latency == 'fixed':
+                ms = self.latency_ms
+            elif self.latency == 'uniform':
+                ms = self.rng.uniform(self.latency_ms * (1 - self.spread), self.latency_ms * (1 + self.spread))
+            else:
+                # latency_ms is the median; spread is the sigma of the underlying normal
+                ms = self.rng.lognormvariate(0, self.spread) * self.latency_ms
+        return max(ms, 0) / 1000
+
+    def failure(self):
+        """429, a 5xx status or None"""
+        with self.lock:
+            roll = self.rng.random()
+            if roll < self.rate_429:
+                return 429
+            if roll < self.rate_429 + self.rate_5xx:
+                return self.rng.choice([500, 502, 503])
+        return None
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+def _usage(messages, content):
+    # Roughly four characters per token, like English text
+    prompt_tokens = sum(len(m.get('content') or '') for m in messages) // 4
+    completion_tokens = len(content) // 4
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.settings.lock:
+                self._send_json(200, dict(self.settings.counts))
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'invalid JSON'})
+            return
+        if self.path.rstrip('/') != '/chat/completions':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        settings = self.settings
+        settings.count('requests')
+        time.sleep(settings.delay())
+        status = settings.failure()
+        if status:
+            settings.count('429' if status == 429 else '5xx')
+            self._send_json(status, {'error': {'message': 'mock failure', 'code': status}})
+            return
+
+        messages = payload.get('messages') or []
+        with settings.lock:
+            rng = random.Random(settings.rng.random())
+        content = reply_for(messages, rng)
+        completion_id = f"mock-{uuid.uuid4().hex[:12]}"
+        model = payload.get('model', 'sonar')
+
+        if not payload.get('stream'):
+            self._send_json(200, {
+                'id': completion_id, 'model': model, 'object': 'chat.completion', 'created': int(time.time()),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': content}}],
+                'usage': _usage(messages, content)
+            })
+            return
+
+        settings.count('streams')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        pieces = re.findall(r'\S+\s*', content)
+        try:
+            for i in range(0, len(pieces), settings.chunk_words):
+                chunk = {'id': completion_id, 'model': model, 'object': 'chat.completion.chunk',
+                         'choices': [{'index': 0, 'delta': {'content': ''.join(pieces[i:i + settings.chunk_words])}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(settings.chunk_ms / 1000)
+            final = {'id': completion_id, 'model': model, 'object': 'chat.completion.chunk',
+                     'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                     'usage': _usage(messages, content)}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+def make_server(host, port, settings):
+    handler = type('Handler', (MockHandler,), {'settings': settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Perplexity API for load testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'lognormal'], default='lognormal',
+                        help="distribution of the time to first byte")
+    parser.add_argument('--latency-ms', type=float, default=800,
+                        help="fixed value, centre of the uniform range or median of the lognormal")
+    parser.add_argument('--spread', type=float, default=0.5,
+                        help="uniform: +/- fraction of latency-ms; lognormal: sigma")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help="fraction answered with 500/502/503")
+    parser.add_argument('--chunk-ms', type=float, default=20, help="delay between streamed chunks")
+    parser.add_argument('--chunk-words', type=int, default=3, help="words per streamed chunk")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency, args.latency_ms, args.spread, args.rate_429, args.rate_5xx,
+                            args.chunk_ms, args.chunk_words, args.seed)
+    server = make_server(args.host, args.port, settings)
+    print(f"Mock Perplexity API on http://{args.host}:{args.port} "
+          f"({args.latency} {args.latency_ms:g} ms, 429 {args.rate_429:.0%}, 5xx {args.rate_5xx:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import pytest
+
+from backend.utils.json_stream import JSONStreamParser, extract_json, iter_json_elements
+
+QUESTIONS = [
+    {"id": 1, "question": "Pick [one]", "options": {"A": "a \"quoted\" b", "B": "}{"}},
+    {"id": 2, "question": "Second", "options": {"A": "x", "B": "y"}},
+]
+
+RESPONSE = """Here are the questions:
+```json
+[
+  {"id": 1, "question": "Pick [one]", "options": {"A": "a \\"quoted\\" b", "B": "}{"}},
+  {"id": 2, "question": "Second", "options": {"A": "x", "B": "y"}}
+]
+```
+Let me know if you need more."""
+
+
+def feed_in_chunks(text, size, expect=None):
+    parser = JSONStreamParser(expect)
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return parser, events
+
+
+def test_whole_text():
+    assert extract_json(RESPONSE, expect='array') == QUESTIONS
+
+
+def test_char_by_char_matches_whole_text():
+    parser, events = feed_in_chunks(RESPONSE, 1, expect='array')
+    assert parser.close() == extract_json(RESPONSE, expect='array')
+    assert events == [((), question) for question in QUESTIONS]
+
+
+def test_every_chunk_size_matches_whole_text():
+    for size in range(1, 60):
+        parser, events = feed_in_chunks(RESPONSE, size, expect='array')
+        assert parser.close() == QUESTIONS
+        assert [value for _, value in events] == QUESTIONS
+
+
+def test_elements_reported_as_they_close():
+    parser = JSONStreamParser('array')
+    assert parser.feed('[{"id": 1}, {"id"') == [((), {"id": 1})]
+    assert not parser.done
+    assert parser.feed(': 2}]') == [((), {"id": 2})]
+    assert parser.done
+
+
+def test_arrays_under_object_keys_are_reported():
+    parser, events = feed_in_chunks('{"mcqs": [{"q": 1}, {"q": 2}], "total": 2}', 3)
+    assert events == [(('mcqs',), {"q": 1}), (('mcqs',), {"q": 2})]
+    assert parser.close() == {"mcqs": [{"q": 1}, {"q": 2}], "total": 2}
+
+
+def test_prose_with_brackets_before_json():
+    text = 'As noted [1], the answer [see below]:\n{"score": 7}'
+    assert extract_json(text) == {"score": 7}
+    parser, _ = feed_in_chunks(text, 1)
+    assert parser.close() == {"score": 7}
+
+
+def test_citation_before_inline_json():
+    assert extract_json('Sure [1] see {"k": "v"}') == {"k": "v"}
+
+
+def test_citation_is_not_an_array_answer():
+    assert extract_json('Sure [1] see [{"k": "v"}] above', expect='array') == [{"k": "v"}]
+    with pytest.raises(ValueError):
+        extract_json('Sure [1] see {"k": "v"}', expect='array')
+
+
+def test_plain_array_at_line_start_is_kept():
+    assert extract_json('Skills:\n["python", "sql"]') == ["python", "sql"]
+
+
+def test_no_json():
+    with pytest.raises(ValueError):
+        extract_json('No structured answer today.')
+    with pytest.raises(ValueError):
+        JSONStreamParser().close()
+
+
+def test_iter_json_elements():
+    chunks = [RESPONSE[i:i + 7] for i in range(0, len(RESPONSE), 7)]
+    events = list(iter_json_elements(chunks, expect='array'))
+    assert events[:-1] == [('element', ((), question)) for question in QUESTIONS]
+    assert events[-1] == ('done', QUESTIONS)
+
+
+def test_iter_json_elements_falls_back_to_relaxed_search():
+    events = list(iter_json_elements(['The result is {"score"', ': 4} overall'], expect='object'))
+    assert events == [('done', {"score": 4})]
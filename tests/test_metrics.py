@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+from backend.utils import metrics
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def write(directory, pid, values):
+    with open(os.path.join(directory, f"metrics-{pid}.json"), 'w') as f:
+        json.dump(values, f)
+
+
+def test_exited_workers_keep_counters_but_not_gauges(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    endpoint = "test-exited-worker"
+    snapshot = {
+        'llm_circuit_breaker_state': [[[endpoint], 2]],
+        'llm_coalesced_total': [[[endpoint, 'local'], 3]],
+    }
+    write(tmp_path, exited_pid(), snapshot)
+    write(tmp_path, os.getppid(), {
+        'llm_circuit_breaker_state': [[[endpoint], 0]],
+        'llm_coalesced_total': [[[endpoint, 'local'], 4]],
+    })
+
+    text = metrics.render()
+    assert f'llm_circuit_breaker_state{{client="{endpoint}"}} 0' in text
+    assert f'llm_coalesced_total{{endpoint="{endpoint}",scope="local"}} 7' in text
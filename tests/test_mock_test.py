@@ -0,0 +1,93 @@
+import threading
+
+from backend.utils import mock_test
+from backend.utils.mock_test import MockTestGenerator
+
+QUESTIONS = [{'id': i, 'question': f'Explain topic {i}', 'guidelines': f'Point {i}'} for i in (1, 2, 3)]
+
+
+def grader(grade):
+    """A MockTestGenerator whose per-answer LLM call is replaced by grade(question, answer)"""
+    generator = MockTestGenerator.__new__(MockTestGenerator)
+    graded = []
+    lock = threading.Lock()
+
+    def grade_answer(topic, question, answer):
+        with lock:
+            graded.append(question['id'])
+        return grade(question, answer)
+
+    generator._grade_answer = grade_answer
+    return generator, graded
+
+
+def score(question, answer):
+    return {'id': question['id'], 'score': 8, 'feedback': 'Good.', 'key_point': ''}
+
+
+def test_trivially_short_answers_are_not_sent_to_the_llm():
+    generator, graded = grader(score)
+    answers = {'1': 'ok', '2': 'idk', '3': 'A function that calls itself until a base case stops it'}
+    result = generator._grade_per_answer('Python', QUESTIONS, answers)
+    assert graded == [3]
+    assert [e['score'] for e in result['subjective_evaluation']] == [0, 0, 8]
+
+
+def test_short_answer_thresholds():
+    generator, graded = grader(score)
+    answers = {'1': 'supercalifragilistic', '2': 'it is fine', '3': 'stack frames unwind'}
+    generator._grade_per_answer('Python', QUESTIONS, answers)
+    # One long word and fewer than MIN_ANSWER_CHARS characters are both too short
+    assert graded == [3]
+    assert mock_test.MIN_ANSWER_CHARS == 15 and mock_test.MIN_ANSWER_WORDS == 3
+
+
+def test_failed_grading_is_ungraded_not_scored():
+    def flaky(question, answer):
+        if question['id'] == 2:
+            raise ValueError('No JSON value found in AI response')
+        return score(question, answer)
+
+    generator, _ = grader(flaky)
+    answers = {str(q['id']): 'A long enough answer to be graded' for q in QUESTIONS}
+    result = generator._grade_per_answer('Python', QUESTIONS, answers)
+    evaluations = result['subjective_evaluation']
+    assert evaluations[1]['score'] is None and evaluations[1]['ungraded']
+    assert 'You scored 16/20' in result['overall_feedback']
+    assert '1 could not be graded' in result['overall_feedback']
+
+
+def test_nothing_graded():
+    def down(question, answer):
+        raise TimeoutError('grading ran out of time')
+
+    generator, _ = grader(down)
+    answers = {str(q['id']): 'A long enough answer to be graded' for q in QUESTIONS}
+    result = generator._grade_per_answer('Python', QUESTIONS, answers)
+    assert all(e['score'] is None for e in result['subjective_evaluation'])
+    assert 'could not be graded' in result['overall_feedback']
+
+
+def test_stream_mock_test_reports_questions_as_they_close():
+    text = ('Here is your test:\n{"mcqs": [{"id": 1, "question": "Q1", "options": {"A": "a"}, "correct": "A"}, '
+            '{"id": 2, "question": "Q2", "options": {"A": "a"}, "correct": "A"}], '
+            '"subjective": [{"id": 1, "question": "S1", "guidelines": "g"}]}\nGood luck!')
+    read = []
+
+    class Client:
+        def chat_completion_stream(self, messages, **kwargs):
+            for start in range(0, len(text), 4):
+                read.append(start)
+                yield text[start:start + 4]
+
+    generator = MockTestGenerator.__new__(MockTestGenerator)
+    generator.client = Client()
+    events = []
+    for kind, value in generator.stream_mock_test('Python'):
+        # Each question is reported before the rest of the response has been read
+        events.append((kind, value.get('id') if kind != 'done' else None, len(read)))
+    kinds = [(kind, question_id) for kind, question_id, _ in events]
+    assert kinds == [('mcq', 1), ('mcq', 2), ('subjective', 1), ('done', None)]
+    assert events[0][2] < events[-1][2]
+    # The trailing text is still read, so the complete response can be cached
+    assert read[-1] == range(0, len(text), 4)[-1]
@@ -0,0 +1,44 @@
+import time
+
+from backend.api import perplexity
+from backend.api.perplexity import PerplexityClient
+import backend.utils.llm_cache as llm_cache
+
+RESULT = {'choices': [{'message': {'role': 'assistant', 'content': 'Hi'}}]}
+
+
+class SlowCache:
+    """A cache whose lookups take a while and always miss"""
+    def get(self, key, **kwargs):
+        time.sleep(0.3)
+
+    def set(self, *args, **kwargs):
+        pass
+
+
+class Response:
+    status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return RESULT
+
+
+def test_cache_lookup_counts_against_the_budget(monkeypatch):
+    monkeypatch.setattr(llm_cache, 'CACHE_ENABLED', True)
+    monkeypatch.setattr(llm_cache, 'get_cache', SlowCache)
+    monkeypatch.setattr(perplexity, 'SINGLE_FLIGHT_ENABLED', False)
+    client = PerplexityClient(api_key='test', base_url='http://127.0.0.1:9')
+    deadlines = []
+
+    def send(payload, endpoint, deadline, **kwargs):
+        deadlines.append(deadline)
+        return Response()
+
+    client._send = send
+    start = time.monotonic()
+    assert client.chat_completion([{'role': 'user', 'content': 'Hi'}], endpoint='quiz', budget=5) == RESULT
+    # One deadline, set when the call began, not after the 0.3 s cache lookup
+    assert deadlines[0] <= start + 5.05
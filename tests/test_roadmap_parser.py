@@ -0,0 +1,73 @@
+from backend.core.roadmap import Roadmap, RoadmapParser
+
+ROADMAP = """Here is your learning path for Python:
+
+1. **Basics**
+- Variables and types
+- Control flow
+2. Functions
+- Arguments and return values
+10. `Packaging`
+- pip and virtual environments
+"""
+
+
+def parse_in_chunks(text, size):
+    parser = RoadmapParser()
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    completed.extend(parser.close())
+    return parser.steps, completed
+
+
+def test_whole_text():
+    steps = Roadmap('Python', ROADMAP).steps
+    assert [step['number'] for step in steps] == [1, 2, 10]
+    assert steps[0] == {'number': 1, 'title': 'Basics', 'details': ['- Variables and types', '- Control flow']}
+    assert steps[2]['title'] == 'Packaging'
+
+
+def test_char_by_char_matches_whole_text():
+    steps, completed = parse_in_chunks(ROADMAP, 1)
+    assert steps == Roadmap('Python', ROADMAP).steps
+    assert completed == steps
+
+
+def test_every_chunk_size_matches_whole_text():
+    expected = Roadmap('Python', ROADMAP).steps
+    for size in range(1, 40):
+        assert parse_in_chunks(ROADMAP, size)[0] == expected
+
+
+def test_numbered_line_split_across_chunks():
+    parser = RoadmapParser()
+    assert parser.feed("1. Basics\n- Variables\n1") == []
+    # "10. " is only known to be a step once the ". " has arrived
+    assert parser.feed("0") == []
+    completed = parser.feed(". Packaging")
+    assert [step['number'] for step in completed] == [1]
+    assert completed[0]['details'] == ['- Variables']
+    assert parser.feed("\n- pip\n") == []
+    last = parser.close()
+    assert last == [{'number': 10, 'title': 'Packaging', 'details': ['- pip']}]
+
+
+def test_detail_line_split_across_chunks():
+    parser = RoadmapParser()
+    parser.feed("1. Basics\n- Vari")
+    parser.feed("ables and types\n")
+    parser.close()
+    assert parser.steps[0]['details'] == ['- Variables and types']
+
+
+def test_text_before_first_step_is_ignored():
+    steps = Roadmap('Python', "Sure! Sources [1] and [2] say:\n\n1. Basics\n").steps
+    assert steps == [{'number': 1, 'title': 'Basics', 'details': []}]
+
+
+def test_no_steps():
+    parser = RoadmapParser()
+    parser.feed("I can't help with that.")
+    assert parser.close() == []
+    assert parser.steps == []
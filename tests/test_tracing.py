@@ -0,0 +1,40 @@
+import multiprocessing
+
+from backend.utils import tracing
+
+
+def _rotate_when_released(path, barrier):
+    """What each worker's exporter does: rotate if full, then append"""
+    barrier.wait()
+    tracing._rotate(path, 100)
+    with open(path, 'a') as f:
+        f.write('new\n')
+
+
+def test_rotate_moves_a_full_file(tmp_path):
+    path = str(tmp_path / 'slow.jsonl')
+    tracing._rotate(path, 100)  # no file yet
+    with open(path, 'w') as f:
+        f.write('x' * 60)
+    tracing._rotate(path, 100)
+    assert open(path).read() == 'x' * 60
+    with open(path, 'a') as f:
+        f.write('y' * 60)
+    tracing._rotate(path, 100)
+    assert open(f"{path}.1").read() == 'x' * 60 + 'y' * 60
+
+
+def test_workers_rotating_at_once_keep_the_backup(tmp_path):
+    path = str(tmp_path / 'slow.jsonl')
+    with open(path, 'w') as f:
+        f.write('first' * 40)
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(8)
+    workers = [ctx.Process(target=_rotate_when_released, args=(path, barrier)) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # One worker rotated; the others must not have moved the new, small file over it
+    assert open(f"{path}.1").read() == 'first' * 40
+    assert open(path).read() == 'new\n' * 8
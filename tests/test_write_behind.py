@@ -0,0 +1,66 @@
+import sqlite3
+
+from backend.utils.write_behind import WriteBehindWriter
+
+
+def make_writer(path, **kwargs):
+    conn = sqlite3.connect(str(path), check_same_thread=False)
+    conn.execute('CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT NOT NULL)')
+    conn.commit()
+    return conn, WriteBehindWriter(lambda: conn, interval_ms=50, retry_backoff=0.001, **kwargs)
+
+
+def bodies(conn):
+    return [row[0] for row in conn.execute('SELECT body FROM notes ORDER BY id')]
+
+
+def test_rows_are_written(tmp_path):
+    conn, writer = make_writer(tmp_path / 'wb.db')
+    for i in range(5):
+        writer.submit('INSERT INTO notes (body) VALUES (?)', (f'n{i}',), key=('notes', 1))
+    assert writer.wait_for(('notes', 1))
+    assert bodies(conn) == ['n0', 'n1', 'n2', 'n3', 'n4']
+    stats = writer.stats()
+    assert stats['rows'] == 5 and stats['failed'] == 0 and stats['queue_depth'] == 0
+
+
+def test_bad_row_only_loses_itself(tmp_path):
+    conn, writer = make_writer(tmp_path / 'wb.db')
+    writer.submit('INSERT INTO notes (body) VALUES (?)', ('before',))
+    writer.submit('INSERT INTO notes (body) VALUES (?)', (None,))  # NOT NULL
+    writer.submit('INSERT INTO notes (body) VALUES (?)', ('after',))
+    assert writer.flush() is False
+    assert bodies(conn) == ['before', 'after']
+    stats = writer.stats()
+    assert stats['rows'] == 2
+    assert stats['failed'] == 1
+    assert stats['retries'] == 3
+    assert stats['dead_letters'][0]['params'] == [None]
+    assert 'NOT NULL' in stats['dead_letters'][0]['error']
+
+
+def test_transient_failure_is_retried(tmp_path):
+    conn, _ = make_writer(tmp_path / 'wb.db')
+    calls = []
+
+    class Flaky:
+        """Fails the first commit the way a lock held past busy_timeout does"""
+        def executemany(self, sql, rows):
+            return conn.executemany(sql, rows)
+
+        def commit(self):
+            calls.append(1)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError('database is locked')
+            conn.commit()
+
+        def rollback(self):
+            conn.rollback()
+
+    flaky = Flaky()
+    writer = WriteBehindWriter(lambda: flaky, interval_ms=50, retry_backoff=0.001)
+    writer.submit('INSERT INTO notes (body) VALUES (?)', ('kept',))
+    assert writer.flush() is True
+    assert bodies(conn) == ['kept']
+    stats = writer.stats()
+    assert stats['retries'] == 1 and stats['failed'] == 0 and stats['rows'] == 1
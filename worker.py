@@ -0,0 +1,19 @@
+import os
+import signal
+import threading
+
+# Importing the app registers the job handlers; its own in-process pool is disabled
+# so this process runs every job it claims.
+os.environ.setdefault('WEB_JOB_WORKERS', '0')
+from app import job_queue
+
+if __name__ == '__main__':
+    workers = int(os.getenv('JOB_WORKERS', 4))
+    print(f"Starting {workers} job workers...")
+    job_queue.start(workers)
+
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *args: stopped.set())
+    stopped.wait()
+    job_queue.stop()